@@ -2,10 +2,23 @@
 from flask import Flask
 
 # App imports
+from dashboard.live import LiveRun
+from dashboard.telemetry import TelemetryRingBuffer, TelemetryStream
+from telemetry_history import TelemetryHistoryStore
 
 # Create app
 app = Flask(__name__)
 app.config.from_pyfile("config.py")
 
+# Live telemetry shared by every request
+telemetry_buffer = TelemetryRingBuffer(app.config["TELEMETRY_BUFFER_SIZE"])
+telemetry_stream = TelemetryStream(telemetry_buffer, app.config["TELEMETRY_RATE_HZ"])
+history_store = TelemetryHistoryStore(app.config["TELEMETRY_HISTORY_DIR"])
+live_run = None
+if app.config["TELEMETRY_LIVE_RUN"]:
+    live_run = LiveRun(telemetry_buffer, app.config["TELEMETRY_N_AGENTS"], app.config["TELEMETRY_MODEL_PATHS"],
+                       history=history_store)
+    live_run.start()
+
 # App functions
-import dashboard.views
\ No newline at end of file
+import dashboard.views
@@ -0,0 +1,13 @@
+import os
+
+# Live telemetry
+TELEMETRY_BUFFER_SIZE = int(os.environ.get("TELEMETRY_BUFFER_SIZE", 20000))  # per-car samples kept in memory
+TELEMETRY_RATE_HZ = float(os.environ.get("TELEMETRY_RATE_HZ", 10))  # max stream messages per viewer per second
+TELEMETRY_LIVE_RUN = os.environ.get("TELEMETRY_LIVE_RUN", "0") not in ("", "0")  # simulate in-process
+TELEMETRY_N_AGENTS = int(os.environ.get("TELEMETRY_N_AGENTS", 2))
+TELEMETRY_MODEL_PATHS = [path for path in os.environ.get("TELEMETRY_MODEL_PATHS", "").split(",") if path] or None
+
+# Telemetry history
+TELEMETRY_HISTORY_DIR = os.environ.get(
+    "TELEMETRY_HISTORY_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "telemetry_history")
+)
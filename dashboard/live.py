@@ -0,0 +1,96 @@
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from dashboard.telemetry import TelemetryRingBuffer, make_frames
+
+from telemetry_history import TelemetryHistoryStore, TelemetryHistorySink
+from telemetry_publisher import TelemetryPublisher, TelemetryWrapper
+
+
+def records_to_frames(records: np.ndarray) -> np.ndarray:
+    """CAR_FRAME_DTYPE samples of TELEMETRY_RECORD_DTYPE records from the simulation."""
+    return make_frames(
+        records["episode"], records["step"], records["agent"],
+        np.stack([records["x"], records["y"]], axis=1), np.stack([records["vx"], records["vy"]], axis=1),
+        records["angle"], np.stack([records["steering"], records["throttle"], records["brake"]], axis=1),
+        records["progress"]
+    )
+
+
+class RingBufferSink:
+    """Telemetry publisher consumer feeding a dashboard ``TelemetryRingBuffer`` in the same process."""
+
+    def __init__(self, buffer: TelemetryRingBuffer):
+        self.buffer = buffer
+
+    def __call__(self, records: np.ndarray):
+        self.buffer.push(records_to_frames(records))
+
+
+class LiveRun(threading.Thread):
+    """
+    Plays headless ``MultiAgentCarRacingEnv`` episodes in a daemon thread and
+    publishes every step's car states into a ``TelemetryRingBuffer`` through a
+    ``TelemetryPublisher``.
+
+    Cars are driven by the DQN checkpoints in ``model_paths`` (one per car, in one
+    batched forward pass) or by random actions when none are given. Finished
+    episodes are also written to ``history`` when given. The loop runs
+    as fast as the simulation allows; viewers read from the buffer, never from it.
+    """
+
+    def __init__(self, buffer: TelemetryRingBuffer, n_agents: int = 2, model_paths: Optional[List[str]] = None,
+                 episode_length: int = 1000, max_episodes: Optional[int] = None, seed: Optional[int] = None,
+                 history: Optional[TelemetryHistoryStore] = None):
+        super().__init__(daemon=True)
+        if model_paths is not None and len(model_paths) != n_agents:
+            raise ValueError(f"Expected {n_agents} model paths, got {len(model_paths)}")
+        self.buffer = buffer
+        self.n_agents = n_agents
+        self.model_paths = model_paths
+        self.episode_length = episode_length
+        self.max_episodes = max_episodes
+        self.seed = seed
+        self.history = history
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        from marl_env import MultiAgentCarRacingEnv
+
+        policy_runner = None
+        if self.model_paths:
+            from stable_baselines3 import DQN
+            from model_registry import load_model
+            from policy_inference import BatchedPolicyRunner
+            policy_runner = BatchedPolicyRunner([load_model(DQN, path=path) for path in self.model_paths])
+
+        consumers = [RingBufferSink(self.buffer)]
+        if self.history is not None:
+            consumers.append(TelemetryHistorySink(self.history, {"run": "dashboard_live", "n_agents": self.n_agents}))
+        publisher = TelemetryPublisher(consumers)
+        env = TelemetryWrapper(MultiAgentCarRacingEnv(n_agents=self.n_agents, continuous=policy_runner is None,
+                                                      obs_dtype="uint8", headless=True), publisher)
+        rng = np.random.default_rng(self.seed)
+        episode = 0
+        try:
+            while not self.stop_event.is_set() and (self.max_episodes is None or episode < self.max_episodes):
+                obs, _ = env.reset(seed=None if self.seed is None else self.seed + episode)
+                for step in range(self.episode_length):
+                    if self.stop_event.is_set():
+                        break
+                    if policy_runner is not None:
+                        actions = list(policy_runner.predict(np.stack(obs)))
+                    else:
+                        actions = [rng.uniform([-1, 0, 0], [1, 1, 0.2]).astype(np.float32) for _ in range(self.n_agents)]
+                    obs, _, terminateds, truncateds, _ = env.step(actions)
+                    if all(terminateds) or all(truncateds):
+                        break
+                episode += 1
+        finally:
+            env.close()
+            publisher.close()
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# One per-car sample as kept in the ring buffer
+CAR_FRAME_DTYPE = np.dtype([
+    ("episode", np.int32),
+    ("step", np.int32),
+    ("car", np.int16),
+    ("time", np.float64),        # wall-clock time the sample was taken
+    ("x", np.float32),
+    ("y", np.float32),
+    ("angle", np.float32),
+    ("speed", np.float32),
+    ("steering", np.float32),
+    ("throttle", np.float32),
+    ("brake", np.float32),
+    ("progress", np.float32),    # fraction of the lap's road tiles visited
+])
+
+
+def frames_to_dicts(frames: np.ndarray) -> List[Dict[str, Any]]:
+    """JSON-friendly dicts of CAR_FRAME_DTYPE records."""
+    return [{name: record[name].item() for name in CAR_FRAME_DTYPE.names} for record in frames]
+
+
+class TelemetryRingBuffer:
+    """
+    Fixed-size in-memory history of per-car telemetry samples.
+
+    ``push`` copies a batch of CAR_FRAME_DTYPE records into a preallocated ring
+    under a short lock and also keeps the newest record of every car, so writers
+    never allocate or wait on readers for longer than a copy. ``seq`` counts every
+    record ever pushed and identifies the buffer state for readers.
+    """
+
+    def __init__(self, capacity: int = 20000):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.frames = np.zeros(capacity, dtype=CAR_FRAME_DTYPE)
+        self.seq = 0
+        self._latest: Dict[int, np.void] = {}
+        self._lock = threading.Lock()
+
+    def push(self, frames: np.ndarray):
+        frames = np.asarray(frames, dtype=CAR_FRAME_DTYPE)[-self.capacity:]
+        with self._lock:
+            start = self.seq % self.capacity
+            head = min(len(frames), self.capacity - start)
+            self.frames[start:start + head] = frames[:head]
+            self.frames[:len(frames) - head] = frames[head:]
+            self.seq += len(frames)
+            # Last record of each car in the batch
+            cars, last = np.unique(frames["car"][::-1], return_index=True)
+            for car, i in zip(cars, len(frames) - 1 - last):
+                self._latest[int(car)] = frames[i].copy()
+
+    def reset(self):
+        with self._lock:
+            self.seq = 0
+            self._latest.clear()
+
+    def latest(self) -> np.ndarray:
+        """Newest record of every car seen so far, ordered by car id."""
+        with self._lock:
+            records = [self._latest[car] for car in sorted(self._latest)]
+        return np.array(records, dtype=CAR_FRAME_DTYPE)
+
+    def history(self, n: Optional[int] = None) -> np.ndarray:
+        """The last ``n`` records (all retained ones by default), oldest first."""
+        with self._lock:
+            n = min(self.seq, self.capacity) if n is None else min(n, self.seq, self.capacity)
+            indices = (self.seq - n + np.arange(n)) % self.capacity
+            return self.frames[indices]
+
+
+class TelemetryStream:
+    """
+    Coalesces ring-buffer updates for any number of viewers.
+
+    Every viewer receives at most ``rate_hz`` messages per second holding the
+    newest state of every car, however fast the simulation pushes. The message for
+    a given buffer state is encoded once and shared, so adding viewers costs a
+    sleep and a string copy each rather than work on the simulation's side.
+    """
+
+    def __init__(self, buffer: TelemetryRingBuffer, rate_hz: float = 10.0, keepalive_s: float = 15.0):
+        if rate_hz <= 0:
+            raise ValueError(f"rate_hz must be positive, got {rate_hz}")
+        self.buffer = buffer
+        self.interval = 1.0 / rate_hz
+        self.keepalive_s = keepalive_s
+        self._encoded = (-1, "")
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        seq = self.buffer.seq
+        return {"seq": seq, "cars": frames_to_dicts(self.buffer.latest())}
+
+    def encoded_snapshot(self):
+        """(seq, JSON) of the current state, re-encoded only when the buffer changed."""
+        seq = self.buffer.seq
+        with self._lock:
+            if self._encoded[0] != seq:
+                self._encoded = (seq, json.dumps(self.snapshot()))
+            return self._encoded
+
+    def events(self, last_seq: int = -1) -> Iterator[str]:
+        """Server-sent events for one viewer; runs until the client disconnects."""
+        last_sent = time.monotonic()
+        while True:
+            seq, payload = self.encoded_snapshot()
+            now = time.monotonic()
+            if seq != last_seq:
+                last_seq = seq
+                last_sent = now
+                yield f"id: {seq}\nevent: telemetry\ndata: {payload}\n\n"
+            elif now - last_sent >= self.keepalive_s:
+                last_sent = now
+                yield ": keepalive\n\n"
+            time.sleep(self.interval)
+
+
+def make_frames(episode, step, car, positions: Sequence, velocities: Sequence, angles: Sequence,
+                controls: Sequence, progress: Sequence) -> np.ndarray:
+    """CAR_FRAME_DTYPE records taken now; ``controls`` rows are (steering, throttle, brake)."""
+    n_cars = len(positions)
+    frames = np.zeros(n_cars, dtype=CAR_FRAME_DTYPE)
+    positions = np.asarray(positions, dtype=np.float32).reshape(n_cars, 2)
+    controls = np.asarray(controls, dtype=np.float32).reshape(n_cars, 3)
+    frames["episode"] = episode
+    frames["step"] = step
+    frames["car"] = car
+    frames["time"] = time.time()
+    frames["x"], frames["y"] = positions[:, 0], positions[:, 1]
+    frames["angle"] = angles
+    frames["speed"] = np.linalg.norm(np.asarray(velocities, dtype=np.float32).reshape(n_cars, 2), axis=1)
+    frames["steering"], frames["throttle"], frames["brake"] = controls[:, 0], controls[:, 1], controls[:, 2]
+    frames["progress"] = progress
+    return frames
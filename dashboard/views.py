@@ -1,7 +1,78 @@
-from flask import render_template, redirect, url_for, request, abort, jsonify
+import numpy as np
+from flask import render_template, redirect, url_for, request, abort, jsonify, Response, stream_with_context
 
-from dashboard.app import app
+from dashboard.app import app, telemetry_buffer, telemetry_stream, history_store
+from dashboard.telemetry import CAR_FRAME_DTYPE, frames_to_dicts
 
 @app.route("/")
 def dashboard():
-    return render_template("dashboard.html")
\ No newline at end of file
+    return render_template("dashboard.html")
+
+@app.after_request
+def allow_telemetry_cross_origin(response):
+    # The React dev server reads the telemetry endpoints from another origin
+    if request.path.startswith(("/telemetry", "/history")):
+        response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+@app.route("/telemetry/stream")
+def telemetry_stream_events():
+    last_seq = request.headers.get("Last-Event-ID", type=int, default=-1)
+    response = Response(stream_with_context(telemetry_stream.events(last_seq)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/telemetry/latest")
+def telemetry_latest():
+    return jsonify(telemetry_stream.snapshot())
+
+@app.route("/telemetry/history")
+def telemetry_history():
+    n = request.args.get("n", type=int)
+    return jsonify({"seq": telemetry_buffer.seq, "frames": frames_to_dicts(telemetry_buffer.history(n))})
+
+@app.route("/telemetry", methods=["POST"])
+def telemetry_ingest():
+    # Batches of car samples from simulation runs in other processes
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        abort(400)
+    try:
+        frames = np.array(
+            [tuple(record.get(name, 0) for name in CAR_FRAME_DTYPE.names) for record in records],
+            dtype=CAR_FRAME_DTYPE
+        )
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        abort(400)
+    telemetry_buffer.push(frames)
+    return jsonify({"seq": telemetry_buffer.seq})
+
+def _int_list(arg):
+    value = request.args.get(arg)
+    return None if not value else [int(v) for v in value.split(",")]
+
+@app.route("/history/episodes")
+def history_episodes():
+    return jsonify(history_store.episodes())
+
+@app.route("/history/<int:episode>")
+@app.route("/history/<int:episode>/<resolution>")
+def history_query(episode, resolution="raw"):
+    # e.g. /history/3/1s?columns=speed,progress&t_start=10&t_end=20&agents=0,1
+    columns = request.args.get("columns")
+    try:
+        result = history_store.query(
+            episode, resolution,
+            columns=columns.split(",") if columns else None,
+            t_start=request.args.get("t_start", type=float),
+            t_end=request.args.get("t_end", type=float),
+            lap_start=request.args.get("lap_start", type=int),
+            lap_end=request.args.get("lap_end", type=int),
+            agents=_int_list("agents"),
+        )
+    except KeyError:
+        abort(404)
+    except (ValueError, IndexError):
+        abort(400)
+    return jsonify({"episode": episode, "resolution": resolution, "columns": history_store.to_json(result)})
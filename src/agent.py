@@ -2,8 +2,13 @@ from env_setup import CarRacingWrapper
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.env_checker import check_env
+from model_registry import load_model
+from headless import headless_requested, use_headless_display
 
 if __name__ == "__main__":
+    headless = headless_requested()
+    if headless:
+        use_headless_display()
     # env = CarRacingWrapper(continuous=True, frame_stack=4, grayscale=True, render_mode="human")
     env = make_vec_env("CarRacing-v3", n_envs=1)
 
@@ -52,7 +57,7 @@ if __name__ == "__main__":
     # load model
     # model = PPO.load("ppo_rc", env=env)
     # print("Model loaded")
-    model = PPO.load("ppo_car_racing", env=env)
+    model = load_model(PPO, path="ppo_car_racing")
     print("Model loaded")
 
     # print("Testing trained model...")
@@ -92,7 +97,8 @@ if __name__ == "__main__":
         obs, reward, done, info = env.step(action)
         done = done
         total_reward += reward
-        env.render("human")
+        if not headless:
+            env.render("human")
 
     print(f"Episode finished with total reward: {total_reward}")
     env.close()
\ No newline at end of file
@@ -0,0 +1,324 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import gymnasium as gym
+import numpy as np
+
+from headless import HumanRenderThrottle
+
+
+# Per-agent car state read from each sub-environment's Box2D world after every step
+AGENT_STATE_DTYPE = np.dtype([
+    ("position", np.float64, (2,)),   # hull x, y
+    ("velocity", np.float64, (2,)),   # hull linear velocity vx, vy
+    ("angle", np.float64),            # hull heading (radians)
+    ("tiles_visited", np.int64),      # road tiles touched so far
+    ("progress", np.float64),         # tiles_visited / number of track tiles
+])
+
+
+def fill_car_state(state: np.ndarray, hull, tiles_visited: int, n_tiles: int):
+    """Fill one AGENT_STATE_DTYPE record from a car hull body and its tile count."""
+    state["position"] = hull.position.x, hull.position.y
+    state["velocity"] = hull.linearVelocity.x, hull.linearVelocity.y
+    state["angle"] = hull.angle
+    state["tiles_visited"] = tiles_visited
+    state["progress"] = tiles_visited / n_tiles
+
+
+def read_car_state(env: gym.Env, state: np.ndarray):
+    """Fill one AGENT_STATE_DTYPE record from a CarRacing env's car hull and tile count."""
+    car_racing = env.unwrapped
+    fill_car_state(state, car_racing.car.hull, car_racing.tile_visited_count, len(car_racing.track))
+
+
+class SerialAgentPool:
+    """
+    Steps one CarRacing-v3 sub-environment per agent, one after another, in this process.
+
+    Raw RGB frames of all agents are written into a single (N, H, W, 3) uint8
+    array so they can be preprocessed in one batch, and car states into a
+    (N,) AGENT_STATE_DTYPE array.
+    """
+
+    def __init__(self, n_agents: int, env_kwargs: Dict[str, Any], render_every: int = 1):
+        self.n_agents = n_agents
+        self.envs = [gym.make("CarRacing-v3", **env_kwargs) for _ in range(n_agents)]
+        self.render_throttles = [HumanRenderThrottle(env, render_every) for env in self.envs]
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.frames = np.zeros((n_agents,) + self.observation_space.shape, dtype=np.uint8)
+        self.states = np.zeros(n_agents, dtype=AGENT_STATE_DTYPE)
+
+    def reset(self, seeds: Sequence[Optional[int]], options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Reset every agent, writing first frames into ``frames``; returns the infos."""
+        infos = []
+        for i, env in enumerate(self.envs):
+            obs, info = env.reset(seed=seeds[i], options=options)
+            self.frames[i] = obs
+            read_car_state(env, self.states[i])
+            infos.append(info)
+        return infos
+
+    def step(self, actions: Sequence[Any], agent_ids: np.ndarray) -> Tuple[List[float], List[bool], List[bool], List[Dict[str, Any]]]:
+        """Step the agents in ``agent_ids`` with the matching ``actions``."""
+        rewards, terminateds, truncateds, infos = [], [], [], []
+        for i, action in zip(agent_ids, actions):
+            with self.render_throttles[i].step():
+                obs, reward, terminated, truncated, info = self.envs[i].step(action)
+            self.frames[i] = obs
+            read_car_state(self.envs[i], self.states[i])
+            rewards.append(reward)
+            terminateds.append(terminated)
+            truncateds.append(truncated)
+            infos.append(info)
+        return rewards, terminateds, truncateds, infos
+
+    def render(self) -> List[Optional[np.ndarray]]:
+        return [env.render() for env in self.envs]
+
+    def set_render_every(self, render_every: int):
+        for throttle in self.render_throttles:
+            throttle.render_every = render_every
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class SharedWorldAgentPool:
+    """
+    Simulates all agents as cars in one SharedWorldCarRacing world.
+
+    One physics world and one track are stepped per ``step`` regardless of the
+    number of agents, and cars can collide with each other. The episode seed is
+    taken from the first agent's seed.
+    """
+
+    def __init__(self, n_agents: int, env_kwargs: Dict[str, Any], render_every: int = 1):
+        # Imported here so the per-agent pools do not pull in the shared-world engine
+        from shared_world_env import SharedWorldCarRacing
+
+        self.n_agents = n_agents
+        self.env = SharedWorldCarRacing(n_agents=n_agents, **env_kwargs)
+        self.render_throttle = HumanRenderThrottle(self.env, render_every)
+        self.observation_space = self.env.single_observation_space
+        self.action_space = self.env.single_action_space
+        self.frames = self.env.states  # written in place by the engine every step
+        self.states = np.zeros(n_agents, dtype=AGENT_STATE_DTYPE)
+        # (k, 2) car pairs in physical contact during the last step
+        self.contacts = np.empty((0, 2), dtype=np.intp)
+
+    def _read_states(self, agent_ids):
+        n_tiles = len(self.env.track)
+        for i in agent_ids:
+            fill_car_state(self.states[i], self.env.cars[i].hull, self.env.tile_visited_counts[i], n_tiles)
+
+    def reset(self, seeds: Sequence[Optional[int]], options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Reset the shared world, writing first frames into ``frames``; returns the infos."""
+        self.env.reset(seed=seeds[0], options=options)
+        self._read_states(range(self.n_agents))
+        return [{} for _ in range(self.n_agents)]
+
+    def step(self, actions: Sequence[Any], agent_ids: np.ndarray) -> Tuple[List[float], List[bool], List[bool], List[Dict[str, Any]]]:
+        """Step the shared world once; agents not in ``agent_ids`` coast without control."""
+        all_actions = [None] * self.n_agents
+        for i, action in zip(agent_ids, actions):
+            all_actions[i] = action
+        with self.render_throttle.step():
+            _, step_rewards, step_terminateds, step_truncateds, info = self.env.step(all_actions)
+        self._read_states(range(self.n_agents))
+        self.contacts = np.array(info["car_contacts"], dtype=np.intp).reshape(-1, 2)
+
+        rewards, terminateds, truncateds, infos = [], [], [], []
+        for i in agent_ids:
+            rewards.append(float(step_rewards[i]))
+            terminateds.append(bool(step_terminateds[i]))
+            truncateds.append(bool(step_truncateds[i]))
+            infos.append({
+                "lap_finished": bool(info["lap_finished"][i]),
+                "car_contacts": [pair for pair in info["car_contacts"] if i in pair],
+            })
+        return rewards, terminateds, truncateds, infos
+
+    def render(self) -> List[Optional[np.ndarray]]:
+        return [self.env.render()]
+
+    def set_render_every(self, render_every: int):
+        self.render_throttle.render_every = render_every
+
+    def close(self):
+        self.env.close()
+
+
+def _agent_worker(remote, parent_remote, shm_name: str, frames_shape: Tuple[int, ...],
+                  states_shm_name: str, agent_ids: List[int], env_kwargs: Dict[str, Any], render_every: int):
+    """Worker loop owning the sub-environments of a group of agents."""
+    parent_remote.close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=shm.buf)
+    states_shm = shared_memory.SharedMemory(name=states_shm_name)
+    states = np.ndarray(frames_shape[:1], dtype=AGENT_STATE_DTYPE, buffer=states_shm.buf)
+    envs = {i: gym.make("CarRacing-v3", **env_kwargs) for i in agent_ids}
+    render_throttles = {i: HumanRenderThrottle(envs[i], render_every) for i in agent_ids}
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                results = []
+                for i, action in data:
+                    with render_throttles[i].step():
+                        obs, reward, terminated, truncated, info = envs[i].step(action)
+                    frames[i] = obs
+                    read_car_state(envs[i], states[i])
+                    results.append((reward, terminated, truncated, info))
+                remote.send(results)
+            elif cmd == "reset":
+                seeds, options = data
+                infos = []
+                for i in agent_ids:
+                    obs, info = envs[i].reset(seed=seeds[i], options=options)
+                    frames[i] = obs
+                    read_car_state(envs[i], states[i])
+                    infos.append(info)
+                remote.send(infos)
+            elif cmd == "render":
+                remote.send([envs[i].render() for i in agent_ids])
+            elif cmd == "set_render_every":
+                for throttle in render_throttles.values():
+                    throttle.render_every = data
+                remote.send(None)
+            elif cmd == "get_spaces":
+                env = envs[agent_ids[0]]
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "close":
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for env in envs.values():
+            env.close()
+        del frames, states
+        shm.close()
+        states_shm.close()
+        remote.close()
+
+
+class SubprocAgentPool:
+    """
+    Runs the agents' CarRacing-v3 sub-environments in worker processes.
+
+    Agents are split into ``n_workers`` contiguous groups. Each ``step`` sends one
+    batched command per worker, all workers simulate in parallel, and raw frames
+    come back through a shared-memory (N, H, W, 3) uint8 block instead of the
+    pipe, so only rewards, flags and infos are pickled. Car states are returned the
+    same way through a second (N,) AGENT_STATE_DTYPE block.
+    """
+
+    def __init__(self, n_agents: int, env_kwargs: Dict[str, Any], n_workers: Optional[int] = None,
+                 start_method: Optional[str] = None, render_every: int = 1):
+        self.n_agents = n_agents
+        n_workers = min(n_agents, n_workers or os.cpu_count() or 1)
+        self.agent_groups = [group.tolist() for group in np.array_split(np.arange(n_agents), n_workers)]
+        # Worker index owning each agent
+        self.owner = np.empty(n_agents, dtype=np.intp)
+        for w, group in enumerate(self.agent_groups):
+            self.owner[group] = w
+
+        if start_method is None:
+            # forkserver is safer than fork with pygame/SDL state in the parent
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        frame_shape = (96, 96, 3)  # CarRacing-v3 state pixels
+        frames_shape = (n_agents,) + frame_shape
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(frames_shape)))
+        self.frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.frames.fill(0)
+        self.states_shm = shared_memory.SharedMemory(create=True, size=n_agents * AGENT_STATE_DTYPE.itemsize)
+        self.states = np.ndarray((n_agents,), dtype=AGENT_STATE_DTYPE, buffer=self.states_shm.buf)
+        self.states.fill(0)
+
+        self.remotes, self.processes = [], []
+        for group in self.agent_groups:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_agent_worker,
+                args=(work_remote, remote, self.shm.name, frames_shape, self.states_shm.name, group, env_kwargs,
+                      render_every),
+                daemon=True
+            )
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.closed = False
+
+        self.remotes[0].send(("get_spaces", None))
+        self.observation_space, self.action_space = self.remotes[0].recv()
+
+    def reset(self, seeds: Sequence[Optional[int]], options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Reset every agent, writing first frames into ``frames``; returns the infos."""
+        for remote in self.remotes:
+            remote.send(("reset", (list(seeds), options)))
+        infos = []
+        for remote in self.remotes:
+            infos.extend(remote.recv())
+        return infos
+
+    def step(self, actions: Sequence[Any], agent_ids: np.ndarray) -> Tuple[List[float], List[bool], List[bool], List[Dict[str, Any]]]:
+        """Step the agents in ``agent_ids`` with the matching ``actions``, all workers in parallel."""
+        commands = [[] for _ in self.remotes]
+        for i, action in zip(agent_ids, actions):
+            commands[self.owner[i]].append((int(i), action))
+
+        busy = [w for w, command in enumerate(commands) if command]
+        for w in busy:
+            self.remotes[w].send(("step", commands[w]))
+        results = {}
+        for w in busy:
+            for (i, _), result in zip(commands[w], self.remotes[w].recv()):
+                results[i] = result
+
+        rewards, terminateds, truncateds, infos = [], [], [], []
+        for i in agent_ids:
+            reward, terminated, truncated, info = results[int(i)]
+            rewards.append(reward)
+            terminateds.append(terminated)
+            truncateds.append(truncated)
+            infos.append(info)
+        return rewards, terminateds, truncateds, infos
+
+    def render(self) -> List[Optional[np.ndarray]]:
+        for remote in self.remotes:
+            remote.send(("render", None))
+        frames = []
+        for remote in self.remotes:
+            frames.extend(remote.recv())
+        return frames
+
+    def set_render_every(self, render_every: int):
+        for remote in self.remotes:
+            remote.send(("set_render_every", render_every))
+        for remote in self.remotes:
+            remote.recv()
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        del self.frames, self.states
+        self.shm.close()
+        self.shm.unlink()
+        self.states_shm.close()
+        self.states_shm.unlink()
+        self.closed = True
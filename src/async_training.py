@@ -0,0 +1,302 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3.common.buffers import RolloutBuffer
+from stable_baselines3.common.on_policy_algorithm import OnPolicyAlgorithm
+from stable_baselines3.common.utils import configure_logger
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from env_setup import CarRacingWrapper
+
+
+def _actor_worker(actor_id: int, policy_class, policy_kwargs: Dict[str, Any], observation_space, action_space,
+                  weights_shm_name: str, n_params: int, version, weights_lock, trajectories, stop_event,
+                  env_kwargs: Dict[str, Any], rollout_length: int, gamma: float, seed: Optional[int]):
+    """Actor loop: step a CarRacingWrapper with a periodically synced policy copy, push fixed-length rollouts."""
+    th.set_num_threads(1)
+    weights_shm = shared_memory.SharedMemory(name=weights_shm_name)
+    weights = np.ndarray((n_params,), dtype=np.float32, buffer=weights_shm.buf)
+    policy = policy_class(observation_space, action_space, lambda _: 0.0, **policy_kwargs)
+    policy.set_training_mode(False)
+    env = CarRacingWrapper(**env_kwargs)
+    local_version = -1
+
+    obs, _ = env.reset(seed=seed)
+    episode_start = True
+    episode_return, episode_length = 0.0, 0
+    try:
+        while not stop_event.is_set():
+            # Pick up the newest published weights before every rollout
+            if version.value != local_version:
+                with weights_lock:
+                    local_version = version.value
+                    vector_to_parameters(th.from_numpy(weights.copy()), policy.parameters())
+
+            rollout = {
+                "obs": np.zeros((rollout_length,) + observation_space.shape, dtype=observation_space.dtype),
+                "actions": np.zeros((rollout_length,) + action_space.shape, dtype=action_space.dtype),
+                "rewards": np.zeros(rollout_length, dtype=np.float32),
+                "episode_starts": np.zeros(rollout_length, dtype=np.float32),
+                "log_probs": np.zeros(rollout_length, dtype=np.float32),
+                "episodes": [],
+            }
+            started = time.perf_counter()
+            for t in range(rollout_length):
+                with th.no_grad():
+                    obs_tensor, _ = policy.obs_to_tensor(obs)
+                    action, _, log_prob = policy(obs_tensor)
+                action = action.cpu().numpy()[0]
+                env_action = action
+                if isinstance(action_space, spaces.Box):
+                    env_action = np.clip(action, action_space.low, action_space.high)
+
+                next_obs, reward, terminated, truncated, _ = env.step(env_action)
+                episode_return += reward
+                episode_length += 1
+                if truncated and not terminated:
+                    # Bootstrap time-limit truncation with the actor's value estimate
+                    with th.no_grad():
+                        reward += gamma * policy.predict_values(policy.obs_to_tensor(next_obs)[0]).item()
+
+                rollout["obs"][t] = obs
+                rollout["actions"][t] = action
+                rollout["rewards"][t] = reward
+                rollout["episode_starts"][t] = episode_start
+                rollout["log_probs"][t] = log_prob.item()
+
+                episode_start = terminated or truncated
+                if episode_start:
+                    rollout["episodes"].append((episode_return, episode_length))
+                    episode_return, episode_length = 0.0, 0
+                    next_obs, _ = env.reset()
+                obs = next_obs
+
+            rollout.update({
+                "last_obs": obs,
+                "last_episode_start": episode_start,
+                "policy_version": local_version,
+                "actor_id": actor_id,
+                "steps_per_second": rollout_length / (time.perf_counter() - started),
+            })
+            # Blocks while the queue is full, so actors never run far ahead of the learner
+            while not stop_event.is_set():
+                try:
+                    trajectories.put(rollout, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+        del weights
+        weights_shm.close()
+
+
+class AsyncActorLearner:
+    """
+    Decoupled actor/learner training for an on-policy SB3 model (PPO, A2C).
+
+    ``n_actors`` processes each step their own ``CarRacingWrapper`` with a CPU copy
+    of the policy and push ``rollout_length``-step trajectories into a bounded
+    queue of ``queue_size`` rollouts. The learner takes ``rollouts_per_update``
+    trajectories at a time, recomputes values with the current policy, runs the
+    model's usual ``train()`` update and publishes the new weights through shared
+    memory; actors pick them up before their next rollout.
+
+    A trajectory's lag is the number of learner updates since the weights that
+    collected it. Trajectories lagging more than ``max_lag`` updates are dropped.
+    PPO's ratio uses the actors' log-probabilities, which bounds the update for
+    slightly stale data. Lag, drops, queue fill, actor throughput and learner wait
+    time are recorded under ``async/`` in the model's logger and in ``stats``.
+    """
+
+    def __init__(
+        self,
+        model: OnPolicyAlgorithm,
+        env_kwargs: Optional[Dict[str, Any]] = None,
+        n_actors: int = 4,
+        rollout_length: Optional[int] = None,
+        rollouts_per_update: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        max_lag: int = 2,
+        seed: Optional[int] = None,
+        start_method: Optional[str] = None
+    ):
+        if not isinstance(model, OnPolicyAlgorithm):
+            raise ValueError(f"AsyncActorLearner needs an on-policy model, got {type(model).__name__}")
+        self.model = model
+        self.env_kwargs = env_kwargs or {}
+        self.n_actors = n_actors
+        self.rollout_length = rollout_length or model.n_steps
+        self.rollouts_per_update = rollouts_per_update or n_actors
+        self.queue_size = queue_size or 2 * self.rollouts_per_update
+        self.max_lag = max_lag
+        self.seed = seed
+        if start_method is None:
+            # forkserver is safer than fork with pygame/SDL and torch state in the parent
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self.ctx = mp.get_context(start_method)
+        self.policy_version = 0
+        self.stats: Dict[str, float] = {}
+
+    def _publish_weights(self):
+        vector = parameters_to_vector(self.model.policy.parameters()).detach().cpu().numpy()
+        with self.weights_lock:
+            self.weights[:] = vector
+            self.version.value = self.policy_version
+
+    def _start_actors(self):
+        policy = self.model.policy
+        n_params = sum(p.numel() for p in policy.parameters())
+        self.weights_shm = shared_memory.SharedMemory(create=True, size=n_params * 4)
+        self.weights = np.ndarray((n_params,), dtype=np.float32, buffer=self.weights_shm.buf)
+        self.version = self.ctx.Value("i", -1)
+        self.weights_lock = self.ctx.Lock()
+        self.trajectories = self.ctx.Queue(maxsize=self.queue_size)
+        self.stop_event = self.ctx.Event()
+        self._publish_weights()
+
+        self.actors = []
+        for actor_id in range(self.n_actors):
+            process = self.ctx.Process(
+                target=_actor_worker,
+                args=(actor_id, self.model.policy_class, dict(use_sde=self.model.use_sde, **self.model.policy_kwargs),
+                      self.model.observation_space,
+                      self.model.action_space, self.weights_shm.name, n_params, self.version, self.weights_lock,
+                      self.trajectories, self.stop_event, self.env_kwargs, self.rollout_length, self.model.gamma,
+                      None if self.seed is None else self.seed + actor_id),
+                daemon=True
+            )
+            process.start()
+            self.actors.append(process)
+
+    def _stop_actors(self):
+        self.stop_event.set()
+        # Drain so actors blocked on a full queue can exit
+        while any(process.is_alive() for process in self.actors):
+            try:
+                self.trajectories.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for process in self.actors:
+            process.join()
+        self.trajectories.close()
+        del self.weights
+        self.weights_shm.close()
+        self.weights_shm.unlink()
+
+    def _check_actors(self):
+        """Raise if an actor failed or none is left to produce trajectories."""
+        for actor_id, process in enumerate(self.actors):
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(f"Actor {actor_id} exited with code {process.exitcode}")
+        if not any(process.is_alive() for process in self.actors):
+            raise RuntimeError("All actors have exited")
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Take the next ``rollouts_per_update`` trajectories that are recent enough."""
+        batch, lags = [], []
+        dropped = 0
+        started = time.perf_counter()
+        while len(batch) < self.rollouts_per_update:
+            try:
+                rollout = self.trajectories.get(timeout=1.0)
+            except queue.Empty:
+                self._check_actors()
+                continue
+            lag = self.policy_version - rollout["policy_version"]
+            if lag > self.max_lag:
+                dropped += 1
+                continue
+            batch.append(rollout)
+            lags.append(lag)
+
+        self.stats = {
+            "lag_mean": float(np.mean(lags)),
+            "lag_max": float(np.max(lags)),
+            "dropped_rollouts": self.stats.get("dropped_rollouts", 0) + dropped,
+            "queue_size": self.trajectories.qsize(),
+            "learner_wait_s": time.perf_counter() - started,
+            "actor_steps_per_second": float(sum(r["steps_per_second"] for r in batch)),
+        }
+        return batch
+
+    def _fill_buffer(self, batch: List[Dict[str, Any]]) -> RolloutBuffer:
+        model = self.model
+        buffer = RolloutBuffer(
+            self.rollout_length, model.observation_space, model.action_space, device=model.device,
+            gamma=model.gamma, gae_lambda=model.gae_lambda, n_envs=len(batch)
+        )
+        obs = np.stack([r["obs"] for r in batch], axis=1)  # (T, n, *obs_shape)
+        actions = np.stack([r["actions"] for r in batch], axis=1)
+        if isinstance(model.action_space, spaces.Discrete):
+            actions = actions.reshape(self.rollout_length, len(batch), 1)
+
+        with th.no_grad():
+            # Values come from the current learner policy, log-probs from the actors
+            values = model.policy.predict_values(
+                model.policy.obs_to_tensor(obs.reshape((-1,) + obs.shape[2:]))[0]
+            ).reshape(self.rollout_length, len(batch))
+            last_values = model.policy.predict_values(
+                model.policy.obs_to_tensor(np.stack([r["last_obs"] for r in batch]))[0]
+            )
+
+        for t in range(self.rollout_length):
+            buffer.add(
+                obs[t], actions[t],
+                np.array([r["rewards"][t] for r in batch]),
+                np.array([r["episode_starts"][t] for r in batch]),
+                values[t],
+                th.as_tensor(np.array([r["log_probs"][t] for r in batch]), device=model.device),
+            )
+        dones = np.array([r["last_episode_start"] for r in batch], dtype=np.float32)
+        buffer.compute_returns_and_advantage(last_values=last_values, dones=dones)
+        return buffer
+
+    def learn(self, total_timesteps: int, tb_log_name: str = "AsyncPPO"):
+        """Train until the learner has consumed ``total_timesteps`` environment steps."""
+        model = self.model
+        model.set_logger(configure_logger(model.verbose, model.tensorboard_log, tb_log_name))
+        model.policy.set_training_mode(False)
+        self._start_actors()
+        start_timesteps = model.num_timesteps
+        try:
+            while model.num_timesteps - start_timesteps < total_timesteps:
+                batch = self._collect()
+                model.rollout_buffer = self._fill_buffer(batch)
+                model.num_timesteps += self.rollout_length * len(batch)
+                model._current_progress_remaining = 1.0 - (model.num_timesteps - start_timesteps) / total_timesteps
+
+                episodes = [episode for r in batch for episode in r["episodes"]]
+                if episodes:
+                    model.logger.record("rollout/ep_rew_mean", float(np.mean([e[0] for e in episodes])))
+                    model.logger.record("rollout/ep_len_mean", float(np.mean([e[1] for e in episodes])))
+                for key, value in self.stats.items():
+                    model.logger.record(f"async/{key}", value)
+
+                model.train()
+                self.policy_version += 1
+                self._publish_weights()
+                model.logger.record("async/policy_version", self.policy_version)
+                model.logger.dump(step=model.num_timesteps)
+        finally:
+            self._stop_actors()
+        return model
+
+
+if __name__ == "__main__":
+    from stable_baselines3 import PPO
+
+    env_kwargs = dict(continuous=True, frame_stack=4, grayscale=True, obs_dtype="uint8")
+    model = PPO("CnnPolicy", CarRacingWrapper(**env_kwargs), n_steps=256, verbose=1, ent_coef=0.0075,
+                tensorboard_log="./logs/CarRacing-v3/tensorboard/")
+    trainer = AsyncActorLearner(model, env_kwargs, n_actors=4, max_lag=2)
+    trainer.learn(total_timesteps=100000)
+    model.save("ppo_car_racing_async")
@@ -0,0 +1,266 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import gymnasium as gym
+import numpy as np
+
+from headless import use_headless_display
+from step_profiler import StageProfiler
+
+STAGES = ("physics", "render", "preprocess", "frame_stack", "reward")
+
+
+class _ProfiledCarRacing(gym.Wrapper):
+    """Times a bare CarRacing environment, which has no built-in stages, from outside."""
+
+    def __init__(self, env: gym.Env, profiler: StageProfiler):
+        super().__init__(env)
+        self.profiler = profiler
+        profiler.instrument(env.unwrapped, "_render", "render")
+
+    def reset(self, **kwargs):
+        with self.profiler.stage("reset"):
+            obs, info = self.env.reset(**kwargs)
+        self.profiler.reset_done(info)
+        return obs, info
+
+    def step(self, action):
+        with self.profiler.stage("physics"):
+            result = self.env.step(action)
+        self.profiler.step_done(result[4])
+        return result
+
+
+def _make_env(kind: str, config: Dict[str, Any], profiler: StageProfiler):
+    """Build an environment for ``config`` timed by ``profiler``."""
+    if kind == "single":
+        from env_setup import CarRacingWrapper
+
+        env = CarRacingWrapper(continuous=True, frame_stack=config["frame_stack"], grayscale=config["grayscale"],
+                               obs_dtype=config["obs_dtype"], profiler=profiler)
+        sample_action = lambda rng: rng.uniform(-1, 1, 3).astype(np.float32)
+    elif kind == "marl":
+        from marl_env import MultiAgentCarRacingEnv
+
+        env = MultiAgentCarRacingEnv(n_agents=config["n_agents"], frame_stack=config["frame_stack"],
+                                     grayscale=config["grayscale"], obs_dtype=config["obs_dtype"],
+                                     vectorization=config["vectorization"], profiler=profiler)
+        n_agents = config["n_agents"]
+        sample_action = lambda rng: [rng.uniform(-1, 1, 3).astype(np.float32) for _ in range(n_agents)]
+    elif kind == "circular":
+        from circular_env import CircularCarRacing
+
+        env = _ProfiledCarRacing(CircularCarRacing(track_spec=config["track"]), profiler)
+        sample_action = lambda rng: rng.uniform(-1, 1, 3).astype(np.float32)
+    else:
+        raise ValueError(f"Unknown benchmark kind {kind!r}")
+    return env, sample_action
+
+
+def _worker_peak_rss_mb(env) -> float:
+    """Largest peak RSS among the env's worker processes (subprocess vectorization), 0 without workers."""
+    processes = getattr(getattr(env, "agent_pool", None), "processes", [])
+    peak_kb = 0
+    for process in processes:
+        try:
+            with open(f"/proc/{process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak_kb = max(peak_kb, int(line.split()[1]))
+        except OSError:
+            # No procfs: only workers this process reaped itself are visible
+            rss_scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * rss_scale / 2 ** 20
+    return peak_kb / 2 ** 10
+
+
+def run_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Benchmark one configuration; meant to run in a fresh process so memory figures are its own.
+
+    Peak memory is the maximum resident set size of this process and, separately,
+    of the largest worker process it started (subprocess vectorization).
+    """
+    use_headless_display()
+    profiler = StageProfiler(log_dir=None, log_every=0)
+    env, sample_action = _make_env(config["kind"], config, profiler)
+    rng = np.random.default_rng(config["seed"])
+    n_agents = config.get("n_agents", 1)
+
+    def all_done(terminated, truncated):
+        return bool(np.all(np.logical_or(terminated, truncated)))
+
+    # Reset latency, then warm up before timing steps
+    reset_times = []
+    for k in range(config["n_resets"]):
+        start = time.perf_counter()
+        env.reset(seed=config["seed"] + k)
+        reset_times.append(time.perf_counter() - start)
+    reset_stages = profiler.summary(resets=True)
+    for _ in range(config["warmup_steps"]):
+        if all_done(*env.step(sample_action(rng))[2:4]):
+            env.reset()
+
+    profiler.reset()
+    step_time = 0.0
+    for _ in range(config["n_steps"]):
+        action = sample_action(rng)
+        start = time.perf_counter()
+        terminated, truncated = env.step(action)[2:4]
+        step_time += time.perf_counter() - start
+        if all_done(terminated, truncated):
+            env.reset()  # excluded from step timing; the profiler keeps resets apart too
+    step_stages = profiler.summary()
+    worker_peak_rss_mb = _worker_peak_rss_mb(env)
+    env.close()
+
+    n_steps = config["n_steps"]
+    stage_ms = {stage: step_stages[stage]["total_ms"] / n_steps if stage in step_stages else 0.0
+                for stage in STAGES}
+    stage_ms["other"] = max(0.0, 1e3 * step_time / n_steps - sum(stage_ms.values()))
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "config": config,
+        "steps_per_second": n_steps / step_time,
+        "agent_steps_per_second": n_steps * n_agents / step_time,
+        "step_ms": 1e3 * step_time / n_steps,
+        "reset_ms": {
+            "mean": 1e3 * float(np.mean(reset_times)),
+            "p50": 1e3 * float(np.median(reset_times)),
+            "max": 1e3 * float(np.max(reset_times)),
+        },
+        "stage_ms": stage_ms,
+        "reset_stage_ms": {stage: stats["total_ms"] / config["n_resets"] for stage, stats in reset_stages.items()},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_scale / 2 ** 20,
+        "peak_worker_rss_mb": worker_peak_rss_mb,
+    }
+
+
+def config_name(config: Dict[str, Any]) -> str:
+    keys = [k for k in ("n_agents", "vectorization", "frame_stack", "grayscale", "obs_dtype", "track") if k in config]
+    return config["kind"] + "[" + ",".join(f"{k}={config[k]}" for k in keys) + "]"
+
+
+def sweep_configs(quick: bool = False, n_steps: int = 300, n_resets: int = 5, warmup_steps: int = 20,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    """The benchmark matrix: frame stacking and grayscale per env, agent count and backend for MARL."""
+    common = dict(n_steps=n_steps, n_resets=n_resets, warmup_steps=warmup_steps, seed=seed)
+    configs = []
+    for frame_stack in ((4,) if quick else (1, 4)):
+        for grayscale in (True, False):
+            configs.append(dict(common, kind="single", frame_stack=frame_stack, grayscale=grayscale,
+                                obs_dtype="uint8"))
+            configs.append(dict(common, kind="single", frame_stack=frame_stack, grayscale=grayscale,
+                                obs_dtype="float32"))
+    for vectorization in ("serial", "subprocess", "shared_world"):
+        for n_agents in ((2, 4) if quick else (1, 2, 4, 8)):
+            configs.append(dict(common, kind="marl", n_agents=n_agents, vectorization=vectorization,
+                                frame_stack=4, grayscale=True, obs_dtype="uint8"))
+    if not quick:
+        configs.append(dict(common, kind="marl", n_agents=4, vectorization="serial", frame_stack=4,
+                            grayscale=False, obs_dtype="uint8"))
+    configs.append(dict(common, kind="circular", track="oval"))
+    return configs
+
+
+def environment_info() -> Dict[str, Any]:
+    """Commit and machine details stored with the results so runs can be compared."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(configs: List[Dict[str, Any]], on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+              start_method: Optional[str] = None) -> Dict[str, Any]:
+    """Run every config in its own worker process, one at a time so they do not compete for cores."""
+    if start_method is None:
+        # forkserver is safer than fork with pygame/SDL state in the parent
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(start_method)
+    results = []
+    for config in configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            result = executor.submit(run_config, config).result()
+        result["name"] = config_name(config)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return {"environment": environment_info(), "results": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """Configs whose throughput dropped by more than ``tolerance`` relative to ``baseline``."""
+    baseline_sps = {result["name"]: result["steps_per_second"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline_sps.get(result["name"])
+        if before and result["steps_per_second"] < (1 - tolerance) * before:
+            regressions.append(
+                f"{result['name']}: {before:.1f} -> {result['steps_per_second']:.1f} steps/s "
+                f"({result['steps_per_second'] / before - 1:+.0%})"
+            )
+    return regressions
+
+
+def print_result(result: Dict[str, Any]):
+    stages = " ".join(f"{stage}={ms:.2f}" for stage, ms in result["stage_ms"].items())
+    print(f"{result['name']:<70} {result['steps_per_second']:8.1f} steps/s  reset {result['reset_ms']['mean']:7.1f} ms  "
+          f"peak {result['peak_rss_mb']:6.0f} MB (workers {result['peak_worker_rss_mb']:.0f} MB)  [{stages} ms/step]", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark environment step throughput and reset latency.")
+    parser.add_argument("--quick", action="store_true", help="smaller sweep for quick checks")
+    parser.add_argument("--steps", type=int, default=300, help="timed steps per config")
+    parser.add_argument("--resets", type=int, default=5, help="timed resets per config")
+    parser.add_argument("--filter", default=None, help="only run configs whose name contains this string")
+    parser.add_argument("--output", default=None, help="results JSON path (default: logs/benchmarks/<time>_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative throughput drop")
+    args = parser.parse_args()
+
+    configs = sweep_configs(quick=args.quick, n_steps=args.steps, n_resets=args.resets)
+    if args.filter:
+        configs = [config for config in configs if args.filter in config_name(config)]
+    results = run_suite(configs, on_result=print_result)
+
+    output = args.output
+    if output is None:
+        commit = (results["environment"]["commit"] or "nocommit")[:8]
+        output = os.path.join("logs", "benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}_{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,119 +2,138 @@ import gymnasium as gym
 from gymnasium.envs.box2d.car_racing import CarRacing, BORDER, TRACK_WIDTH
 import numpy as np
 import math
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+from track_library import TRACK_LIBRARY, Segment, TrackLayout, oval, spec_key
 
 class CircularCarRacing(CarRacing):
-    def _create_track(self):
-        """
-        Generates a geometrically perfect oval track composed of two straights
-        and two semicircles, ensuring a clean and reliable loop.
-        """
-        self.road = []
-        self.road_poly = []
+    """
+    CarRacing on a procedural track built from straights, arcs and chicanes.
+
+    ``track_spec`` is a list of segments from ``track_library`` or the name of a
+    track in ``TRACK_LIBRARY``; by default it is the oval of two straights of
+    ``straight_length`` joined by two semicircles of ``turn_radius``. The centerline
+    is sampled every ``tile_spacing`` units into a ``TrackLayout`` (exposed as
+    ``self.layout``) whose arc-length/curvature index answers progress and off-track
+    queries without scanning tiles. Kerbs are drawn on the outside of corners with
+    |curvature| >= ``border_curvature``.
+
+    The layout and its tile/border polygons are computed once and cached at class
+    level per (spec, tile_spacing). The road tiles' Box2D static bodies are created
+    on the first reset and reused afterwards; later resets only reset the tiles'
+    visited flags and colours.
+    """
+
+    # (spec key, tile_spacing, border_curvature) -> precomputed geometry
+    _geometry_cache: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+
+    def __init__(
+        self,
+        track_spec: Optional[Union[str, Sequence[Segment]]] = None,
+        straight_length: float = 300,
+        turn_radius: float = 100,
+        tile_spacing: float = 7.5,
+        border_curvature: float = 1 / 200,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        if track_spec is None:
+            track_spec = oval(straight_length, turn_radius)
+        elif isinstance(track_spec, str):
+            if track_spec not in TRACK_LIBRARY:
+                raise ValueError(f"Unknown track {track_spec!r}, expected one of {sorted(TRACK_LIBRARY)}")
+            track_spec = TRACK_LIBRARY[track_spec]
+        self.track_spec = list(track_spec)
+        self.tile_spacing = tile_spacing
+        self.border_curvature = border_curvature
+        self.layout = self._get_geometry()["layout"]
+
+    @classmethod
+    def _build_geometry(cls, track_spec: Sequence[Segment], tile_spacing: float, border_curvature: float) -> Dict[str, Any]:
+        """Lay out the centerline and compute the tile and border polygons in one vectorized pass."""
+        layout = TrackLayout(track_spec, tile_spacing=tile_spacing)
+        xy, heading = layout.points, layout.heading
+        n = len(layout)
+        alpha = 2 * math.pi * layout.s / layout.total_length
+        # CarRacing's beta is the car angle, i.e. the heading measured from +y
+        beta = heading - math.pi / 2
+        track = [tuple(row) for row in np.column_stack([alpha, beta, xy]).tolist()]
+
+        # Each tile spans from the previous centerline point to the current one
+        xy1, xy2 = xy, np.roll(xy, 1, axis=0)
+        perp1, perp2 = heading + math.pi / 2, np.roll(heading, 1) + math.pi / 2
+        n1 = np.stack([np.cos(perp1), np.sin(perp1)], axis=1)
+        n2 = np.stack([np.cos(perp2), np.sin(perp2)], axis=1)
+        tiles = np.stack([xy1 + TRACK_WIDTH * n1, xy1 - TRACK_WIDTH * n1,
+                          xy2 - TRACK_WIDTH * n2, xy2 + TRACK_WIDTH * n2], axis=1)
+
+        # Kerbs go on the outside of the corner: left of a right turn, right of a left turn
+        side = -np.sign(np.roll(layout.curvature, 1))[:, None]
+        borders = np.stack([xy1 + side * TRACK_WIDTH * n1,
+                            xy1 + side * (TRACK_WIDTH + BORDER) * n1,
+                            xy2 + side * (TRACK_WIDTH + BORDER) * n2,
+                            xy2 + side * TRACK_WIDTH * n2], axis=1)
+        # The tile ending at point i covers the step from point i - 1
+        border = np.roll(layout.border_mask(border_curvature), 1)
+
+        return {
+            "layout": layout,
+            "track": track,
+            "tile_idx": list(range(n)),
+            "tiles": [[tuple(v) for v in poly] for poly in tiles.tolist()],
+            "borders": [
+                [tuple(v) for v in poly] if has_border else None
+                for poly, has_border in zip(borders.tolist(), border)
+            ],
+        }
+
+    def _get_geometry(self) -> Dict[str, Any]:
+        key = (spec_key(self.track_spec), self.tile_spacing, self.border_curvature)
+        geometry = self._geometry_cache.get(key)
+        if geometry is None:
+            geometry = self._build_geometry(self.track_spec, self.tile_spacing, self.border_curvature)
+            self._geometry_cache[key] = geometry
+        return geometry
+
+    def track_progress(self) -> float:
+        """Fraction of the lap at the centerline point nearest the car."""
+        return self.layout.progress(self.car.hull.position)
+
+    def is_off_track(self) -> bool:
+        """Whether the car is further than a track half-width from the centerline."""
+        return self.layout.is_off_track(self.car.hull.position)
+
+    def _destroy(self):
+        # Road tiles are static and reused across resets; only the car is rebuilt
+        if self.car is not None:
+            self.car.destroy()
+            self.car = None
 
-        # ==========================================================================
-        # === THE DEFINITIVE FIX: Build the track from geometric primitives    ======
-        # === (straights and semicircles) for 100% predictable results.      ======
-        # ==========================================================================
-        
-        centerline = []
-        STRAIGHT_LENGTH = 300
-        TURN_RADIUS = 100
-        TRACK_DETAIL = 40  # Points per turn/straight
-
-        # Helper to create a straight line
-        def create_straight(start, end, num_points):
-            for i in range(num_points):
-                t = i / (num_points - 1)
-                x = start[0] * (1 - t) + end[0] * t
-                y = start[1] * (1 - t) + end[1] * t
-                centerline.append((x, y))
-
-        # Helper to create a semicircle turn
-        def create_turn(center, radius, start_angle, end_angle, num_points):
-            for i in range(num_points):
-                t = i / (num_points - 1)
-                angle = start_angle * (1 - t) + end_angle * t
-                x = center[0] + radius * math.cos(angle)
-                y = center[1] + radius * math.sin(angle)
-                centerline.append((x, y))
-
-        # 1. Front Straight (going up)
-        create_straight(start=(0, 0), end=(0, STRAIGHT_LENGTH), num_points=TRACK_DETAIL)
-
-        # 2. Top Semicircle (180 degrees)
-        create_turn(center=(TURN_RADIUS, STRAIGHT_LENGTH), radius=TURN_RADIUS, start_angle=math.pi, end_angle=0, num_points=TRACK_DETAIL * 2)
-
-        # 3. Back Straight (going down)
-        create_straight(start=(TURN_RADIUS * 2, STRAIGHT_LENGTH), end=(TURN_RADIUS * 2, 0), num_points=TRACK_DETAIL)
-
-        # 4. Bottom Semicircle (180 degrees, closing the loop)
-        create_turn(center=(TURN_RADIUS, 0), radius=TURN_RADIUS, start_angle=0, end_angle=-math.pi, num_points=TRACK_DETAIL * 2)
-
-
-        track = []
-        for i, (x, y) in enumerate(centerline):
-            look_ahead = 5
-            x_next, y_next = centerline[(i + look_ahead) % len(centerline)]
-            dx, dy = x_next - x, y_next - y
-            beta = math.atan2(dy, dx)
-            alpha = 2 * math.pi * i / len(centerline)
-            track.append((alpha, beta, x, y))
-
-        # Re-center the track so the start is exactly at (0,0)
-        x_offset, y_offset = track[0][2], track[0][3]
-        final_track = []
-        for i in range(len(track)):
-            alpha, beta, x, y = track[i]
-            final_track.append((alpha, beta, x - x_offset, y - y_offset))
-        self.track = final_track
-        
-        # GUARANTEE the car spawns facing perfectly UP
-        if len(self.track) > 0:
-            alpha0, _, x0, y0 = self.track[0]
-            self.track[0] = (alpha0, 0, x0, y0)
-        
+    def _create_track(self):
+        """Builds the track from the cached layout of ``track_spec``."""
+        geometry = self._get_geometry()
+        self.track = list(geometry["track"])
         self.start_alpha = 0
 
-        # Detect borders
-        border = [False] * len(self.track)
-        BORDER_MIN_COUNT = 4
-        # A simple way to add borders on turns for this geometric track
-        for i in range(len(self.track)):
-            # The turns are the second and fourth quarters of the track array
-            is_on_turn1 = TRACK_DETAIL < i < TRACK_DETAIL * 3
-            is_on_turn2 = TRACK_DETAIL * 4 < i < TRACK_DETAIL * 6
-            if is_on_turn1 or is_on_turn2:
-                border[i] = True
-
-        for i in range(len(self.track)):
-            alpha1, beta1, x1, y1 = self.track[i]
-            alpha2, beta2, x2, y2 = self.track[(i - 1) % len(self.track)]
-
-            if math.sqrt((x1-x2)**2 + (y1-y2)**2) < 0.1: continue
-
-            perp1, perp2 = beta1 + math.pi / 2, beta2 + math.pi / 2
-            road1_l = (x1 + TRACK_WIDTH * math.cos(perp1), y1 + TRACK_WIDTH * math.sin(perp1))
-            road1_r = (x1 - TRACK_WIDTH * math.cos(perp1), y1 - TRACK_WIDTH * math.sin(perp1))
-            road2_l = (x2 + TRACK_WIDTH * math.cos(perp2), y2 + TRACK_WIDTH * math.sin(perp2))
-            road2_r = (x2 - TRACK_WIDTH * math.cos(perp2), y2 - TRACK_WIDTH * math.sin(perp2))
-            
-            self.fd_tile.shape.vertices = [road1_l, road1_r, road2_r, road2_l]
-            t = self.world.CreateStaticBody(fixtures=self.fd_tile)
-            t.userData = t
-            t.color = self.road_color + 0.01 * (i % 3) * 255
-            t.road_visited, t.road_friction, t.idx = False, 1.0, i
-            t.fixtures[0].sensor = True
-            self.road_poly.append(([road1_l, road1_r, road2_r, road2_l], t.color))
-            self.road.append(t)
-
-            if border[i]:
-                side = 1
-                b1_l = (x1 + side * TRACK_WIDTH * math.cos(perp1), y1 + side * TRACK_WIDTH * math.sin(perp1))
-                b1_r = (x1 + side * (TRACK_WIDTH + BORDER) * math.cos(perp1), y1 + side * (TRACK_WIDTH + BORDER) * math.sin(perp1))
-                b2_l = (x2 + side * TRACK_WIDTH * math.cos(perp2), y2 + side * TRACK_WIDTH * math.sin(perp2))
-                b2_r = (x2 + side * (TRACK_WIDTH + BORDER) * math.cos(perp2), y2 + side * (TRACK_WIDTH + BORDER) * math.sin(perp2))
-                self.road_poly.append(( [b1_l, b1_r, b2_r, b2_l], (255, 255, 255) if i % 2 == 0 else (255, 0, 0)))
+        if not self.road:
+            # First reset: create the tile bodies once
+            self.road = []
+            for i, vertices in zip(geometry["tile_idx"], geometry["tiles"]):
+                self.fd_tile.shape.vertices = vertices
+                t = self.world.CreateStaticBody(fixtures=self.fd_tile)
+                t.userData = t
+                t.color = self.road_color + 0.01 * (i % 3) * 255
+                t.road_friction, t.idx = 1.0, i
+                t.fixtures[0].sensor = True
+                self.road.append(t)
+
+        self.road_poly = []
+        for t, vertices, border in zip(self.road, geometry["tiles"], geometry["borders"]):
+            # Reset tile state in place so road_poly keeps sharing the colour array
+            t.road_visited = False
+            t.color[:] = self.road_color + 0.01 * (t.idx % 3) * 255
+            self.road_poly.append((vertices, t.color))
+            if border is not None:
+                self.road_poly.append((border, (255, 255, 255) if t.idx % 2 == 0 else (255, 0, 0)))
 
         return True
 
@@ -126,4 +145,3 @@ try:
     )
 except gym.error.Error:
     pass
-
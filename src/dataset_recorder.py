@@ -0,0 +1,249 @@
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+
+from trajectory_store import TrajectoryStore
+
+
+class _DatasetWriter(threading.Thread):
+    """Background thread appending queued rows to the dataset stores in chunks."""
+
+    def __init__(self, store: TrajectoryStore, terminal_store: TrajectoryStore, chunk_size: int, max_pending: int,
+                 flush_seconds: float = 1.0):
+        super().__init__(daemon=True)
+        self.flush_seconds = flush_seconds
+        self.store = store
+        self.terminal_store = terminal_store
+        self.chunk_size = chunk_size
+        self.rows = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+
+    def put(self, row: Optional[Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]]):
+        if self.error is not None:
+            raise RuntimeError("Dataset writer thread failed") from self.error
+        self.rows.put(row)
+
+    def _write(self, chunk: List[Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]]):
+        terminals = [terminal for _, terminal in chunk if terminal is not None]
+        first_terminal = len(self.terminal_store)
+        if terminals:
+            self.terminal_store.append(observations=np.stack(terminals))
+        terminal_index, k = [], first_terminal
+        for _, terminal in chunk:
+            terminal_index.append(-1 if terminal is None else k)
+            k += terminal is not None
+        columns = {name: np.stack([row[name] for row, _ in chunk]) for name in chunk[0][0]}
+        self.store.append(terminal_index=np.array(terminal_index, dtype=np.int64), **columns)
+        # Terminal rows first, so a committed row never points past the terminal store
+        self.terminal_store.flush()
+        self.store.flush()
+
+    def run(self):
+        chunk = []
+        try:
+            while True:
+                try:
+                    row = self.rows.get(timeout=self.flush_seconds)
+                except queue.Empty:
+                    # Stepping paused: commit what we have
+                    if chunk:
+                        self._write(chunk)
+                        chunk = []
+                    continue
+                if row is None:
+                    break
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self._write(chunk)
+                    chunk = []
+            if chunk:
+                self._write(chunk)
+        except BaseException as e:
+            self.error = e
+
+
+class RecordingWrapper(gym.Wrapper):
+    """
+    Records the transitions of a ``CarRacingWrapper`` or ``MultiAgentCarRacingEnv``
+    into a ``TrajectoryStore`` at ``path``.
+
+    Each step becomes one row: the observation the action was taken in, the action,
+    reward, terminated/truncated flags, the episode number and the ``info_keys``
+    values as float32 (NaN when missing). Multi-agent rows hold every agent's
+    entries along a leading agent axis, with info values taken from
+    ``info["agent_infos"]``. A row's next observation is the next row's observation,
+    except for the last row of an episode, whose next observation goes to a
+    separate terminal store.
+
+    Rows are handed to a background writer thread that appends them in chunks of up
+    to ``chunk_size``, so ``step`` never waits on disk unless the writer falls
+    ``max_pending`` rows behind. Call ``close`` to flush everything.
+    """
+
+    def __init__(self, env: gym.Env, path: str, info_keys: Sequence[str] = (), chunk_size: int = 256,
+                 max_pending: int = 10000, segment_size: int = 10000):
+        super().__init__(env)
+        self.info_keys = list(info_keys)
+        self.multi_agent = isinstance(env.observation_space, spaces.Tuple)
+        if self.multi_agent:
+            n_agents = len(env.observation_space.spaces)
+            obs_space, action_space = env.observation_space.spaces[0], env.action_space.spaces[0]
+            lead: Tuple[int, ...] = (n_agents,)
+        else:
+            obs_space, action_space = env.observation_space, env.action_space
+            lead = ()
+
+        obs_column = (lead + obs_space.shape, obs_space.dtype)
+        columns = {
+            "observations": obs_column,
+            "actions": (lead + action_space.shape, action_space.dtype),
+            "rewards": (lead, np.float32),
+            "terminated": (lead, bool),
+            "truncated": (lead, bool),
+            "episode": ((), np.int64),
+            "terminal_index": ((), np.int64),  # row in the terminal store, -1 if the episode continues
+        }
+        for key in self.info_keys:
+            columns[f"info_{key}"] = (lead, np.float32)
+
+        store = TrajectoryStore(path, columns, segment_size)
+        terminal_store = TrajectoryStore(os.path.join(path, "terminal"), {"observations": obs_column}, segment_size)
+        if len(store) and store.gather("terminal_index", [len(store) - 1])[0] < 0:
+            self._end_unclosed(store, terminal_store)
+        self.episode = int(store.gather("episode", [len(store) - 1])[0]) + 1 if len(store) else 0
+        self.writer = _DatasetWriter(store, terminal_store, chunk_size, max_pending)
+        self.writer.start()
+        self._obs = None
+        self._pending = None  # (row, next_obs) waiting to learn whether the episode goes on
+
+    @staticmethod
+    def _end_unclosed(store: TrajectoryStore, terminal_store: TrajectoryStore):
+        """
+        Drop the last row of a recording that was never closed, whose next observation
+        was lost, and end the row before it with the dropped row's observation.
+        """
+        last = len(store) - 1
+        last_obs = store.gather("observations", [last])
+        if last > 0 and store.gather("terminal_index", [last - 1])[0] < 0:
+            k = terminal_store.append(observations=last_obs)
+            terminal_store.flush()
+            store.write("terminal_index", last - 1, k)
+        store.truncate(last)
+
+    def _to_array(self, values) -> np.ndarray:
+        return np.stack([np.asarray(v) for v in values]) if self.multi_agent else np.asarray(values)
+
+    def _info_values(self, info: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        values = {}
+        for key in self.info_keys:
+            if self.multi_agent:
+                agent_infos = info.get("agent_infos", [])
+                values[f"info_{key}"] = np.array([agent_info.get(key, np.nan) for agent_info in agent_infos],
+                                                 dtype=np.float32)
+            else:
+                values[f"info_{key}"] = np.float32(info.get(key, np.nan))
+        return values
+
+    def _end_episode(self):
+        """Write the pending row as the episode's last, with its next observation."""
+        if self._pending is not None:
+            row, next_obs = self._pending
+            self.writer.put((row, next_obs))
+            self._pending = None
+            self.episode += 1
+
+    def reset(self, **kwargs):
+        self._end_episode()
+        obs, info = self.env.reset(**kwargs)
+        self._obs = self._to_array(obs)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        next_obs = self._to_array(obs)
+        row = {
+            "observations": self._obs,
+            "actions": self._to_array(action),
+            "rewards": np.asarray(reward, dtype=np.float32),
+            "terminated": np.asarray(terminated, dtype=bool),
+            "truncated": np.asarray(truncated, dtype=bool),
+            "episode": np.int64(self.episode),
+            **self._info_values(info),
+        }
+        # The previous row's next observation is this row's observation
+        if self._pending is not None:
+            self.writer.put((self._pending[0], None))
+        self._pending = (row, next_obs)
+        if np.all(row["terminated"] | row["truncated"]):
+            self._end_episode()
+        self._obs = next_obs
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self._end_episode()
+        if self.writer.is_alive():
+            self.writer.put(None)
+            self.writer.join()
+        if self.writer.error is not None:
+            raise RuntimeError("Dataset writer thread failed") from self.writer.error
+        super().close()
+
+
+class OfflineDataset:
+    """
+    Reads a dataset written by ``RecordingWrapper`` without loading it into RAM.
+
+    ``minibatches`` yields dicts of columns (``observations``, ``actions``,
+    ``rewards``, ``terminated``, ``truncated``, ``episode``, ``info_...`` and,
+    with ``with_next_obs``, ``next_observations``) for behavior cloning or
+    offline RL. Rows are read from the memory-mapped segments per batch, sorted by
+    index within a batch so reads stay mostly sequential on disk. The last row of
+    a recording that is still running or was never closed has no next observation
+    yet and is left out.
+    """
+
+    def __init__(self, path: str):
+        self.store = TrajectoryStore(path, read_only=True)
+        self.terminal_store = TrajectoryStore(os.path.join(path, "terminal"), read_only=True)
+        self.size = len(self.store)
+        if self.size and self.store.gather("terminal_index", [self.size - 1])[0] < 0:
+            self.size -= 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def columns(self) -> List[str]:
+        return [name for name in self.store.columns if name != "terminal_index"]
+
+    def get(self, indices: np.ndarray, columns: Optional[Sequence[str]] = None,
+            with_next_obs: bool = True) -> Dict[str, np.ndarray]:
+        """Rows at ``indices`` (in the given order)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) and not (0 <= indices.min() and indices.max() < self.size):
+            raise IndexError(f"Row indices must be in [0, {self.size})")
+        batch = {name: self.store.gather(name, indices) for name in (columns or self.columns)}
+        if with_next_obs:
+            terminal_index = self.store.gather("terminal_index", indices)
+            ended = terminal_index >= 0
+            next_obs = self.store.gather("observations", np.where(ended, indices, indices + 1))
+            if ended.any():
+                next_obs[ended] = self.terminal_store.gather("observations", terminal_index[ended])
+            batch["next_observations"] = next_obs
+        return batch
+
+    def minibatches(self, batch_size: int, shuffle: bool = True, seed: Optional[int] = None,
+                    columns: Optional[Sequence[str]] = None, with_next_obs: bool = True,
+                    drop_last: bool = False) -> Iterator[Dict[str, np.ndarray]]:
+        """One pass over the dataset in (shuffled) minibatches."""
+        order = np.random.default_rng(seed).permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            if drop_last and len(indices) < batch_size:
+                break
+            yield self.get(np.sort(indices), columns, with_next_obs)
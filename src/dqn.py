@@ -1,4 +1,3 @@
-from huggingface_hub import hf_hub_download
 import torch as th
 import gymnasium as gym
 from stable_baselines3 import DQN
@@ -6,22 +5,31 @@ from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.vec_env import VecTransposeImage
 from stable_baselines3.common.vec_env import VecFrameStack
 from stable_baselines3.common.atari_wrappers import WarpFrame
+from model_registry import load_model
+from headless import headless_requested, use_headless_display
 
-# Download the model from the Hub
-model_path = hf_hub_download(repo_id="kuds/car-racing-dqn", filename="best_model.zip")
 
-# Load the model
-model = DQN.load(model_path)
+def main(headless: bool = False, render_every: int = 1):
+    if headless:
+        use_headless_display()
 
-# Create the environment
-env_kwargs_dict={"continuous": False}
-env = make_vec_env("CarRacing-v3", n_envs=1, env_kwargs=env_kwargs_dict, wrapper_class=WarpFrame)
-env = VecFrameStack(env, n_stack=4)
-env = VecTransposeImage(env)
+    # Load the model from the Hub (cached locally after the first download)
+    model = load_model(DQN, repo_id="kuds/car-racing-dqn", filename="best_model.zip")
 
-# Enjoy the trained agent
-obs = env.reset()
-for i in range(1000):
-    action, _states = model.predict(obs, deterministic=True)
-    obs, rewards, dones, info = env.step(action)
-    env.render("human")
+    # Create the environment
+    env_kwargs_dict={"continuous": False}
+    env = make_vec_env("CarRacing-v3", n_envs=1, env_kwargs=env_kwargs_dict, wrapper_class=WarpFrame)
+    env = VecFrameStack(env, n_stack=4)
+    env = VecTransposeImage(env)
+
+    # Enjoy the trained agent
+    obs = env.reset()
+    for i in range(1000):
+        action, _states = model.predict(obs, deterministic=True)
+        obs, rewards, dones, info = env.step(action)
+        if not headless and i % render_every == 0:
+            env.render("human")
+
+
+if __name__ == "__main__":
+    main(headless=headless_requested())
@@ -91,20 +91,42 @@ import gymnasium as gym
 import numpy as np
 import cv2
 from typing import Any, Tuple, Optional, Dict
+from frame_buffer import RingFrameStack
+from headless import HumanRenderThrottle, resolve_render_mode
+from step_profiler import StageProfiler
 
 class CarRacingWrapper(gym.Env):
     """
     Proper Gymnasium-compatible wrapper for CarRacing-v3 environment
+
+    With ``render_mode="human"`` the window is drawn on every ``render_every``-th
+    step only. ``headless=True`` never initializes a display: "human" rendering is
+    dropped and SDL uses its dummy drivers, while observations are produced as usual.
+
+    Passing a ``StageProfiler`` times the physics, render, preprocess and
+    frame_stack stages of every step (and reset) and adds them to ``info``.
     """
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 50}
 
-    def __init__(self, continuous: bool = True, frame_stack: int = 4, grayscale: bool = True, render_mode: str = None):
+    def __init__(self, continuous: bool = True, frame_stack: int = 4, grayscale: bool = True, render_mode: str = None,
+                 obs_dtype: str = "float32", render_every: int = 1, headless: bool = False,
+                 profiler: Optional[StageProfiler] = None):
         super().__init__()
         
-        self.env = gym.make("CarRacing-v3", continuous=continuous, render_mode=render_mode)
+        if obs_dtype not in ("float32", "uint8"):
+            raise ValueError(f"obs_dtype must be 'float32' or 'uint8', got {obs_dtype!r}")
+
+        self.render_mode = resolve_render_mode(render_mode, headless)
+        self.env = gym.make("CarRacing-v3", continuous=continuous, render_mode=self.render_mode)
+        self.render_throttle = HumanRenderThrottle(self.env, render_every)
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        # CarRacing renders the observation inside its own step and reset
+        self.profiler.instrument(self.env.unwrapped, "_render", "render")
         self.continuous = continuous
         self.frame_stack = frame_stack
         self.grayscale = grayscale
+        # "uint8" keeps raw pixels and leaves normalization to the policy
+        self.obs_dtype = np.dtype(obs_dtype)
 
         obs_shape = self.env.observation_space.shape  # (96, 96, 3)
         self.height, self.width, self.channels = obs_shape
@@ -112,8 +134,8 @@ class CarRacingWrapper(gym.Env):
         if grayscale:
             self.channels = 1
 
-        # Initialize frame buffer for stacking
-        self.frames = np.zeros((self.frame_stack, self.height, self.width, self.channels), dtype=np.float32)
+        # Initialize circular frame buffer for stacking
+        self.frames = RingFrameStack(self.frame_stack, (self.height, self.width, self.channels), dtype=self.obs_dtype)
         
         # Define observation space - FIXED: Use proper image space format
         if grayscale:
@@ -123,11 +145,18 @@ class CarRacingWrapper(gym.Env):
             # For RGB with frame stacking: (12, 96, 96) - 4 frames * 3 channels
             obs_shape = (self.frame_stack * 3, self.height, self.width)
             
-        self.observation_space = gym.spaces.Box(
-            low=0.0, high=1.0, 
-            shape=obs_shape, 
-            dtype=np.float32
-        )
+        if self.obs_dtype == np.uint8:
+            self.observation_space = gym.spaces.Box(
+                low=0, high=255, 
+                shape=obs_shape, 
+                dtype=np.uint8
+            )
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=0.0, high=1.0, 
+                shape=obs_shape, 
+                dtype=np.float32
+            )
         
         # Define action space
         if continuous:
@@ -145,40 +174,51 @@ class CarRacingWrapper(gym.Env):
             obs = cv2.cvtColor(obs, cv2.COLOR_RGB2GRAY)
             obs = np.expand_dims(obs, -1)  # (H, W, 1)
 
+        if self.obs_dtype == np.uint8:
+            return obs
+
         # Normalize to [0, 1]
         obs = obs.astype(np.float32) / 255.0
         return obs
 
     def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
-        obs, info = self.env.reset(seed=seed, options=options)
-        obs = self.preprocess(obs)
-        self.frames[:] = obs  # fill all frame stack initially
+        profiler = self.profiler
+        with profiler.stage("reset"):
+            obs, info = self.env.reset(seed=seed, options=options)
+        with profiler.stage("preprocess"):
+            obs = self.preprocess(obs)
+        with profiler.stage("frame_stack"):
+            self.frames.fill(obs)  # fill all frame stack initially
+        profiler.reset_done(info)
         
         # Return observation in (C, H, W) format for CNN
-        stacked_obs = self._get_obs()
-        return np.transpose(stacked_obs, (2, 0, 1)), info
+        return self._get_obs(), info
 
     def step(self, action: np.ndarray) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
-        next_obs, reward, terminated, truncated, info = self.env.step(action)
-        next_obs = self.preprocess(next_obs)
-
-        # Shift frames and append new one
-        self.frames = np.roll(self.frames, shift=-1, axis=0)
-        self.frames[-1] = next_obs
-
-        # Return observation in (C, H, W) format for CNN
-        stacked_obs = self._get_obs()
-        return np.transpose(stacked_obs, (2, 0, 1)), reward, terminated, truncated, info
+        profiler = self.profiler
+        with self.render_throttle.step(), profiler.stage("physics"):
+            next_obs, reward, terminated, truncated, info = self.env.step(action)
+        with profiler.stage("preprocess"):
+            next_obs = self.preprocess(next_obs)
+
+        # Overwrite the oldest frame in place
+        with profiler.stage("frame_stack"):
+            self.frames.push(next_obs)
+            # Return observation in (C, H, W) format for CNN
+            obs = self._get_obs()
+        profiler.step_done(info)
+        return obs, reward, terminated, truncated, info
 
     def _get_obs(self):
         """Return stacked observation."""
-        return np.concatenate(self.frames, axis=-1)  # (H, W, C * frame_stack)
+        return self.frames.get()  # (C * frame_stack, H, W)
 
     def render(self):
         return self.env.render()
 
     def close(self):
         self.env.close()
+        self.profiler.close()
 
     def seed(self, seed: Optional[int] = None):
         """Set random seed for reproducibility."""
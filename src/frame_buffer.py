@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Optional, Tuple
+
+
+class RingFrameStack:
+    """
+    Circular frame store for stacked observations.
+
+    Frames are kept channel-first in a (n_stacks, frame_stack, C, H, W) buffer and
+    each push overwrites the oldest slot in place, so stepping never shifts the
+    whole stack. Stacks are handed out in (frame_stack * C, H, W) layout, oldest
+    frame first, which matches the old concatenate + transpose output.
+    """
+
+    def __init__(
+        self,
+        frame_stack: int,
+        frame_shape: Tuple[int, int, int],
+        n_stacks: int = 1,
+        dtype=np.float32
+    ):
+        self.frame_stack = frame_stack
+        self.n_stacks = n_stacks
+        self.height, self.width, self.channels = frame_shape
+
+        self.buffer = np.zeros(
+            (n_stacks, frame_stack, self.channels, self.height, self.width), dtype=dtype
+        )
+        # Slot holding the oldest frame of each stack (also the next write slot)
+        self.heads = np.zeros(n_stacks, dtype=np.intp)
+
+    @property
+    def obs_shape(self) -> Tuple[int, int, int]:
+        """Shape of a single stacked observation (C * frame_stack, H, W)."""
+        return (self.frame_stack * self.channels, self.height, self.width)
+
+    def _to_chw(self, frame: np.ndarray) -> np.ndarray:
+        """View an (H, W), (H, W, C) frame as (C, H, W) without copying."""
+        if frame.ndim == 2:
+            return frame[np.newaxis]
+        return np.moveaxis(frame, -1, 0)
+
+    def fill(self, frame: np.ndarray, idx: int = 0):
+        """Fill every slot of a stack with the same frame (used on reset)."""
+        self.buffer[idx] = self._to_chw(frame)
+        self.heads[idx] = 0
+
+    def push(self, frame: np.ndarray, idx: int = 0):
+        """Overwrite the oldest frame of a stack with the newest one."""
+        head = self.heads[idx]
+        self.buffer[idx, head] = self._to_chw(frame)
+        self.heads[idx] = (head + 1) % self.frame_stack
+
+    def push_batch(self, frames: np.ndarray, indices: np.ndarray):
+        """Push channel-first (k, C, H, W) frames into the stacks at ``indices``."""
+        heads = self.heads[indices]
+        self.buffer[indices, heads] = frames
+        self.heads[indices] = (heads + 1) % self.frame_stack
+
+    def fill_batch(self, frames: np.ndarray, indices: np.ndarray):
+        """Fill the stacks at ``indices`` with channel-first (k, C, H, W) frames."""
+        self.buffer[indices] = frames[:, np.newaxis]
+        self.heads[indices] = 0
+
+    def get(self, idx: int = 0, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the ordered stack for one index as (C * frame_stack, H, W), copied once."""
+        if out is None:
+            out = np.empty(self.obs_shape, dtype=self.buffer.dtype)
+        head = self.heads[idx]
+        stack = self.buffer[idx]
+        np.concatenate((stack[head:], stack[:head]), axis=0,
+                       out=out.reshape(self.buffer.shape[1:]))
+        return out
+
+    def get_all(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return every ordered stack as (n_stacks, C * frame_stack, H, W), copied once."""
+        if out is None:
+            out = np.empty((self.n_stacks,) + self.obs_shape, dtype=self.buffer.dtype)
+        order = (self.heads[:, None] + np.arange(self.frame_stack)) % self.frame_stack
+        np.take(self.buffer.reshape(-1, *self.buffer.shape[2:]),
+                (order + np.arange(self.n_stacks)[:, None] * self.frame_stack),
+                axis=0, out=out.reshape(self.buffer.shape))
+        return out
+
+    def reset(self):
+        """Zero all stacks."""
+        self.buffer.fill(0)
+        self.heads.fill(0)
@@ -0,0 +1,60 @@
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+import gymnasium as gym
+
+
+def use_headless_display():
+    """Route SDL (pygame) to its dummy video and audio drivers so no window or device is ever opened."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+
+def resolve_render_mode(render_mode: Optional[str], headless: bool) -> Optional[str]:
+    """
+    Render mode to build CarRacing environments with. Headless runs drop "human"
+    rendering entirely; "rgb_array" still works since it draws off-screen.
+    """
+    if not headless:
+        return render_mode
+    use_headless_display()
+    return None if render_mode == "human" else render_mode
+
+
+class HumanRenderThrottle:
+    """
+    Lets a CarRacing-style environment in "human" mode draw its window on every
+    ``render_every``-th step only (never with ``render_every=0``).
+
+    CarRacing draws and then sleeps to hold ``render_fps`` inside every ``step``
+    while ``render_mode == "human"``, which caps simulation at 50 steps/s. The
+    throttle switches the mode off around the steps in between; observations are
+    rendered off-screen either way and are unaffected.
+    """
+
+    def __init__(self, env: gym.Env, render_every: int = 1):
+        if render_every < 0:
+            raise ValueError(f"render_every must be non-negative, got {render_every}")
+        self.car_racing = env.unwrapped
+        self.human = self.car_racing.render_mode == "human"
+        self.render_every = render_every
+        self.steps = 0
+
+    @contextmanager
+    def step(self):
+        """Wrap one ``env.step`` call."""
+        self.steps += 1
+        if not self.human or (self.render_every and self.steps % self.render_every == 0):
+            yield
+            return
+        self.car_racing.render_mode = None
+        try:
+            yield
+        finally:
+            self.car_racing.render_mode = "human"
+
+
+def headless_requested() -> bool:
+    """Whether the ``HEADLESS`` environment variable asks scripts to run without a display."""
+    return os.environ.get("HEADLESS", "0").lower() not in ("", "0", "false", "no")
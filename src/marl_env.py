@@ -4,6 +4,12 @@ import cv2
 from typing import Any, Tuple, Optional, Dict, List, Union
 from gymnasium import spaces
 import pygame
+from frame_buffer import RingFrameStack
+from preprocessing import BatchFramePreprocessor
+from agent_pool import AGENT_STATE_DTYPE, SerialAgentPool, SharedWorldAgentPool, SubprocAgentPool
+from spatial import neighbor_pairs
+from headless import resolve_render_mode
+from step_profiler import StageProfiler
 # from gymnasium.wrappers import FrameStack, GrayScaleObservation, ResizeObservation
 
 class MultiAgentCarRacingEnv(gym.Env):
@@ -12,6 +18,22 @@ class MultiAgentCarRacingEnv(gym.Env):
     
     This environment supports multiple agents racing simultaneously on the same track.
     Each agent has its own observation space and can take independent actions.
+    
+    With ``vectorization="subprocess"`` the agents' sub-environments are simulated
+    in parallel worker processes (``n_workers`` of them, one per core by default)
+    and their frames are returned through shared memory; the API is unchanged.
+    With ``vectorization="shared_world"`` all agents are cars in a single Box2D
+    world on one track (see ``SharedWorldCarRacing``), so they physically interact.
+    
+    With ``render_mode="human"`` the sub-environments draw their window on every
+    ``render_every``-th step only. ``headless=True`` never initializes a display:
+    "human" rendering is dropped and SDL uses its dummy drivers, while agent
+    observations are produced as usual.
+    
+    Passing a ``StageProfiler`` times the physics, render, preprocess,
+    frame_stack and reward stages of every step (and reset) and adds them to
+    ``info``. Subprocess workers render inside their step, so with
+    ``vectorization="subprocess"`` rendering is counted as physics.
     """
     
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 50}
@@ -25,27 +47,60 @@ class MultiAgentCarRacingEnv(gym.Env):
         render_mode: str = None,
         track_length: int = 1000,
         collision_penalty: float = -10.0,
-        cooperation_reward: float = 1.0
+        cooperation_reward: float = 1.0,
+        collision_distance: float = 20.0,
+        proximity_distance: float = 50.0,
+        obs_dtype: str = "float32",
+        vectorization: str = "serial",
+        n_workers: Optional[int] = None,
+        render_every: int = 1,
+        headless: bool = False,
+        profiler: Optional[StageProfiler] = None
     ):
         super().__init__()
         
+        if obs_dtype not in ("float32", "uint8"):
+            raise ValueError(f"obs_dtype must be 'float32' or 'uint8', got {obs_dtype!r}")
+        if vectorization not in ("serial", "subprocess", "shared_world"):
+            raise ValueError(
+                f"vectorization must be 'serial', 'subprocess' or 'shared_world', got {vectorization!r}"
+            )
+        
         self.n_agents = n_agents
         self.continuous = continuous
         self.frame_stack = frame_stack
         self.grayscale = grayscale
-        self.render_mode = render_mode
+        self.render_mode = resolve_render_mode(render_mode, headless)
         self.track_length = track_length
         self.collision_penalty = collision_penalty
         self.cooperation_reward = cooperation_reward
+        self.collision_distance = collision_distance
+        self.proximity_distance = proximity_distance
+        # "uint8" keeps raw pixels and leaves normalization to the policy
+        self.obs_dtype = np.dtype(obs_dtype)
+        
+        self.vectorization = vectorization
         
         # Create individual environments for each agent
-        self.envs = []
-        for i in range(n_agents):
-            env = gym.make("CarRacing-v3", continuous=continuous, render_mode=render_mode)
-            self.envs.append(env)
+        env_kwargs = {"continuous": continuous, "render_mode": self.render_mode}
+        if vectorization == "subprocess":
+            self.agent_pool = SubprocAgentPool(n_agents, env_kwargs, n_workers=n_workers, render_every=render_every)
+        elif vectorization == "shared_world":
+            self.agent_pool = SharedWorldAgentPool(n_agents, env_kwargs, render_every=render_every)
+        else:
+            self.agent_pool = SerialAgentPool(n_agents, env_kwargs, render_every=render_every)
+            self.envs = self.agent_pool.envs
+        
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        # Observations are rendered inside the sub-environments' step and reset
+        if vectorization == "serial":
+            for env in self.envs:
+                self.profiler.instrument(env.unwrapped, "_render", "render")
+        elif vectorization == "shared_world":
+            self.profiler.instrument(self.agent_pool.env, "_render_states", "render")
         
-        # Get observation and action spaces from first environment
-        base_obs_shape = self.envs[0].observation_space.shape  # (96, 96, 3)
+        # Get observation and action spaces from the sub-environments
+        base_obs_shape = self.agent_pool.observation_space.shape  # (96, 96, 3)
         self.height, self.width, self.channels = base_obs_shape
         
         if grayscale:
@@ -55,7 +110,16 @@ class MultiAgentCarRacingEnv(gym.Env):
         self.dqn_height, self.dqn_width = 84, 84
         
         # Initialize frame buffers for each agent - use 84x84 for DQN compatibility
-        self.frames = np.zeros((n_agents, self.frame_stack, self.dqn_height, self.dqn_width, self.channels), dtype=np.float32)
+        self.frames = RingFrameStack(
+            self.frame_stack, (self.dqn_height, self.dqn_width, self.channels),
+            n_stacks=n_agents, dtype=self.obs_dtype
+        )
+        
+        # All agents' raw frames are preprocessed together in one vectorized pass
+        self.batch_preprocess = BatchFramePreprocessor(
+            (self.height, self.width), (self.dqn_height, self.dqn_width),
+            grayscale=grayscale, dtype=self.obs_dtype
+        )
         
         # Define multi-agent observation space - use 84x84 for DQN compatibility
         if grayscale:
@@ -64,10 +128,16 @@ class MultiAgentCarRacingEnv(gym.Env):
             obs_shape = (self.frame_stack * 3, self.dqn_height, self.dqn_width)
             
         # Multi-agent observation space: list of individual observation spaces
-        self.observation_space = spaces.Tuple([
-            spaces.Box(low=0.0, high=1.0, shape=obs_shape, dtype=np.float32)
-            for _ in range(n_agents)
-        ])
+        if self.obs_dtype == np.uint8:
+            self.observation_space = spaces.Tuple([
+                spaces.Box(low=0, high=255, shape=obs_shape, dtype=np.uint8)
+                for _ in range(n_agents)
+            ])
+        else:
+            self.observation_space = spaces.Tuple([
+                spaces.Box(low=0.0, high=1.0, shape=obs_shape, dtype=np.float32)
+                for _ in range(n_agents)
+            ])
         
         # Multi-agent action space: list of individual action spaces
         if continuous:
@@ -77,19 +147,21 @@ class MultiAgentCarRacingEnv(gym.Env):
             ])
         else:
             self.action_space = spaces.Tuple([
-                self.envs[0].action_space for _ in range(n_agents)
+                self.agent_pool.action_space for _ in range(n_agents)
             ])
         
-        # Agent states
-        self.agent_positions = np.zeros((n_agents, 2))  # x, y positions
-        self.agent_velocities = np.zeros((n_agents, 2))  # vx, vy velocities
-        self.agent_angles = np.zeros(n_agents)  # heading angles
+        # Agent states, read from each car's Box2D hull every step. The per-field
+        # arrays below are views into the structured agent_states array.
+        self.agent_states = np.zeros(n_agents, dtype=AGENT_STATE_DTYPE)
+        self.agent_positions = self.agent_states["position"]  # x, y positions
+        self.agent_velocities = self.agent_states["velocity"]  # vx, vy velocities
+        self.agent_angles = self.agent_states["angle"]  # heading angles
         self.agent_rewards = np.zeros(n_agents)
         self.agent_dones = np.zeros(n_agents, dtype=bool)
         self.agent_infos = [{} for _ in range(n_agents)]
         
-        # Track progress
-        self.track_progress = np.zeros(n_agents)
+        # Track progress (fraction of road tiles visited)
+        self.track_progress = self.agent_states["progress"]
         self.last_positions = np.zeros((n_agents, 2))
         
     def preprocess(self, obs, agent_id):
@@ -101,133 +173,153 @@ class MultiAgentCarRacingEnv(gym.Env):
             obs = cv2.cvtColor(obs, cv2.COLOR_RGB2GRAY)
             obs = np.expand_dims(obs, -1)  # (H, W, 1)
         
+        if self.obs_dtype == np.uint8:
+            return obs
+        
         # Normalize to [0, 1]
         obs = obs.astype(np.float32) / 255.0
         return obs
     
     def reset(self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None) -> Tuple[List[np.ndarray], Dict[str, Any]]:
         """Reset all agent environments."""
-        observations = []
+        profiler = self.profiler
+        seeds = [seed + i if seed is not None else None for i in range(self.n_agents)]
+        with profiler.stage("reset"):
+            self.agent_infos = self.agent_pool.reset(seeds, options=options)
         
-        for i, env in enumerate(self.envs):
-            obs, info = env.reset(seed=seed + i if seed is not None else None, options=options)
-            obs = self.preprocess(obs, i)
-            self.frames[i, :] = obs  # Fill frame stack initially
-            self.agent_infos[i] = info
-            
-            # Get stacked observation in (C, H, W) format
-            stacked_obs = self._get_obs(i)
-            observations.append(np.transpose(stacked_obs, (2, 0, 1)))
+        # Preprocess all agents at once and fill their frame stacks
+        all_agents = np.arange(self.n_agents)
+        with profiler.stage("preprocess"):
+            processed = self.batch_preprocess(self.agent_pool.frames)
+        with profiler.stage("frame_stack"):
+            self.frames.fill_batch(processed, all_agents)
+            # Stacked observations in (C, H, W) format
+            observations = list(self.frames.get_all())
         
-        # Reset agent states
-        self.agent_positions.fill(0)
-        self.agent_velocities.fill(0)
-        self.agent_angles.fill(0)
+        # Reset agent states to the cars' starting poses
+        self.agent_states[:] = self.agent_pool.states
         self.agent_rewards.fill(0)
         self.agent_dones.fill(False)
-        self.track_progress.fill(0)
-        self.last_positions.fill(0)
+        self.last_positions[:] = self.agent_positions
         
-        return observations, {"agent_infos": self.agent_infos}
+        info = {"agent_infos": self.agent_infos, "agent_states": self.get_agent_states()}
+        profiler.reset_done(info)
+        return observations, info
     
     def step(self, actions: List[np.ndarray]) -> Tuple[List[np.ndarray], List[float], List[bool], List[bool], Dict[str, Any]]:
         """Step all agents simultaneously."""
-        observations = []
-        rewards = []
-        terminateds = []
-        truncateds = []
+        profiler = self.profiler
+        # Agents that are done return their last observation and zero reward
+        rewards = [0.0] * self.n_agents
+        terminateds = [True] * self.n_agents
+        truncateds = [False] * self.n_agents
+        active = np.flatnonzero(~self.agent_dones)
         
-        # Step each agent
-        for i, (env, action) in enumerate(zip(self.envs, actions)):
-            if not self.agent_dones[i]:
-                obs, reward, terminated, truncated, info = env.step(action)
-                obs = self.preprocess(obs, i)
-                
-                # Update frame stack
-                self.frames[i] = np.roll(self.frames[i], shift=-1, axis=0)
-                self.frames[i, -1] = obs
+        if len(active):
+            # Step all live agents in one batch
+            with profiler.stage("physics"):
+                step_rewards, step_terminateds, step_truncateds, step_infos = self.agent_pool.step(
+                    [actions[i] for i in active], active
+                )
+            for k, i in enumerate(active):
+                rewards[i] = step_rewards[k]
+                terminateds[i] = step_terminateds[k]
+                truncateds[i] = step_truncateds[k]
                 
                 # Update agent state
-                self.agent_rewards[i] = reward
-                self.agent_dones[i] = terminated or truncated
-                self.agent_infos[i] = info
-                
-                # Get stacked observation
-                stacked_obs = self._get_obs(i)
-                observations.append(np.transpose(stacked_obs, (2, 0, 1)))
-                rewards.append(reward)
-                terminateds.append(terminated)
-                truncateds.append(truncated)
-            else:
-                # Agent is done, return zero observation and reward
-                stacked_obs = self._get_obs(i)
-                observations.append(np.transpose(stacked_obs, (2, 0, 1)))
-                rewards.append(0.0)
-                terminateds.append(True)
-                truncateds.append(False)
+                self.agent_rewards[i] = step_rewards[k]
+                self.agent_dones[i] = step_terminateds[k] or step_truncateds[k]
+                self.agent_infos[i] = step_infos[k]
+            
+            # Bulk-update the poses of the agents that stepped
+            self.last_positions[active] = self.agent_positions[active]
+            self.agent_states[active] = self.agent_pool.states[active]
+            
+            # Preprocess the agents that stepped in one pass and update their frame stacks
+            with profiler.stage("preprocess"):
+                processed = self.batch_preprocess(self.agent_pool.frames[active])
+        with profiler.stage("frame_stack"):
+            if len(active):
+                self.frames.push_batch(processed, active)
+            observations = list(self.frames.get_all())
         
         # Calculate multi-agent rewards (collision penalties, cooperation bonuses)
-        multi_agent_rewards = self._calculate_multi_agent_rewards(rewards)
+        with profiler.stage("reward"):
+            multi_agent_rewards = self._calculate_multi_agent_rewards(rewards)
         
         # Check if all agents are done
         all_done = all(self.agent_dones)
         
-        return observations, multi_agent_rewards, terminateds, truncateds, {"agent_infos": self.agent_infos}
+        info = {"agent_infos": self.agent_infos, "agent_states": self.get_agent_states()}
+        profiler.step_done(info)
+        return observations, multi_agent_rewards, terminateds, truncateds, info
+    
+    def get_agent_states(self) -> np.ndarray:
+        """
+        Return a copy of the per-agent car states as a structured (n_agents,) array
+        with fields position, velocity, angle, tiles_visited and progress.
+        """
+        return self.agent_states.copy()
     
     def _get_obs(self, agent_id):
         """Get stacked observation for a specific agent."""
-        return np.concatenate(self.frames[agent_id], axis=-1)  # (H, W, C * frame_stack)
+        return self.frames.get(agent_id)  # (C * frame_stack, H, W)
     
     def _calculate_multi_agent_rewards(self, individual_rewards):
         """Calculate multi-agent rewards including collision penalties and cooperation bonuses."""
-        multi_agent_rewards = individual_rewards.copy()
+        # One neighbour query yields both the collision and the proximity pairs
+        radius = max(self.collision_distance, self.proximity_distance)
+        i, j, sq_dist = neighbor_pairs(self.agent_positions, radius)
+        close = sq_dist < self.proximity_distance ** 2  # Close proximity threshold
         
-        # Add collision penalties
-        for i in range(self.n_agents):
-            for j in range(i + 1, self.n_agents):
-                if self._agents_collide(i, j):
-                    multi_agent_rewards[i] += self.collision_penalty
-                    multi_agent_rewards[j] += self.collision_penalty
+        # In a shared world collisions are real Box2D contacts, otherwise a distance threshold
+        contacts = getattr(self.agent_pool, "contacts", None)
+        if contacts is not None:
+            i_hit, j_hit = contacts[:, 0], contacts[:, 1]
+        else:
+            colliding = sq_dist < self.collision_distance ** 2
+            i_hit, j_hit = i[colliding], j[colliding]
         
-        # Add cooperation bonuses (agents close to each other get bonus)
-        for i in range(self.n_agents):
-            for j in range(i + 1, self.n_agents):
-                distance = np.linalg.norm(self.agent_positions[i] - self.agent_positions[j])
-                if distance < 50:  # Close proximity threshold
-                    multi_agent_rewards[i] += self.cooperation_reward
-                    multi_agent_rewards[j] += self.cooperation_reward
+        # Each pair adjusts both of its agents
+        collisions = (np.bincount(i_hit, minlength=self.n_agents)
+                      + np.bincount(j_hit, minlength=self.n_agents))
+        neighbours = (np.bincount(i[close], minlength=self.n_agents)
+                      + np.bincount(j[close], minlength=self.n_agents))
         
-        return multi_agent_rewards
-    
-    def _agents_collide(self, agent1_id, agent2_id):
-        """Check if two agents are colliding."""
-        distance = np.linalg.norm(self.agent_positions[agent1_id] - self.agent_positions[agent2_id])
-        return distance < 20  # Collision threshold
+        multi_agent_rewards = (np.asarray(individual_rewards, dtype=np.float64)
+                               + self.collision_penalty * collisions
+                               + self.cooperation_reward * neighbours)
+        return multi_agent_rewards.tolist()
     
     def render(self):
         """Render the environment."""
         if self.render_mode == "human":
             # Render all environments (they will be overlaid)
-            for env in self.envs:
-                env.render()
+            self.agent_pool.render()
         elif self.render_mode == "rgb_array":
             # Return combined view of all agents
-            frames = []
-            for env in self.envs:
-                frame = env.render()
-                if frame is not None:
-                    frames.append(frame)
+            frames = [frame for frame in self.agent_pool.render() if frame is not None]
             return np.concatenate(frames, axis=1) if frames else None
     
+    def set_render_every(self, render_every: int):
+        """Draw the "human" window on every ``render_every``-th step from now on (0 = never)."""
+        if render_every < 0:
+            raise ValueError(f"render_every must be non-negative, got {render_every}")
+        self.agent_pool.set_render_every(render_every)
+    
     def close(self):
         """Close all environments."""
-        for env in self.envs:
-            env.close()
+        self.agent_pool.close()
+        self.profiler.close()
     
-    def seed(self, seed: Optional[int] = None):
-        """Set random seed for reproducibility."""
-        for i, env in enumerate(self.envs):
-            env.seed(seed + i if seed is not None else None)
+    def seed(self, seed: Optional[int] = None) -> List[Optional[int]]:
+        """
+        Seed every agent's sub-environment (agent ``i`` gets ``seed + i``) for
+        reproducibility. Gymnasium environments are seeded through ``reset``, so this
+        starts a new episode with ``reset(seed=seed)``; returns the per-agent seeds.
+        """
+        self.reset(seed=seed)
+        return [seed + i if seed is not None else None for i in range(self.n_agents)]
 
 
 class MultiAgentCarRacingWrapper:
@@ -248,6 +340,9 @@ class MultiAgentCarRacingWrapper:
     def render(self):
         return self.env.render()
     
+    def set_render_every(self, render_every: int):
+        return self.env.unwrapped.set_render_every(render_every)
+    
     def close(self):
         return self.env.close()
     
@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type
+
+from huggingface_hub import hf_hub_download
+from huggingface_hub.errors import LocalEntryNotFoundError
+
+
+def resolve_checkpoint(
+    path: Optional[str] = None,
+    repo_id: Optional[str] = None,
+    filename: Optional[str] = None,
+    cache_dir: Optional[str] = None
+) -> str:
+    """
+    Local file path of a checkpoint given either a local ``path`` or a Hub
+    ``repo_id``/``filename``. Hub artifacts are looked up in the local Hub cache
+    first and only downloaded when missing, so cached models load offline.
+    """
+    if path is not None:
+        if not os.path.exists(path) and os.path.exists(path + ".zip"):
+            path += ".zip"  # SB3 saves add the suffix
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No checkpoint at {path}")
+        return os.path.realpath(path)
+    if repo_id is None or filename is None:
+        raise ValueError("Pass either a local path or both repo_id and filename")
+    try:
+        return hf_hub_download(repo_id=repo_id, filename=filename, cache_dir=cache_dir, local_files_only=True)
+    except LocalEntryNotFoundError:
+        return hf_hub_download(repo_id=repo_id, filename=filename, cache_dir=cache_dir)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded SB3 models for inference.
+
+    Each checkpoint (local path or Hub repo/filename) is deserialized once per
+    algorithm class and device, and every caller gets the same instance, so agents
+    and evaluations playing the same weights share them. Models are put in eval
+    mode with gradients disabled and must be treated as read-only: load a private
+    copy with ``algo_cls.load`` to train. At most ``max_models`` models stay
+    resident; the least recently used one is dropped first. A checkpoint file that
+    changes on disk is reloaded on the next request.
+    """
+
+    def __init__(self, max_models: int = 4):
+        if max_models < 1:
+            raise ValueError(f"max_models must be at least 1, got {max_models}")
+        self.max_models = max_models
+        self._models: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        algo_cls: Type,
+        path: Optional[str] = None,
+        repo_id: Optional[str] = None,
+        filename: Optional[str] = None,
+        device: str = "auto",
+        custom_objects: Optional[Dict[str, Any]] = None
+    ):
+        """Shared model for a checkpoint, loading it on first use."""
+        checkpoint = resolve_checkpoint(path, repo_id, filename)
+        key = (algo_cls, checkpoint, os.path.getmtime(checkpoint), device)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+            model = algo_cls.load(checkpoint, device=device, custom_objects=custom_objects)
+            model.policy.set_training_mode(False)
+            model.policy.requires_grad_(False)
+
+            # Drop stale versions of the same checkpoint, then the least recently used
+            for stale in [k for k in self._models if k[:2] == key[:2] and k[3] == device]:
+                del self._models[stale]
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+# Shared by every module in the process; nothing is loaded until first requested
+default_registry = ModelRegistry()
+
+
+def load_model(
+    algo_cls: Type,
+    path: Optional[str] = None,
+    repo_id: Optional[str] = None,
+    filename: Optional[str] = None,
+    device: str = "auto",
+    custom_objects: Optional[Dict[str, Any]] = None
+):
+    """Shared read-only model from the process-wide ``default_registry``."""
+    return default_registry.get(algo_cls, path, repo_id, filename, device, custom_objects)
@@ -6,12 +6,24 @@ from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.vec_env import VecFrameStack, VecTransposeImage
 from stable_baselines3.common.atari_wrappers import WarpFrame
 from marl_env import MultiAgentCarRacingWrapper
-from dqn import DQNAgent  # Import DQNAgent from dqn.py
+from policy_inference import BatchedPolicyRunner
+from model_registry import load_model
+from headless import headless_requested
+from telemetry_publisher import TelemetryPublisher, TelemetryWrapper
 import matplotlib.pyplot as plt
-from typing import List, Dict, Any
-import time
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+import os
+import tempfile
+import zipfile
 
-model_path = "kuds/car-racing-dqn"
+
+def make_training_env():
+    """Single-car discrete CarRacing env whose observations match the MARL agents' (4 stacked 84x84 frames, CHW)."""
+    env = make_vec_env("CarRacing-v3", n_envs=1, env_kwargs={"continuous": False}, wrapper_class=WarpFrame)
+    env = VecFrameStack(env, n_stack=4)
+    return VecTransposeImage(env)
 
 
 class MultiAgentDQNSimulation:
@@ -20,6 +32,11 @@ class MultiAgentDQNSimulation:
     
     This class manages multiple DQN agents playing simultaneously
     in the multi-agent car racing environment.
+    
+    With ``render_mode="human"`` the window is drawn on every ``render_every``-th
+    step of the episodes played with ``render=True``, and simulation otherwise runs
+    as fast as it can. ``headless=True`` never initializes a display, for machines
+    without one. Per-step car telemetry is published to ``telemetry`` when given.
     """
     
     def __init__(
@@ -28,17 +45,22 @@ class MultiAgentDQNSimulation:
         should_train_agents: bool = True,
         model_paths: List[str] = None,
         render_mode: str = "human",
-        episode_length: int = 1000
+        episode_length: int = 1000,
+        agents: Optional[List[Any]] = None,
+        render_every: int = 1,
+        headless: bool = False,
+        telemetry: Optional[TelemetryPublisher] = None
     ):
         self.n_agents = n_agents
         self.should_train_agents = should_train_agents
         self.model_paths = model_paths or [f"dqn_agent_{i}" for i in range(n_agents)]
-        self.render_mode = render_mode
         self.episode_length = episode_length
+        self.render_every = render_every
         
         # Initialize agents
         self.agents = []
         self.training_histories = []
+        self.policy_runner = None  # built lazily from self.agents
         
         # Create MARL environment
         self.marl_env = MultiAgentCarRacingWrapper(
@@ -46,43 +68,46 @@ class MultiAgentDQNSimulation:
             continuous=False,  # DQN needs discrete actions
             frame_stack=4,
             grayscale=True,
-            render_mode=render_mode
+            render_mode=render_mode,
+            render_every=render_every,
+            headless=headless
         )
+        self.render_mode = self.marl_env.env.render_mode  # None when headless
+        if telemetry is not None:
+            self.marl_env.env = TelemetryWrapper(self.marl_env.env, telemetry)
         
-        # Initialize DQN agents using DQNAgent class
-        self._initialize_agents()
+        # Initialize DQN agents, unless already-loaded agents are given
+        if agents is not None:
+            self.agents = list(agents)
+        else:
+            self._initialize_agents()
     
     def _initialize_agents(self):
-        """Initialize DQN agents using DQNAgent class."""
+        """Create DQN agents for training, or load shared inference agents from ``model_paths``."""
         for i in range(self.n_agents):
             if self.should_train_agents:
-                # Create new DQN agent for training
-                agent = DQNAgent(
-                    agent_id=i,
-                    train_new=True,
-                    repo_id=model_path,
-                    filename="best_model.zip",    
-                    marl_env = self.marl_env
-                )
-                self.agents.append(agent)
+                agent = self._training_agent(i)
             else:
-                # Try to load pre-trained agent
+                # Try to load pre-trained agent; agents loading the same
+                # checkpoint share one read-only model instance from the registry
                 try:
-                    agent = DQNAgent(
-                        agent_id=i,
-                        model_path=self.model_paths[i]
-                    )
-                    self.agents.append(agent)
-                except:
-                    print(f"Could not load agent {i}, creating new one")
-                    agent = DQNAgent(
-                        agent_id=i,
-                        train_new=True,
-                        repo_id=model_path,
-                        filename="best_model.zip",
-                        marl_env = self.marl_env
-                    )
-                    self.agents.append(agent)
+                    agent = load_model(DQN, path=self.model_paths[i])
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    print(f"Could not load agent {i} ({e}), creating new one")
+                    agent = self._new_agent()
+            self.agents.append(agent)
+    
+    def _new_agent(self) -> DQN:
+        """Untrained DQN agent that learns on its own single-car environment."""
+        return DQN("CnnPolicy", make_training_env(), buffer_size=100000, verbose=0)
+    
+    def _training_agent(self, i: int) -> DQN:
+        """Private trainable copy of agent ``i``'s checkpoint, or a new agent if there is none."""
+        try:
+            return DQN.load(self.model_paths[i], env=make_training_env(), buffer_size=100000, verbose=0)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Could not load agent {i} ({e}), creating new one")
+            return self._new_agent()
     
     def train_agents(self, total_timesteps: int = 50000, save_models: bool = True):
         """Train all DQN agents independently."""
@@ -92,6 +117,10 @@ class MultiAgentDQNSimulation:
             print(f"\nTraining Agent {i+1}/{self.n_agents}")
             print("-" * 50)
             
+            # Registry models are shared and frozen; train a private copy instead
+            if agent.get_env() is None:
+                agent = self.agents[i] = self._training_agent(i)
+            
             # Train the agent
             agent.learn(total_timesteps=total_timesteps, progress_bar=True)
             
@@ -100,11 +129,16 @@ class MultiAgentDQNSimulation:
                 agent.save(self.model_paths[i])
                 print(f"Saved agent {i} to {self.model_paths[i]}")
         
+        # Stacked inference weights are stale after training
+        self.policy_runner = None
         print("\nTraining completed!")
     
-    def play_episode(self, deterministic: bool = True, render: bool = True) -> Dict[str, Any]:
+    def play_episode(self, deterministic: bool = True, render: bool = True, seed: Optional[int] = None) -> Dict[str, Any]:
         """Play a single episode with all agents."""
-        obs, info = self.marl_env.reset()
+        if self.render_mode == "human":
+            # The sub-environments draw themselves inside step; keep them quiet unless rendering
+            self.marl_env.set_render_every(self.render_every if render else 0)
+        obs, info = self.marl_env.reset(seed=seed)
         
         episode_rewards = [0.0] * self.n_agents
         episode_length = 0
@@ -113,13 +147,8 @@ class MultiAgentDQNSimulation:
         print(f"Starting episode with {self.n_agents} agents...")
         
         while not done and episode_length < self.episode_length:
-            # Get actions from all agents
-            actions = []
-            for i, agent in enumerate(self.agents):
-                # Convert observation to the format expected by DQN
-                agent_obs = self._convert_obs_for_agent(obs[i], agent)
-                action, _ = agent.predict(agent_obs, deterministic=deterministic)
-                actions.append(action)
+            # Get actions from all agents in one batched forward pass
+            actions = list(self.predict_actions(obs, deterministic=deterministic))
             
             # Step the environment
             obs, rewards, dones, truncateds, info = self.marl_env.step(actions)
@@ -130,11 +159,6 @@ class MultiAgentDQNSimulation:
             
             episode_length += 1
             
-            # Render if requested
-            if render and self.render_mode == "human":
-                self.marl_env.render()
-                time.sleep(0.02)  # Control rendering speed
-            
             # Check if all agents are done
             done = all(dones) or all(truncateds)
         
@@ -147,28 +171,59 @@ class MultiAgentDQNSimulation:
         
         return results
     
-    def _convert_obs_for_agent(self, obs: np.ndarray, agent: DQNAgent) -> np.ndarray:
+    def predict_actions(self, obs: np.ndarray, deterministic: bool = True) -> np.ndarray:
+        """Actions of all agents for their stacked observations."""
+        if self.policy_runner is None:
+            self.policy_runner = BatchedPolicyRunner(self.agents)
+        agent_obs = np.stack([
+            self._convert_obs_for_agent(obs[i], agent) for i, agent in enumerate(self.agents)
+        ])
+        return self.policy_runner.predict(agent_obs, deterministic=deterministic)
+    
+    def _convert_obs_for_agent(self, obs: np.ndarray, agent: DQN) -> np.ndarray:
         """Convert MARL observation to DQN agent format."""
         # The observation should already be in the correct format (C, H, W)
         # But we need to ensure it matches what the agent expects
         return obs
     
-    def evaluate_agents(self, n_episodes: int = 10) -> Dict[str, Any]:
-        """Evaluate all agents over multiple episodes."""
+    def evaluate_agents(
+        self,
+        n_episodes: int = 10,
+        n_workers: int = 1,
+        seed: int = 0,
+        on_episode_end: Optional[Callable[[int, Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Evaluate all agents over multiple episodes.
+
+        Episode ``k`` is reset with seed ``seed + k * n_agents`` (each agent adds its
+        index), so results do not depend on ``n_workers``. With ``n_workers > 1``
+        episodes run concurrently in worker processes, each with its own environment
+        and a copy of the agents. ``on_episode_end(episode, results)`` is called as
+        each episode finishes, in completion order.
+        """
         print(f"Evaluating agents over {n_episodes} episodes...")
         
-        all_rewards = [[] for _ in range(self.n_agents)]
-        episode_lengths = []
+        seeds = [seed + episode * self.n_agents for episode in range(n_episodes)]
+        episode_results = [None] * n_episodes
         
-        for episode in range(n_episodes):
-            print(f"Episode {episode + 1}/{n_episodes}")
-            
-            results = self.play_episode(deterministic=True, render=False)
-            
-            for i in range(self.n_agents):
-                all_rewards[i].append(results["episode_rewards"][i])
-            
-            episode_lengths.append(results["episode_length"])
+        if n_workers > 1:
+            for episode, results in self._evaluate_parallel(seeds, n_workers):
+                episode_results[episode] = results
+                print(f"Episode {episode + 1}/{n_episodes} finished")
+                if on_episode_end is not None:
+                    on_episode_end(episode, results)
+        else:
+            for episode in range(n_episodes):
+                print(f"Episode {episode + 1}/{n_episodes}")
+                
+                results = self.play_episode(deterministic=True, render=False, seed=seeds[episode])
+                episode_results[episode] = results
+                if on_episode_end is not None:
+                    on_episode_end(episode, results)
+        
+        all_rewards = [[results["episode_rewards"][i] for results in episode_results] for i in range(self.n_agents)]
+        episode_lengths = [results["episode_length"] for results in episode_results]
         
         # Calculate statistics
         evaluation_results = {}
@@ -188,6 +243,30 @@ class MultiAgentDQNSimulation:
         
         return evaluation_results
     
+    def _evaluate_parallel(self, seeds: List[int], n_workers: int):
+        """Yield (episode, results) from a process pool as episodes finish."""
+        # forkserver is safer than fork with pygame/SDL state in the parent
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Ship each distinct model to the workers once, as a checkpoint on disk
+            checkpoints, agent_checkpoints = {}, []
+            for agent in self.agents:
+                if id(agent) not in checkpoints:
+                    path = os.path.join(tmp_dir, f"agent_{len(checkpoints)}.zip")
+                    agent.save(path)
+                    checkpoints[id(agent)] = (type(agent), path)
+                agent_checkpoints.append(checkpoints[id(agent)])
+            
+            with ProcessPoolExecutor(
+                max_workers=min(n_workers, len(seeds)),
+                mp_context=mp.get_context(start_method),
+                initializer=_init_eval_worker,
+                initargs=(self.n_agents, agent_checkpoints, self.episode_length)
+            ) as pool:
+                futures = {pool.submit(_eval_worker_episode, s): episode for episode, s in enumerate(seeds)}
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+    
     def plot_training_results(self):
         """Plot training results for all agents."""
         if not self.training_histories:
@@ -246,7 +325,36 @@ class MultiAgentDQNSimulation:
                 agent.model.env.close()
 
 
-def main():
+# Per-process simulation used by evaluation workers
+_eval_simulation = None
+
+
+def _init_eval_worker(n_agents: int, agent_checkpoints: List[Any], episode_length: int):
+    """Load the agents through the model registry and build a headless environment."""
+    global _eval_simulation
+    # Workers already run in parallel; intra-op threads would oversubscribe the cores
+    torch.set_num_threads(1)
+    agents = [load_model(agent_cls, path=path) for agent_cls, path in agent_checkpoints]
+    _eval_simulation = MultiAgentDQNSimulation(
+        n_agents=n_agents,
+        should_train_agents=False,
+        render_mode=None,
+        episode_length=episode_length,
+        agents=agents,
+        headless=True
+    )
+
+
+def _eval_worker_episode(seed: int) -> Dict[str, Any]:
+    results = _eval_simulation.play_episode(deterministic=True, render=False, seed=seed)
+    # Plain Python types keep the results cheap to pickle
+    results["episode_rewards"] = [float(r) for r in results["episode_rewards"]]
+    results["agent_dones"] = [bool(d) for d in results["agent_dones"]]
+    results["agent_truncateds"] = [bool(t) for t in results["agent_truncateds"]]
+    return results
+
+
+def main(headless: bool = False, render_every: int = 1):
     """Main function to run the multi-agent DQN simulation."""
     print("Multi-Agent DQN Car Racing Simulation")
     print("=" * 50)
@@ -256,7 +364,9 @@ def main():
         n_agents=2,
         should_train_agents=False,  # Set to False to load pre-trained models
         render_mode="human",
-        episode_length=1000
+        episode_length=1000,
+        render_every=render_every,
+        headless=headless
     )
     
     # Train agents
@@ -293,4 +403,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(headless=headless_requested())
\ No newline at end of file
@@ -0,0 +1,208 @@
+import copy
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3.common.policies import ActorCriticPolicy
+from stable_baselines3.dqn.policies import DQNPolicy
+from torch import nn
+from torch.func import functional_call, stack_module_state, vmap
+
+
+def deterministic_actions(policy, obs: th.Tensor) -> th.Tensor:
+    """
+    Greedy actions of an SB3 DQN or actor-critic policy for a batch of observations,
+    equal to ``policy._predict(obs, deterministic=True)`` but without building an
+    action distribution, so it can be vmapped and traced.
+    """
+    if isinstance(policy, DQNPolicy):
+        return policy.q_net(obs).argmax(dim=1)
+    if isinstance(policy, ActorCriticPolicy):
+        features = policy.extract_features(obs, policy.pi_features_extractor)
+        mean_actions = policy.action_net(policy.mlp_extractor.forward_actor(features))
+        if isinstance(policy.action_space, spaces.Discrete):
+            return mean_actions.argmax(dim=1)
+        if isinstance(policy.action_space, spaces.Box):
+            return th.tanh(mean_actions) if policy.squash_output else mean_actions
+    raise NotImplementedError(f"Greedy actions are not implemented for {type(policy).__name__}")
+
+
+def postprocess_actions(policy, actions: np.ndarray) -> np.ndarray:
+    """Rescale or clip Box actions the way ``BasePolicy.predict`` does."""
+    if isinstance(policy.action_space, spaces.Box):
+        if policy.squash_output:
+            return policy.unscale_action(actions)
+        return np.clip(actions, policy.action_space.low, policy.action_space.high)
+    return actions
+
+
+class _GreedyPolicy(nn.Module):
+    """Module whose forward pass is ``deterministic_actions`` of the wrapped policy."""
+
+    def __init__(self, policy):
+        super().__init__()
+        self.policy = policy
+
+    def forward(self, obs: th.Tensor) -> th.Tensor:
+        return deterministic_actions(self.policy, obs)
+
+
+def _architecture_key(model) -> Tuple[Any, ...]:
+    """Models with equal keys can run in one vmapped forward pass over stacked weights."""
+    policy = model.policy
+    params = tuple((name, tuple(p.shape)) for name, p in policy.state_dict().items())
+    return (type(policy), repr(policy.observation_space), repr(policy.action_space), str(policy.device), params)
+
+
+class BatchedPolicyRunner:
+    """
+    Runs the policies of several agents over a batch of observations.
+
+    Agents are grouped by model instance: every model is queried once per step with
+    the stacked observations of all agents using it, so agents sharing weights
+    should share the instance. For deterministic actions, distinct models with the
+    same policy architecture are further merged into a single forward pass over
+    their stacked weights (``torch.func.vmap``). Stacked weights are a snapshot:
+    call ``refresh`` after training any of the models.
+    """
+
+    def __init__(self, models: Sequence[Any]):
+        self.models = list(models)
+        self.refresh()
+
+    def refresh(self):
+        """Regroup the agents and re-stack the weights of models sharing an architecture."""
+        by_model: Dict[int, List[int]] = {}
+        for i, model in enumerate(self.models):
+            by_model.setdefault(id(model), []).append(i)
+        self.model_groups = [(self.models[ids[0]], np.array(ids)) for ids in by_model.values()]
+
+        by_architecture: Dict[Tuple[Any, ...], List[int]] = {}
+        for g, (model, _) in enumerate(self.model_groups):
+            by_architecture.setdefault(_architecture_key(model), []).append(g)
+
+        self.stacked_groups = []
+        for groups in by_architecture.values():
+            if len(groups) < 2:
+                continue
+            modules = [_GreedyPolicy(self.model_groups[g][0].policy) for g in groups]
+            for module in modules:
+                module.policy.set_training_mode(False)
+            params, buffers = stack_module_state(modules)
+            base = copy.deepcopy(modules[0]).to("meta")
+
+            def forward(p, b, obs, base=base):
+                return functional_call(base, (p, b), (obs,))
+
+            self.stacked_groups.append((groups, vmap(forward), params, buffers))
+
+    def predict(self, observations: np.ndarray, deterministic: bool = True) -> np.ndarray:
+        """Actions for every agent given their stacked (n_agents, *obs_shape) observations."""
+        actions = [None] * len(self.models)
+        stacked = set()
+        if deterministic:
+            for groups, forward, params, buffers in self.stacked_groups:
+                self._predict_stacked(observations, groups, forward, params, buffers, actions)
+                stacked.update(groups)
+
+        for g, (model, ids) in enumerate(self.model_groups):
+            if g in stacked:
+                continue
+            group_actions, _ = model.predict(observations[ids], deterministic=deterministic)
+            for i, action in zip(ids, group_actions):
+                actions[i] = action
+        return np.stack(actions)
+
+    def _predict_stacked(self, observations, groups, forward, params, buffers, actions):
+        """One vmapped forward pass for models sharing an architecture; groups may differ in size."""
+        sizes = [len(self.model_groups[g][1]) for g in groups]
+        width = max(sizes)
+        batches = []
+        for g, size in zip(groups, sizes):
+            ids = self.model_groups[g][1]
+            # Pad smaller groups by repeating their first observation
+            batches.append(observations[np.concatenate([ids, np.repeat(ids[:1], width - size)])])
+
+        policy = self.model_groups[groups[0]][0].policy
+        obs_tensor, _ = policy.obs_to_tensor(np.concatenate(batches))
+        obs_tensor = obs_tensor.reshape((len(groups), width) + obs_tensor.shape[1:])
+        with th.no_grad():
+            group_actions = forward(params, buffers, obs_tensor).cpu().numpy()
+
+        for g, size, batch_actions in zip(groups, sizes, group_actions):
+            model_policy = self.model_groups[g][0].policy
+            batch_actions = postprocess_actions(model_policy, batch_actions[:size])
+            for i, action in zip(self.model_groups[g][1], batch_actions):
+                actions[i] = action
+
+
+class TracedPolicyPredictor:
+    """
+    Greedy actions from a TorchScript export of a DQN or actor-critic ``CnnPolicy``.
+
+    The traced module takes channel-first uint8 batches of the policy's fixed
+    observation shape (e.g. (4, 84, 84) or (4, 96, 96)), does the image
+    normalization itself and returns raw greedy actions, so ``predict`` only
+    converts the batch to a tensor and clips/rescales Box actions. Outputs match
+    ``model.predict(obs, deterministic=True)``. Exports are saved with
+    ``torch.jit.save`` together with the action bounds and load without SB3.
+    """
+
+    def __init__(self, module: th.jit.ScriptModule, obs_shape: Tuple[int, ...],
+                 action_low: Optional[np.ndarray] = None, action_high: Optional[np.ndarray] = None,
+                 squash_output: bool = False):
+        self.module = module
+        self.obs_shape = tuple(obs_shape)
+        self.action_low = action_low
+        self.action_high = action_high
+        self.squash_output = squash_output
+
+    @classmethod
+    def export(cls, model) -> "TracedPolicyPredictor":
+        """Trace the greedy forward pass of an SB3 model (or its policy) on CPU."""
+        if model.observation_space.dtype != np.uint8:
+            raise ValueError(f"TracedPolicyPredictor needs uint8 observations, got {model.observation_space.dtype}")
+        policy = copy.deepcopy(getattr(model, "policy", model)).to("cpu")
+        policy.set_training_mode(False)
+        obs_shape = policy.observation_space.shape
+        example = th.zeros((1,) + obs_shape, dtype=th.uint8)
+        with th.no_grad():
+            module = th.jit.freeze(th.jit.trace(_GreedyPolicy(policy).eval(), example))
+
+        low = high = None
+        if isinstance(policy.action_space, spaces.Box):
+            low, high = policy.action_space.low, policy.action_space.high
+        return cls(module, obs_shape, low, high, bool(policy.squash_output))
+
+    def predict(self, obs: np.ndarray) -> np.ndarray:
+        """Actions for a uint8 batch (B, *obs_shape), or a single observation."""
+        single = obs.shape == self.obs_shape
+        batch = th.from_numpy(np.ascontiguousarray(obs[None] if single else obs))
+        with th.inference_mode():
+            actions = self.module(batch).numpy()
+        if self.action_low is not None:
+            if self.squash_output:
+                actions = self.action_low + 0.5 * (actions + 1.0) * (self.action_high - self.action_low)
+            else:
+                actions = np.clip(actions, self.action_low, self.action_high)
+        return actions[0] if single else actions
+
+    def save(self, path: str):
+        meta = {
+            "obs_shape": list(self.obs_shape),
+            "action_low": None if self.action_low is None else self.action_low.tolist(),
+            "action_high": None if self.action_high is None else self.action_high.tolist(),
+            "squash_output": self.squash_output,
+        }
+        th.jit.save(self.module, path, _extra_files={"meta.json": json.dumps(meta)})
+
+    @classmethod
+    def load(cls, path: str) -> "TracedPolicyPredictor":
+        extra_files = {"meta.json": ""}
+        module = th.jit.load(path, map_location="cpu", _extra_files=extra_files)
+        meta = json.loads(extra_files["meta.json"])
+        low = None if meta["action_low"] is None else np.array(meta["action_low"], dtype=np.float32)
+        high = None if meta["action_high"] is None else np.array(meta["action_high"], dtype=np.float32)
+        return cls(module, tuple(meta["obs_shape"]), low, high, meta["squash_output"])
@@ -6,6 +6,7 @@ from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.vec_env import VecTransposeImage
 from stable_baselines3.common.vec_env import VecFrameStack
 from stable_baselines3.common.atari_wrappers import WarpFrame
+from replay_buffers import MemmapReplayBuffer
 
 # Download the model from the Hub
 # model_path = hf_hub_download(repo_id="kuds/car-racing-dqn", filename="best_model.zip")
@@ -19,10 +20,13 @@ env = VecTransposeImage(env)
 
 # Load the model
 model_path = "dpo_post_trained.zip"
-model = DQN.load(model_path, env=env, verbose=1)
+# Keep the replay history on disk so each post-training session continues from the last one
+model = DQN.load(model_path, env=env, verbose=1,
+                 replay_buffer_class=MemmapReplayBuffer, replay_buffer_kwargs=dict(path="dpo_post_trained_replay"))
 
 n_steps = 2048
 model.learn(total_timesteps=n_steps * 5, progress_bar=True)
+model.replay_buffer.flush()
 
 model.save("dpo_post_trained")
 
@@ -0,0 +1,67 @@
+import numpy as np
+from typing import Tuple
+
+
+# ITU-R BT.601 luma weights, the same ones cv2.COLOR_RGB2GRAY uses
+RGB_TO_GRAY = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def area_resize_matrix(in_size: int, out_size: int) -> np.ndarray:
+    """
+    Build the (out_size, in_size) weight matrix of an area-averaging resize.
+
+    Output pixel i averages the input interval [i * s, (i + 1) * s) with
+    s = in_size / out_size, weighting each input pixel by its overlap, which is
+    what cv2.INTER_AREA computes when downscaling.
+    """
+    scale = in_size / out_size
+    starts = np.arange(out_size)[:, None] * scale
+    ends = starts + scale
+    pixels = np.arange(in_size)[None, :]
+    overlap = np.clip(np.minimum(ends, pixels + 1) - np.maximum(starts, pixels), 0.0, None)
+    return (overlap / scale).astype(np.float32)
+
+
+class BatchFramePreprocessor:
+    """
+    Vectorized grayscale + resize + normalize for a batch of RGB frames.
+
+    Takes (N, H, W, 3) uint8 frames and returns (N, C, out_H, out_W) channel-first
+    frames in a single pass: the grayscale conversion is one matmul against the
+    luma weights and the area resize is two matmuls against precomputed
+    row/column weight matrices, so the cost scales with pixels, not Python calls.
+    """
+
+    def __init__(
+        self,
+        in_shape: Tuple[int, int],
+        out_shape: Tuple[int, int],
+        grayscale: bool = True,
+        dtype=np.float32
+    ):
+        in_height, in_width = in_shape
+        out_height, out_width = out_shape
+        self.grayscale = grayscale
+        self.dtype = np.dtype(dtype)
+
+        self.resize_rows = area_resize_matrix(in_height, out_height)        # (out_H, H)
+        self.resize_cols = area_resize_matrix(in_width, out_width).T.copy() # (W, out_W)
+
+        # Fold the [0, 1] normalization into the colour weights for float output
+        scale = 1.0 if self.dtype == np.uint8 else 1.0 / 255.0
+        self.gray_weights = RGB_TO_GRAY * scale
+        self.scale = np.float32(scale)
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        """Preprocess (N, H, W, 3) uint8 frames into (N, C, out_H, out_W)."""
+        frames = frames.astype(np.float32)
+        if self.grayscale:
+            frames = (frames @ self.gray_weights)[:, np.newaxis]  # (N, 1, H, W)
+        else:
+            frames = np.moveaxis(frames, -1, 1) * self.scale      # (N, 3, H, W)
+
+        frames = self.resize_rows @ frames @ self.resize_cols
+
+        if self.dtype == np.uint8:
+            return np.clip(np.rint(frames), 0, 255).astype(np.uint8)
+        return frames
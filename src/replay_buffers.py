@@ -0,0 +1,377 @@
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3.common.buffers import BaseBuffer, ReplayBuffer
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+from stable_baselines3.common.vec_env import VecNormalize
+
+from trajectory_store import TrajectoryStore
+
+
+class FrameStackReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer for frame-stacked pixel observations that stores every frame once.
+
+    Observations are expected as produced by ``VecFrameStack`` (+ ``VecTransposeImage``):
+    channel-first stacks of ``n_stack`` frames, oldest first, zero-filled at the start
+    of an episode. Each transition keeps only the newest frame of its observation;
+    the full observation is rebuilt from the frames of the preceding transitions of
+    the same episode, and the next observation is the same stack shifted by one
+    frame. The only next-frames stored separately are those of transitions that
+    ended an episode, or that were followed by a reset without a done (as when
+    ``learn`` is called again): an observation that does not continue the
+    previous transition's next observation starts a new episode. Compared to ``ReplayBuffer`` this holds 1 frame instead of
+    2 * ``n_stack`` per transition (8x less for 4-frame stacks).
+
+    With ``compress=True`` every frame is additionally zlib-compressed, which
+    shrinks mostly uniform CarRacing frames several times more at the cost of
+    decompression when sampling.
+
+    Usable as ``replay_buffer_class`` in SB3 ``DQN`` with
+    ``replay_buffer_kwargs=dict(n_stack=4)``.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Box,
+        action_space: spaces.Space,
+        device: Union[th.device, str] = "auto",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+        n_stack: int = 4,
+        compress: bool = False,
+        compression_level: int = 1
+    ):
+        # Skip ReplayBuffer.__init__, which allocates full observation arrays
+        BaseBuffer.__init__(self, buffer_size, observation_space, action_space, device, n_envs=n_envs)
+        if self.obs_shape[0] % n_stack != 0:
+            raise ValueError(f"Observation shape {self.obs_shape} is not a channel-first stack of {n_stack} frames")
+
+        self.buffer_size = max(buffer_size // n_envs, 1)
+        if self.buffer_size <= n_stack:
+            raise ValueError(f"buffer_size per env must exceed n_stack={n_stack}")
+        self.optimize_memory_usage = optimize_memory_usage
+        self.handle_timeout_termination = handle_timeout_termination
+        self.n_stack = n_stack
+        self.frame_shape = (self.obs_shape[0] // n_stack,) + tuple(self.obs_shape[1:])
+        self.compress = compress
+        self.compression_level = compression_level
+
+        if compress:
+            self.frames = np.empty((self.buffer_size, self.n_envs), dtype=object)
+        else:
+            self.frames = np.zeros((self.buffer_size, self.n_envs) + self.frame_shape, dtype=observation_space.dtype)
+        # Whether the observation of each transition is the first of its episode
+        self.episode_starts = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
+        # Newest frame of the next observation, for transitions that ended an episode
+        self.terminal_frames: Dict[Tuple[int, int], Any] = {}
+        self._last_dones = np.ones(self.n_envs, dtype=bool)
+        self._last_next_obs: Optional[np.ndarray] = None
+
+        self.actions = np.zeros(
+            (self.buffer_size, self.n_envs, self.action_dim), dtype=self._maybe_cast_dtype(action_space.dtype)
+        )
+        self.rewards = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
+        self.dones = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
+        self.timeouts = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
+
+    def _encode(self, frame: np.ndarray):
+        if self.compress:
+            return zlib.compress(np.ascontiguousarray(frame).tobytes(), self.compression_level)
+        return frame
+
+    def _decode(self, frame) -> np.ndarray:
+        if self.compress:
+            return np.frombuffer(zlib.decompress(frame), dtype=self.observation_space.dtype).reshape(self.frame_shape)
+        return frame
+
+    def add(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: List[Dict[str, Any]],
+    ) -> None:
+        channels = self.frame_shape[0]
+        episode_starts = self._last_dones.copy()
+        if self._last_next_obs is not None:
+            prev = (self.pos - 1) % self.buffer_size
+            for env_idx in np.flatnonzero(~episode_starts):
+                if not np.array_equal(obs[env_idx], self._last_next_obs[env_idx]):
+                    # Reset without a done: the previous transition keeps its real next frame
+                    episode_starts[env_idx] = True
+                    self.terminal_frames[(prev, env_idx)] = self._encode(self._last_next_obs[env_idx, -channels:].copy())
+        for env_idx in range(self.n_envs):
+            self.frames[self.pos, env_idx] = self._encode(obs[env_idx, -channels:])
+            self.terminal_frames.pop((self.pos, env_idx), None)
+            if done[env_idx]:
+                self.terminal_frames[(self.pos, env_idx)] = self._encode(next_obs[env_idx, -channels:])
+        self.episode_starts[self.pos] = episode_starts
+        self._last_dones = np.array(done, dtype=bool)
+        if self._last_next_obs is None:
+            self._last_next_obs = np.empty((self.n_envs,) + self.obs_shape, dtype=self.observation_space.dtype)
+        self._last_next_obs[:] = next_obs
+
+        self.actions[self.pos] = np.array(action).reshape((self.n_envs, self.action_dim))
+        self.rewards[self.pos] = np.array(reward)
+        self.dones[self.pos] = np.array(done)
+        if self.handle_timeout_termination:
+            self.timeouts[self.pos] = np.array([info.get("TimeLimit.truncated", False) for info in infos])
+
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+
+    def sample(self, batch_size: int, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        """
+        Sample transitions whose frames are all still in the buffer: the newest one
+        (its next frame is not stored yet) and, once full, the oldest ``n_stack - 1``
+        (their earlier frames were overwritten) are skipped.
+        """
+        if self.full:
+            offsets = np.random.randint(self.n_stack - 1, self.buffer_size - 1, size=batch_size)
+            batch_inds = (offsets + self.pos) % self.buffer_size
+        else:
+            batch_inds = np.random.randint(0, max(self.pos - 1, 1), size=batch_size)
+        return self._get_samples(batch_inds, env=env)
+
+    def _stack(self, batch_inds: np.ndarray, env_indices: np.ndarray) -> np.ndarray:
+        """Rebuild the (batch, n_stack + 1, *frame_shape) frames of obs and next obs."""
+        frames = np.zeros((len(batch_inds), self.n_stack + 1) + self.frame_shape, dtype=self.observation_space.dtype)
+        # Frames older than the episode's first observation stay zero, like VecFrameStack
+        in_episode = np.ones(len(batch_inds), dtype=bool)
+        for k in range(self.n_stack):
+            inds = (batch_inds - k) % self.buffer_size
+            for b in np.flatnonzero(in_episode):
+                frames[b, self.n_stack - 1 - k] = self._decode(self.frames[inds[b], env_indices[b]])
+            in_episode &= ~self.episode_starts[inds, env_indices]
+
+        next_inds = (batch_inds + 1) % self.buffer_size
+        for b, (t, env_idx) in enumerate(zip(batch_inds, env_indices)):
+            terminal = self.terminal_frames.get((t, env_idx))
+            frames[b, -1] = self._decode(terminal if terminal is not None else self.frames[next_inds[b], env_idx])
+        return frames
+
+    def _get_samples(self, batch_inds: np.ndarray, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
+        frames = self._stack(batch_inds, env_indices)
+        batch = len(batch_inds)
+        obs = frames[:, :-1].reshape((batch,) + self.obs_shape)
+        next_obs = frames[:, 1:].reshape((batch,) + self.obs_shape)
+
+        data = (
+            self._normalize_obs(obs, env),
+            self.actions[batch_inds, env_indices, :],
+            self._normalize_obs(next_obs, env),
+            # Only use dones that are not due to timeouts
+            (self.dones[batch_inds, env_indices] * (1 - self.timeouts[batch_inds, env_indices])).reshape(-1, 1),
+            self._normalize_reward(self.rewards[batch_inds, env_indices].reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
+
+    def nbytes(self) -> int:
+        """Approximate memory held by stored frames and transition data."""
+        if self.compress:
+            frames = sum(len(f) for f in self.frames.flat if f is not None)
+        else:
+            frames = self.frames.nbytes
+        terminal = sum(len(f) if self.compress else f.nbytes for f in self.terminal_frames.values())
+        return frames + terminal + self.actions.nbytes + self.rewards.nbytes + self.dones.nbytes + self.timeouts.nbytes
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer backed by an on-disk ``TrajectoryStore`` per environment.
+
+    Every transition is appended to memory-mapped segments under ``path`` instead of
+    a RAM ring, and batches are sampled from the newest ``buffer_size`` transitions
+    (per env) by reading only the sampled records. The next observation of a
+    transition is the following record's observation, or one kept in a separate
+    store when the following record does not continue it: when the episode ended
+    there, when the env was reset without a done (as when ``learn`` is called
+    again), and for the newest transition at every ``flush``, so a later session
+    appending to the same path never becomes its continuation. Re-creating the buffer
+    on an existing ``path`` re-attaches to the flushed history, so a resumed
+    training run keeps sampling its earlier experience; older transitions stay on
+    disk for offline use. Call ``flush`` before exiting.
+
+    Usable as ``replay_buffer_class`` in SB3 ``DQN`` with
+    ``replay_buffer_kwargs=dict(path=...)``.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Box,
+        action_space: spaces.Space,
+        device: Union[th.device, str] = "auto",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+        path: str = "replay_store",
+        segment_size: int = 10000,
+        flush_interval: int = 1000
+    ):
+        # Skip ReplayBuffer.__init__, which allocates in-memory arrays
+        BaseBuffer.__init__(self, buffer_size, observation_space, action_space, device, n_envs=n_envs)
+        self.buffer_size = max(buffer_size // n_envs, 1)
+        self.optimize_memory_usage = optimize_memory_usage
+        self.handle_timeout_termination = handle_timeout_termination
+        self.flush_interval = flush_interval
+        self._unflushed = 0
+        self._last_next_obs: Optional[np.ndarray] = None  # next obs of this session's newest transitions
+
+        obs_column = (self.obs_shape, observation_space.dtype)
+        columns = {
+            "observations": obs_column,
+            "actions": ((self.action_dim,), self._maybe_cast_dtype(action_space.dtype)),
+            "rewards": ((), np.float32),
+            "dones": ((), np.float32),
+            "timeouts": ((), np.float32),
+            "terminal_index": ((), np.int64),  # row in the terminal store, -1 if the next record continues it
+        }
+        self.stores = [TrajectoryStore(os.path.join(path, f"env_{e}"), columns, segment_size)
+                       for e in range(n_envs)]
+        self.terminal_stores = [TrajectoryStore(os.path.join(path, f"env_{e}_terminal"),
+                                                {"observations": obs_column}, segment_size)
+                                for e in range(n_envs)]
+        self._recover()
+        self._sync_position()
+
+    def _recover(self):
+        """
+        Roll the stores back to the longest history that was committed consistently.
+
+        Each store commits its own size on ``flush``, so a crash part-way through a
+        flush can leave env streams of different lengths, or transitions whose
+        terminal observation was never committed. Every stream is cut to the
+        shortest one and then before the first transition with a missing terminal
+        observation; terminal rows no kept transition refers to are dropped too.
+        """
+        n = min(len(store) for store in self.stores)
+        terminal_indices = []
+        for store, terminal_store in zip(self.stores, self.terminal_stores):
+            terminal_index = store.gather("terminal_index", np.arange(n))
+            dangling = np.flatnonzero(terminal_index >= len(terminal_store))
+            if len(dangling):
+                n = int(dangling[0])
+            terminal_indices.append(terminal_index)
+        for store, terminal_store, terminal_index in zip(self.stores, self.terminal_stores, terminal_indices):
+            if len(store) > n:
+                store.truncate(n)
+            referenced = int(terminal_index[:n].max(initial=-1)) + 1
+            if len(terminal_store) > referenced:
+                terminal_store.truncate(referenced)
+
+    def _sync_position(self):
+        n = len(self.stores[0])
+        self.full = n >= self.buffer_size
+        self.pos = n % self.buffer_size
+
+    def size(self) -> int:
+        return min(len(self.stores[0]), self.buffer_size)
+
+    def add(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: List[Dict[str, Any]],
+    ) -> None:
+        action = np.array(action).reshape((self.n_envs, self.action_dim))
+        if self._last_next_obs is not None:
+            for e in range(self.n_envs):
+                if not np.array_equal(obs[e], self._last_next_obs[e]):
+                    self._end_stream(e)  # reset without a done
+        for e in range(self.n_envs):
+            terminal_index = -1
+            if done[e]:
+                terminal_index = self.terminal_stores[e].append(observations=next_obs[e:e + 1])
+            timeout = infos[e].get("TimeLimit.truncated", False) if self.handle_timeout_termination else False
+            self.stores[e].append(
+                observations=obs[e:e + 1],
+                actions=action[e:e + 1],
+                rewards=np.array([reward[e]], dtype=np.float32),
+                dones=np.array([done[e]], dtype=np.float32),
+                timeouts=np.array([timeout], dtype=np.float32),
+                terminal_index=np.array([terminal_index]),
+            )
+        if self._last_next_obs is None:
+            self._last_next_obs = np.empty((self.n_envs,) + self.obs_shape, dtype=self.observation_space.dtype)
+        self._last_next_obs[:] = next_obs
+        self._sync_position()
+        self._unflushed += 1
+        if self._unflushed >= self.flush_interval:
+            self.flush()
+
+    def _end_stream(self, env_idx: int):
+        """Keep the real next observation of the env's newest transition in its terminal store."""
+        store = self.stores[env_idx]
+        last = len(store) - 1
+        if self._last_next_obs is None or last < 0 or store.gather("terminal_index", [last])[0] >= 0:
+            return
+        terminal_index = self.terminal_stores[env_idx].append(observations=self._last_next_obs[env_idx:env_idx + 1])
+        store.write("terminal_index", last, terminal_index)
+
+    def flush(self):
+        # Whatever is appended next (possibly by a later session) may not continue the newest transitions
+        for e in range(self.n_envs):
+            self._end_stream(e)
+        # Terminal observations are committed before the transitions that refer to them
+        for store in self.terminal_stores + self.stores:
+            store.flush()
+        self._unflushed = 0
+
+    def sample(self, batch_size: int, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        """Sample from the newest ``buffer_size`` transitions, except the newest one (no next record yet)."""
+        n = len(self.stores[0])
+        batch_inds = np.random.randint(max(n - self.buffer_size, 0), max(n - 1, 1), size=batch_size)
+        return self._get_samples(batch_inds, env=env)
+
+    def _get_samples(self, batch_inds: np.ndarray, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        env_indices = np.random.randint(0, high=self.n_envs, size=(len(batch_inds),))
+        batch = len(batch_inds)
+        obs = np.empty((batch,) + self.obs_shape, dtype=self.observation_space.dtype)
+        next_obs = np.empty_like(obs)
+        actions = np.empty((batch, self.action_dim), dtype=self._maybe_cast_dtype(self.action_space.dtype))
+        rewards = np.empty(batch, dtype=np.float32)
+        dones = np.empty(batch, dtype=np.float32)
+        timeouts = np.empty(batch, dtype=np.float32)
+
+        for e in np.unique(env_indices):
+            mask = env_indices == e
+            inds = batch_inds[mask]
+            store = self.stores[e]
+            obs[mask] = store.gather("observations", inds)
+            actions[mask] = store.gather("actions", inds)
+            rewards[mask] = store.gather("rewards", inds)
+            dones[mask] = store.gather("dones", inds)
+            timeouts[mask] = store.gather("timeouts", inds)
+
+            terminal_index = store.gather("terminal_index", inds)
+            ended = terminal_index >= 0
+            env_next = store.gather("observations", np.where(ended, inds, inds + 1))
+            if ended.any():
+                env_next[ended] = self.terminal_stores[e].gather("observations", terminal_index[ended])
+            next_obs[mask] = env_next
+
+        data = (
+            self._normalize_obs(obs, env),
+            actions,
+            self._normalize_obs(next_obs, env),
+            # Only use dones that are not due to timeouts
+            (dones * (1 - timeouts)).reshape(-1, 1),
+            self._normalize_reward(rewards.reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
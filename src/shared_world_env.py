@@ -0,0 +1,312 @@
+import gymnasium as gym
+from gymnasium import spaces
+from gymnasium.envs.box2d.car_racing import CarRacing, FrictionDetector, FPS, PLAYFIELD, SCALE, STATE_H, STATE_W, TRACK_WIDTH, ZOOM
+from gymnasium.envs.box2d.car_dynamics import Car
+import numpy as np
+import math
+from typing import Any, Dict, List, Optional, Sequence
+from track_raster import TrackRasterRenderer
+
+# Hull colours cycled over the cars so agents can tell each other apart
+CAR_COLORS = [
+    (0.8, 0.0, 0.0),
+    (0.0, 0.0, 0.8),
+    (0.9, 0.6, 0.0),
+    (0.6, 0.0, 0.8),
+    (0.0, 0.7, 0.7),
+    (0.9, 0.9, 0.9),
+]
+
+
+class MultiCarFrictionDetector(FrictionDetector):
+    """
+    Contact listener for several cars in one world.
+
+    Tile visits and lap completion are tracked per car (a tile visited by one car
+    still rewards the others), and hull/wheel contacts between different cars are
+    recorded as collisions.
+    """
+
+    def _contact(self, contact, begin):
+        u1 = contact.fixtureA.body.userData
+        u2 = contact.fixtureB.body.userData
+        car1 = getattr(u1, "car_id", None)
+        car2 = getattr(u2, "car_id", None)
+        if car1 is not None and car2 is not None:
+            if begin and car1 != car2:
+                self.env.car_contacts.add((min(car1, car2), max(car1, car2)))
+            return
+
+        tile = None
+        obj = None
+        if u1 and "road_friction" in u1.__dict__:
+            tile = u1
+            obj = u2
+        if u2 and "road_friction" in u2.__dict__:
+            tile = u2
+            obj = u1
+        if not tile:
+            return
+
+        # inherit tile color from env
+        if np.any(tile.color != self.env.road_color):
+            tile.color[:] = self.env.road_color
+            self.env.repainted_tiles.add(tile)
+        if not obj or "tiles" not in obj.__dict__:
+            return
+        if begin:
+            obj.tiles.add(tile)
+            car_id = obj.car_id
+            if not self.env.tile_visited[car_id, tile.idx]:
+                tile.road_visited = True
+                self.env.tile_visited[car_id, tile.idx] = True
+                self.env.rewards[car_id] += 1000.0 / len(self.env.track)
+                self.env.tile_visited_counts[car_id] += 1
+
+                # Lap is considered completed if enough % of the track was covered
+                if (
+                    tile.idx == 0
+                    and self.env.tile_visited_counts[car_id] / len(self.env.track)
+                    > self.lap_complete_percent
+                ):
+                    self.env.new_laps[car_id] = True
+        else:
+            obj.tiles.discard(tile)
+
+
+class SharedWorldCarRacing(CarRacing):
+    """
+    N cars racing on one track in a single Box2D world.
+
+    The track, the physics world and the renderer are shared, so memory and per-step
+    cost grow with the number of cars rather than the number of worlds, and cars
+    collide with real contacts. Each step applies every car's action, advances the
+    world once and renders one egocentric 96x96 state frame per car (all cars are
+    drawn in every view).
+
+    With ``renderer="raster"`` (the default) the static track is rasterized once per
+    reset and each view is a single affine warp of that raster plus car sprites (see
+    ``TrackRasterRenderer``); ``renderer="pygame"`` re-draws the full scene per car
+    with CarRacing's own renderer.
+
+    Observations are (n_agents, 96, 96, 3) uint8; rewards, terminated and truncated
+    are (n_agents,) arrays. Cars that have terminated are passed ``None`` actions by
+    the caller and coast.
+    """
+
+    def __init__(
+        self,
+        n_agents: int = 2,
+        render_mode: Optional[str] = None,
+        verbose: bool = False,
+        lap_complete_percent: float = 0.95,
+        domain_randomize: bool = False,
+        continuous: bool = True,
+        max_episode_steps: int = 1000,
+        grid_spacing: int = 4,
+        renderer: str = "raster",
+        raster_resolution: float = 2.0
+    ):
+        if renderer not in ("raster", "pygame"):
+            raise ValueError(f"renderer must be 'raster' or 'pygame', got {renderer!r}")
+
+        super().__init__(
+            render_mode=render_mode,
+            verbose=verbose,
+            lap_complete_percent=lap_complete_percent,
+            domain_randomize=domain_randomize,
+            continuous=continuous,
+        )
+        self.n_agents = n_agents
+        self.max_episode_steps = max_episode_steps
+        self.grid_spacing = grid_spacing  # track points between starting grid rows
+
+        self.single_observation_space = self.observation_space
+        self.single_action_space = self.action_space
+        self.observation_space = spaces.Box(
+            low=0, high=255, shape=(n_agents, STATE_H, STATE_W, 3), dtype=np.uint8
+        )
+        self.action_space = spaces.Tuple([self.single_action_space for _ in range(n_agents)])
+
+        self.cars: List[Car] = []
+        self.camera_agent = 0
+        self.car_contacts = set()
+        self.rewards = np.zeros(n_agents)
+        self.prev_rewards = np.zeros(n_agents)
+        self.tile_visited_counts = np.zeros(n_agents, dtype=np.int64)
+        self.new_laps = np.zeros(n_agents, dtype=bool)
+        self.tile_visited = np.zeros((n_agents, 0), dtype=bool)
+        self.states = np.zeros((n_agents, STATE_H, STATE_W, 3), dtype=np.uint8)
+        self.repainted_tiles = set()
+        self.renderer = renderer
+        self.raster_renderer = TrackRasterRenderer(self, raster_resolution) if renderer == "raster" else None
+
+    def _destroy(self):
+        if not self.road:
+            return
+        for t in self.road:
+            self.world.DestroyBody(t)
+        self.road = []
+        for car in self.cars:
+            car.destroy()
+        self.cars = []
+        self.car = None
+
+    def _spawn_cars(self):
+        """Place the cars on a two-wide starting grid behind the start line."""
+        for k in range(self.n_agents):
+            row, side = divmod(k, 2)
+            _, beta, x, y = self.track[-row * self.grid_spacing]
+            offset = (0.5 if side == 0 else -0.5) * TRACK_WIDTH if self.n_agents > 1 else 0.0
+            car = Car(self.world, beta, x + offset * math.cos(beta), y + offset * math.sin(beta))
+            car.hull.color = CAR_COLORS[k % len(CAR_COLORS)]
+            # Tag every body so the contact listener can attribute tiles and collisions
+            car.hull.userData = car.hull
+            for body in [car.hull] + car.wheels:
+                body.car_id = k
+            self.cars.append(car)
+        self.car = self.cars[self.camera_agent]
+
+    def reset(
+        self,
+        *,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ):
+        gym.Env.reset(self, seed=seed)
+        self._destroy()
+        self.world.contactListener_bug_workaround = MultiCarFrictionDetector(
+            self, self.lap_complete_percent
+        )
+        self.world.contactListener = self.world.contactListener_bug_workaround
+        self.reward = 0.0
+        self.prev_reward = 0.0
+        self.tile_visited_count = 0
+        self.t = 0.0
+        self.steps = 0
+        self.new_lap = False
+        self.road_poly = []
+        self.rewards.fill(0)
+        self.prev_rewards.fill(0)
+        self.tile_visited_counts.fill(0)
+        self.new_laps.fill(False)
+        self.car_contacts = set()
+
+        if self.domain_randomize:
+            randomize = True
+            if isinstance(options, dict):
+                if "randomize" in options:
+                    randomize = options["randomize"]
+
+            self._reinit_colors(randomize)
+
+        while True:
+            success = self._create_track()
+            if success:
+                break
+            if self.verbose:
+                print(
+                    "retry to generate track (normal if there are not many"
+                    "instances of this message)"
+                )
+        self.tile_visited = np.zeros((self.n_agents, len(self.track)), dtype=bool)
+        self._spawn_cars()
+        self.repainted_tiles = set()
+        if self.raster_renderer is not None:
+            self.raster_renderer.build()
+
+        if self.render_mode == "human":
+            self.render()
+        return self.step([None] * self.n_agents)[0], {}
+
+    def _apply_action(self, car: Car, action):
+        if self.continuous:
+            action = np.asarray(action, dtype=np.float64)
+            car.steer(-action[0])
+            car.gas(action[1])
+            car.brake(action[2])
+        else:
+            car.steer(-0.6 * (action == 1) + 0.6 * (action == 2))
+            car.gas(0.2 * (action == 3))
+            car.brake(0.8 * (action == 4))
+
+    def step(self, actions: Sequence[Any]):
+        assert self.cars
+        first_step = all(action is None for action in actions)
+        for car, action in zip(self.cars, actions):
+            if action is not None:
+                self._apply_action(car, action)
+
+        self.car_contacts = set()
+        for car in self.cars:
+            car.step(1.0 / FPS)
+        self.world.Step(1.0 / FPS, 6 * 30, 2 * 30)
+        self.t += 1.0 / FPS
+
+        self._render_states()
+
+        step_rewards = np.zeros(self.n_agents)
+        terminated = np.zeros(self.n_agents, dtype=bool)
+        truncated = np.zeros(self.n_agents, dtype=bool)
+        lap_finished = np.zeros(self.n_agents, dtype=bool)
+        if not first_step:  # First step without action, called from reset()
+            self.steps += 1
+            acting = np.array([action is not None for action in actions])
+            self.rewards[acting] -= 0.1
+            for car in self.cars:
+                car.fuel_spent = 0.0
+            step_rewards = self.rewards - self.prev_rewards
+            self.prev_rewards[:] = self.rewards
+
+            # Termination due to finishing lap
+            lap_finished = (self.tile_visited_counts == len(self.track)) | self.new_laps
+            terminated |= lap_finished
+            positions = np.array([car.hull.position for car in self.cars])
+            off_field = np.any(np.abs(positions) > PLAYFIELD, axis=1)
+            terminated |= off_field
+            step_rewards[off_field] = -100
+            truncated[:] = self.steps >= self.max_episode_steps
+            step_rewards[~acting] = 0.0
+
+        info = {
+            "lap_finished": lap_finished,
+            "car_contacts": sorted(self.car_contacts),
+        }
+        if self.render_mode == "human":
+            self.render()
+        return self.states.copy(), step_rewards, terminated, truncated, info
+
+    def _render_states(self):
+        """Render every car's state frame into ``self.states``."""
+        if self.raster_renderer is None:
+            for k in range(self.n_agents):
+                self.states[k] = self._render_agent(k, "state_pixels")
+            return
+        if self.repainted_tiles:
+            self.raster_renderer.repaint_tiles(self.repainted_tiles)
+            self.repainted_tiles = set()
+        # Same animated zoom-in over the first second as CarRacing._render
+        zoom = 0.1 * SCALE * max(1 - self.t, 0) + ZOOM * SCALE * min(self.t, 1)
+        self.raster_renderer.render_views(self.cars, self.rewards, zoom, self.states)
+
+    def _render_agent(self, agent_id: int, mode: str):
+        """Render the world from one car's point of view."""
+        self.car = self.cars[agent_id]
+        self.reward = self.rewards[agent_id]
+        try:
+            return self._render(mode)
+        finally:
+            self.car = self.cars[self.camera_agent]
+            self.reward = self.rewards[self.camera_agent]
+
+    def _render_road(self, zoom, translation, angle):
+        super()._render_road(zoom, translation, angle)
+        # The focal car is drawn by _render; draw everyone else on top of the road
+        for car in self.cars:
+            if car is not self.car:
+                car.draw(self.surf, zoom, translation, angle, False)
+
+    def render(self):
+        if self.render_mode is None:
+            return super().render()
+        return self._render_agent(self.camera_agent, self.render_mode)
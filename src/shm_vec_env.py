@@ -0,0 +1,179 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv, VecEnvObs, VecEnvStepReturn
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+from stable_baselines3.common.vec_env.subproc_vec_env import SubprocVecEnv
+
+
+def _shm_worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper, env_idx: int) -> None:
+    """
+    Worker loop that writes observations into the shared block instead of the pipe.
+
+    Same protocol as SB3's ``SubprocVecEnv`` worker plus an "attach" command that
+    maps the shared observation block; "step" and "reset" also carry the slot to write.
+    """
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = _patch_env(env_fn_wrapper.var())
+    shm, obs_buf = None, None
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                action, slot = data
+                observation, reward, terminated, truncated, info = env.step(action)
+                # convert to SB3 VecEnv api
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                reset_info = {}
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = observation
+                    observation, reset_info = env.reset()
+                obs_buf[slot, env_idx] = observation
+                remote.send((reward, done, info, reset_info))
+            elif cmd == "reset":
+                seed, options, slot = data
+                maybe_options = {"options": options} if options else {}
+                observation, reset_info = env.reset(seed=seed, **maybe_options)
+                obs_buf[slot, env_idx] = observation
+                remote.send(reset_info)
+            elif cmd == "attach":
+                name, shape, dtype = data
+                shm = shared_memory.SharedMemory(name=name)
+                obs_buf = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                remote.send(None)
+            elif cmd == "close":
+                env.close()
+                del obs_buf
+                if shm is not None:
+                    shm.close()
+                remote.close()
+                break
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "has_attr":
+                try:
+                    env.get_wrapper_attr(data)
+                    remote.send(True)
+                except AttributeError:
+                    remote.send(False)
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            break
+
+
+class SharedMemoryVecEnv(SubprocVecEnv):
+    """
+    Multiprocess vectorized env whose workers return observations through shared memory.
+
+    Workers write each observation straight into a ``multiprocessing.shared_memory``
+    block laid out as (2, n_envs, *obs_shape); the main process returns views into it,
+    so observations are never pickled through the pipes. Two slots are used in
+    alternation so that the observation returned by one step is still intact while the
+    algorithm holds on to it during the next step (e.g. SB3's ``_last_obs``); a returned
+    observation is only overwritten by the second step/reset after it.
+
+    Drop-in for ``make_vec_env``::
+
+        env = make_vec_env(lambda: CarRacingWrapper(obs_dtype="uint8"), n_envs=16,
+                           vec_env_cls=SharedMemoryVecEnv)
+
+    Only ``Box`` observation spaces are supported.
+
+    :param env_fns: Environments to run in subprocesses
+    :param start_method: method used to start the subprocesses, as in ``SubprocVecEnv``
+    """
+
+    def __init__(self, env_fns: List[Callable[[], gym.Env]], start_method: Optional[str] = None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for env_idx, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), env_idx)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_shm_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        if not isinstance(observation_space, spaces.Box):
+            raise ValueError(f"SharedMemoryVecEnv only supports Box observation spaces, got {observation_space}")
+
+        VecEnv.__init__(self, n_envs, observation_space, action_space)
+
+        shape = (2, n_envs) + observation_space.shape
+        dtype = np.dtype(observation_space.dtype)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * dtype.itemsize)
+        self.obs_buf = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+        for remote in self.remotes:
+            remote.send(("attach", (self.shm.name, shape, dtype)))
+        for remote in self.remotes:
+            remote.recv()
+        self.slot = 0
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.slot ^= 1
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", (action, self.slot)))
+        self.waiting = True
+
+    def step_wait(self) -> VecEnvStepReturn:
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        rews, dones, infos, self.reset_infos = zip(*results)
+        return self.obs_buf[self.slot], np.stack(rews), np.stack(dones), infos
+
+    def reset(self) -> VecEnvObs:
+        self.slot ^= 1
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx], self.slot)))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self.obs_buf[self.slot]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        del self.obs_buf
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Observations handed out earlier still reference the block; the
+            # mapping is released once they are garbage collected
+            pass
@@ -0,0 +1,74 @@
+import numpy as np
+from typing import Tuple
+
+# Below this many agents a dense distance matrix is cheaper than building a grid
+GRID_MIN_AGENTS = 64
+
+# Cell offsets covering each neighbouring pair of cells exactly once
+_HALF_NEIGHBOURHOOD = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def dense_neighbor_pairs(positions: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All pairs i < j closer than ``radius`` from one broadcasted distance matrix."""
+    diff = positions[:, None, :] - positions[None, :, :]
+    sq_dist = np.einsum("ijk,ijk->ij", diff, diff)
+    i, j = np.nonzero(np.triu(sq_dist < radius * radius, k=1))
+    return i, j, sq_dist[i, j]
+
+
+def grid_neighbor_pairs(positions: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs i < j closer than ``radius`` using a uniform grid with cell size ``radius``.
+
+    Agents are bucketed by cell and only the same and adjacent cells are compared,
+    so the cost grows with the number of nearby pairs rather than N^2.
+    """
+    n = len(positions)
+    cells = np.floor(positions / radius).astype(np.int64)
+    cells -= cells.min(axis=0)
+    # Pad by one cell on each side so neighbour keys never wrap into another row
+    width = cells[:, 1].max() + 3
+    keys = (cells[:, 0] + 1) * width + (cells[:, 1] + 1)
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    all_i, all_j = [], []
+    for dx, dy in _HALF_NEIGHBOURHOOD:
+        neighbour_keys = keys + dx * width + dy
+        lo = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - lo
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(n), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + offsets]
+        if (dx, dy) == (0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        all_i.append(i)
+        all_j.append(j)
+
+    if not all_i:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=positions.dtype)
+
+    i, j = np.concatenate(all_i), np.concatenate(all_j)
+    diff = positions[i] - positions[j]
+    sq_dist = np.einsum("ij,ij->i", diff, diff)
+    close = sq_dist < radius * radius
+    i, j = np.minimum(i[close], j[close]), np.maximum(i[close], j[close])
+    return i, j, sq_dist[close]
+
+
+def neighbor_pairs(positions: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return (i, j, squared_distance) for every agent pair i < j closer than ``radius``.
+
+    Uses a dense broadcasted distance matrix for small agent counts and a uniform
+    grid index for large ones.
+    """
+    if len(positions) < GRID_MIN_AGENTS:
+        return dense_neighbor_pairs(positions, radius)
+    return grid_neighbor_pairs(positions, radius)
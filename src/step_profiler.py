@@ -0,0 +1,322 @@
+import bisect
+import cProfile
+import math
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_LOG_DIR = "./logs/CarRacing-v3/tensorboard/env_profile"
+
+# Histogram bucket upper limits in seconds: 1 µs to 10 s, 8 per decade
+BUCKET_LIMITS = [10 ** (k / 8) for k in range(-48, 9)]
+
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    """Reusable context manager timing one named stage of a ``StageProfiler``."""
+
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler: "StageProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._inner.append(0.0)
+        self.profiler._starts.append(time.perf_counter())
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self.name, time.perf_counter() - self.profiler._starts.pop())
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "total_sq", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_LIMITS) + 1)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_LIMITS, seconds)] += 1
+        self.total += seconds
+        self.total_sq += seconds * seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float:
+        """Upper limit of the bucket holding the ``q`` quantile, capped at the largest sample."""
+        cumulative = np.cumsum(self.counts)
+        bucket = int(np.searchsorted(cumulative, q * cumulative[-1]))
+        return min(BUCKET_LIMITS[bucket] if bucket < len(BUCKET_LIMITS) else math.inf, self.max)
+
+
+class StageProfiler:
+    """
+    Opt-in wall-clock timers for the stages of an environment's ``step`` and ``reset``.
+
+    Environments time their stages with ``with profiler.stage("preprocess"): ...``
+    and call ``step_done(info)`` at the end of every step and ``reset_done(info)``
+    at the end of every reset. Times are exclusive: a stage nested inside another
+    (rendering inside the physics step, say) is not counted again in the outer
+    one, so the stages of a step add up to its total. Each stage's time per step
+    goes into a fixed set of log-spaced buckets, from which ``summary`` reports
+    count, mean, percentiles and max; resets have histograms of their own
+    (``summary(resets=True)``) so they never skew the step figures.
+
+    ``info["stage_times"]`` holds the seconds spent in each stage during that
+    step or reset. Every ``log_every`` steps the histograms are also put in
+    ``info["stage_summary"]`` (and ``info["reset_stage_summary"]``), written to TensorBoard under ``log_dir`` (unless
+    it is None) and then cleared, so each summary covers one window of steps.
+
+    A disabled profiler (the environments' default) hands out a shared no-op
+    context manager and installs no method wrappers, so it costs an attribute
+    lookup per stage. ``enabled`` may be toggled at runtime to pause timing.
+    """
+
+    def __init__(self, enabled: bool = True, log_dir: Optional[str] = DEFAULT_LOG_DIR, log_every: int = 1000):
+        if log_every < 0:
+            raise ValueError(f"log_every must be non-negative, got {log_every}")
+        self.enabled = enabled
+        self.log_dir = log_dir
+        self.log_every = log_every  # 0 = never summarize automatically
+        self.histograms: Dict[str, _Histogram] = {}
+        self.reset_histograms: Dict[str, _Histogram] = {}
+        self.step_times: Dict[str, float] = {}  # stage times since the last step or reset ended
+        self.steps = 0  # steps since the histograms were last cleared
+        self.resets = 0
+        self.global_step = 0
+        self.writer = None
+        self._stages: Dict[str, _Stage] = {}
+        self._starts: List[float] = []  # start time of each open stage
+        self._inner: List[float] = []  # time spent in nested stages, per open stage
+        self._session: Optional["ProfileSession"] = None
+
+    def stage(self, name: str):
+        """Context manager timing the enclosed block as stage ``name``."""
+        if not self.enabled:
+            return _NULL_STAGE
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self, name)
+        return stage
+
+    def _exit(self, name: str, elapsed: float):
+        exclusive = elapsed - self._inner.pop()
+        if self._inner:
+            self._inner[-1] += elapsed
+        self.step_times[name] = self.step_times.get(name, 0.0) + exclusive
+
+    def _flush(self, histograms: Dict[str, _Histogram], info: Optional[Dict[str, Any]]):
+        for name, seconds in self.step_times.items():
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = _Histogram()
+            histogram.add(seconds)
+        if info is not None:
+            info["stage_times"] = self.step_times
+        self.step_times = {}
+
+    def instrument(self, obj: Any, attr: str, name: str):
+        """
+        Time every call of ``obj.attr`` as stage ``name`` by replacing it on that
+        instance, for stages that run inside code we do not own (e.g. CarRacing's
+        rendering inside its ``step``). Does nothing on a disabled profiler.
+        """
+        if not self.enabled:
+            return
+        method = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return method(*args, **kwargs)
+
+        setattr(obj, attr, timed)
+
+    def step_done(self, info: Optional[Dict[str, Any]] = None):
+        """End of one environment step: report its stage times and summarize periodically."""
+        if self._session is not None:
+            self._session.step()
+        if not self.enabled:
+            return
+        self.steps += 1
+        self.global_step += 1
+        self._flush(self.histograms, info)
+        if self.log_every and self.steps >= self.log_every:
+            if info is not None:
+                info["stage_summary"] = self.summary()
+                info["reset_stage_summary"] = self.summary(resets=True)
+            if self.log_dir is not None:
+                self.write_tensorboard()
+            self.reset()
+
+    def reset_done(self, info: Optional[Dict[str, Any]] = None):
+        """End of one environment reset: report its stage times, kept apart from the steps'."""
+        if not self.enabled:
+            return
+        self.resets += 1
+        self._flush(self.reset_histograms, info)
+
+    def summary(self, resets: bool = False) -> Dict[str, Dict[str, float]]:
+        """
+        Per stage of the steps (or resets): the number of steps it ran in, the
+        fraction of steps that is, and total/mean/p50/p95/p99/max milliseconds per step.
+        """
+        histograms, n = (self.reset_histograms, self.resets) if resets else (self.histograms, self.steps)
+        summary = {}
+        for name, histogram in histograms.items():
+            count = histogram.count
+            summary[name] = {
+                "count": count,
+                "per_step": count / n if n else float("nan"),
+                "total_ms": 1e3 * histogram.total,
+                "mean_ms": 1e3 * histogram.total / count,
+                "p50_ms": 1e3 * histogram.quantile(0.5),
+                "p95_ms": 1e3 * histogram.quantile(0.95),
+                "p99_ms": 1e3 * histogram.quantile(0.99),
+                "max_ms": 1e3 * histogram.max,
+            }
+        return summary
+
+    def write_tensorboard(self):
+        """
+        Log each stage's histogram and mean/p95 (ms) under ``env_profile/`` in
+        ``log_dir``, and those of resets under ``env_profile/reset/``.
+        """
+        if self.writer is None:
+            from torch.utils.tensorboard import SummaryWriter
+
+            self.writer = SummaryWriter(self.log_dir)
+        for prefix, histograms, resets in (("env_profile", self.histograms, False),
+                                           ("env_profile/reset", self.reset_histograms, True)):
+            for name, stats in self.summary(resets).items():
+                histogram = histograms[name]
+                # TensorBoard wants the last bucket limit finite
+                limits = BUCKET_LIMITS + [max(histogram.max, BUCKET_LIMITS[-1]) * 10]
+                self.writer.add_histogram_raw(
+                    f"{prefix}/{name}", min=histogram.min, max=histogram.max, num=stats["count"],
+                    sum=histogram.total, sum_squares=histogram.total_sq, bucket_limits=limits,
+                    bucket_counts=histogram.counts, global_step=self.global_step
+                )
+                self.writer.add_scalar(f"{prefix}/{name}/mean_ms", stats["mean_ms"], self.global_step)
+                self.writer.add_scalar(f"{prefix}/{name}/p95_ms", stats["p95_ms"], self.global_step)
+        self.writer.flush()
+
+    def reset(self):
+        """Clear the step and reset histograms; stages keep their names."""
+        self.histograms.clear()
+        self.reset_histograms.clear()
+        self.step_times = {}
+        self.steps = 0
+        self.resets = 0
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    @contextmanager
+    def profile(self, n_steps: int, mode: str = "cprofile", output: Optional[str] = None,
+                interval: float = 0.001):
+        """
+        Profile the next ``n_steps`` steps (or the ``with`` block, if it ends first).
+
+        ``mode="cprofile"`` traces every call with cProfile; the session's ``stats``
+        is a ``pstats.Stats`` and ``output`` receives the raw profile for
+        snakeviz/pstats. ``mode="sampling"`` instead records the calling thread's
+        stack every ``interval`` seconds from a background thread, which barely
+        slows the environment; ``output`` receives the stacks in the collapsed
+        "a;b;c count" format read by flamegraph.pl and speedscope. Works whether
+        or not the stage timers are enabled.
+        """
+        if mode not in ("cprofile", "sampling"):
+            raise ValueError(f"mode must be 'cprofile' or 'sampling', got {mode!r}")
+        if self._session is not None:
+            raise RuntimeError("A profiling session is already running")
+        session = ProfileSession(n_steps, mode, interval)
+        self._session = session
+        session.start()
+        try:
+            yield session
+        finally:
+            session.stop()
+            self._session = None
+            if output is not None:
+                session.save(output)
+
+
+class ProfileSession:
+    """One ``StageProfiler.profile`` run; ``stats`` (cProfile) or ``samples`` (sampling) hold the result."""
+
+    def __init__(self, n_steps: int, mode: str, interval: float):
+        self.n_steps = n_steps
+        self.mode = mode
+        self.interval = interval
+        self.steps = 0
+        self.stats: Optional[pstats.Stats] = None
+        self.samples: Counter = Counter()
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+            self._sampler.start()
+
+    def step(self):
+        if not self._running:
+            return
+        self.steps += 1
+        if self.steps >= self.n_steps:
+            self.stop()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        if self._profile is not None:
+            self._profile.disable()
+            self.stats = pstats.Stats(self._profile)
+        else:
+            self._stop.set()
+            self._sampler.join()
+
+    def _sample(self, thread_id: int):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, path: str):
+        if self.stats is not None:
+            self.stats.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+import warnings
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from telemetry_publisher import TELEMETRY_RECORD_DTYPE
+
+FPS = 50  # CarRacing simulation steps per second
+
+# 1s rollup columns and how each is reduced over a bin of FPS steps
+SECOND_ROLLUPS = {
+    "x": "last", "y": "last", "angle": "last", "progress": "last", "lap": "last",
+    "speed": "mean", "max_speed": "max", "steering": "mean", "throttle": "mean", "brake": "mean",
+    "reward": "sum",
+}
+
+LAP_COLUMNS = ("start_time", "end_time", "lap_time", "completed", "mean_speed", "max_speed", "reward")
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    """(n_steps, n_agents) values with NaN gaps filled by the last valid value (0 before any)."""
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = values[rows, np.arange(values.shape[1])]
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def _json_column(values: np.ndarray) -> List[Any]:
+    """Column as JSON-safe nested lists (NaN becomes None)."""
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        values = np.where(np.isnan(values), None, values.astype(object))
+    return values.tolist()
+
+
+class TelemetryHistoryStore:
+    """
+    On-disk columnar history of telemetry episodes with multi-resolution rollups.
+
+    Every episode is a directory holding, per resolution, one ``.npy`` file per
+    column: ``raw`` has one row per simulation step, ``1s`` one row per second of
+    simulated time (``FPS`` steps) and ``lap`` one row per lap, each with one
+    column entry per agent. Queries memory-map only the requested columns and
+    slice the requested time or lap range, so reading a whole race or a window of
+    it costs a few page reads instead of a replay. Episodes are written once, to a
+    temporary directory renamed into place, so readers never see partial data.
+
+    CarRacing ends a car's episode as soon as it finishes the lap, and the tile
+    count behind ``progress`` never resets, so an episode is exactly one lap per
+    car: ``lap`` has a single row (lap 0, ``completed`` once the car reached
+    ``lap_fraction`` of the track) and a lap range selects the whole episode.
+    """
+
+    def __init__(self, path: str, lap_fraction: float = 0.95):
+        self.path = path
+        self.lap_fraction = lap_fraction
+
+    def _episode_dir(self, episode: int) -> str:
+        return os.path.join(self.path, f"episode_{episode:05d}")
+
+    def episode_ids(self) -> List[int]:
+        # The directory is only created with the first episode written
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            int(name[len("episode_"):]) for name in os.listdir(self.path)
+            if name.startswith("episode_") and not name.endswith(".tmp")
+        )
+
+    def write_episode(self, records: np.ndarray, source: Optional[Dict[str, Any]] = None) -> int:
+        """Store one episode of TELEMETRY_RECORD_DTYPE records; returns its episode id."""
+        records = np.asarray(records, dtype=TELEMETRY_RECORD_DTYPE)
+        if len(records) == 0:
+            raise ValueError("Cannot store an empty episode")
+        steps = records["step"].astype(np.int64)
+        agents = records["agent"].astype(np.int64)
+        n_steps, n_agents = int(steps.max()) + 1, int(agents.max()) + 1
+
+        # Scatter into (step, agent) grids; steps an agent did not take stay NaN
+        raw: Dict[str, np.ndarray] = {}
+        for name in ("x", "y", "angle", "vx", "vy", "steering", "throttle", "brake", "reward", "progress"):
+            grid = np.full((n_steps, n_agents), np.nan, dtype=np.float32)
+            grid[steps, agents] = records[name]
+            raw[name] = grid
+        raw["speed"] = np.hypot(raw["vx"], raw["vy"])
+        filled_progress = _forward_fill(raw["progress"])
+        raw["lap"] = np.zeros((n_steps, n_agents), dtype=np.int32)  # one lap per episode, see class docstring
+        time = np.arange(n_steps, dtype=np.float32) / FPS
+
+        # 1s rollups over bins of FPS steps
+        n_bins = (n_steps + FPS - 1) // FPS
+        bin_starts = np.arange(n_bins) * FPS
+        seconds: Dict[str, np.ndarray] = {}
+        bin_counts = np.diff(np.append(bin_starts, n_steps))
+        bin_ends = bin_starts + bin_counts - 1
+        for name, reduction in SECOND_ROLLUPS.items():
+            values = raw["speed" if name == "max_speed" else name]
+            if reduction == "last":
+                seconds[name] = values[bin_ends]
+            else:
+                padded = np.full((n_bins * FPS, n_agents), np.nan, dtype=np.float32)
+                padded[:n_steps] = values
+                padded = padded.reshape(n_bins, FPS, n_agents)
+                with warnings.catch_warnings():
+                    # Bins where a car took no steps reduce to NaN
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    reduce = {"mean": np.nanmean, "max": np.nanmax, "sum": np.nansum}[reduction]
+                    seconds[name] = reduce(padded, axis=1).astype(np.float32)
+
+        # Per-lap rollups; laps a car never reached stay NaN
+        n_laps = int(raw["lap"].max()) + 1
+        laps = {name: np.full((n_laps, n_agents), np.nan, dtype=np.float32) for name in LAP_COLUMNS}
+        for agent in range(n_agents):
+            for lap in range(n_laps):
+                lap_steps = np.flatnonzero((raw["lap"][:, agent] == lap) & ~np.isnan(raw["x"][:, agent]))
+                if len(lap_steps) == 0:
+                    continue
+                start, end = lap_steps[0], lap_steps[-1]
+                laps["start_time"][lap, agent] = time[start]
+                laps["end_time"][lap, agent] = (end + 1) / FPS
+                laps["lap_time"][lap, agent] = (end + 1 - start) / FPS
+                laps["completed"][lap, agent] = float(filled_progress[lap_steps, agent].max() >= self.lap_fraction)
+                laps["mean_speed"][lap, agent] = np.nanmean(raw["speed"][lap_steps, agent])
+                laps["max_speed"][lap, agent] = np.nanmax(raw["speed"][lap_steps, agent])
+                laps["reward"][lap, agent] = np.nansum(raw["reward"][lap_steps, agent])
+
+        episode = max(self.episode_ids(), default=-1) + 1
+        final_dir = self._episode_dir(episode)
+        tmp_dir = final_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for resolution, columns, index in (("raw", raw, time), ("1s", seconds, bin_starts.astype(np.float32) / FPS),
+                                           ("lap", laps, None)):
+            os.makedirs(os.path.join(tmp_dir, resolution))
+            if index is not None:
+                np.save(os.path.join(tmp_dir, resolution, "time.npy"), index)
+            for name, values in columns.items():
+                np.save(os.path.join(tmp_dir, resolution, f"{name}.npy"), values)
+        meta = {
+            "episode": episode,
+            "n_steps": n_steps,
+            "n_agents": n_agents,
+            "n_laps": n_laps,
+            "duration": n_steps / FPS,
+            "fps": FPS,
+            "laps_completed": np.nansum(laps["completed"], axis=0).astype(int).tolist(),
+            "total_reward": np.nansum(raw["reward"], axis=0).tolist(),
+            "final_progress": filled_progress[-1].tolist(),
+            "source": source or {},
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_dir, final_dir)
+        return episode
+
+    def meta(self, episode: int) -> Dict[str, Any]:
+        meta_path = os.path.join(self._episode_dir(episode), "meta.json")
+        if not os.path.exists(meta_path):
+            raise KeyError(f"No episode {episode} in {self.path}")
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def episodes(self) -> List[Dict[str, Any]]:
+        return [self.meta(episode) for episode in self.episode_ids()]
+
+    def _resolution_dir(self, episode: int, resolution: str) -> str:
+        if resolution not in ("raw", "1s", "lap"):
+            raise ValueError(f"resolution must be 'raw', '1s' or 'lap', got {resolution!r}")
+        if not os.path.isdir(self._episode_dir(episode)):
+            raise KeyError(f"No episode {episode} in {self.path}")
+        return os.path.join(self._episode_dir(episode), resolution)
+
+    def columns(self, episode: int, resolution: str = "raw") -> List[str]:
+        directory = self._resolution_dir(episode, resolution)
+        return sorted(name[:-4] for name in os.listdir(directory) if name != "time.npy")
+
+    def _column(self, episode: int, resolution: str, name: str) -> np.ndarray:
+        path = os.path.join(self._resolution_dir(episode, resolution), f"{name}.npy")
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown {resolution} column {name!r}")
+        return np.load(path, mmap_mode="r")
+
+    def query(self, episode: int, resolution: str = "raw", columns: Optional[Sequence[str]] = None,
+              t_start: Optional[float] = None, t_end: Optional[float] = None,
+              lap_start: Optional[int] = None, lap_end: Optional[int] = None,
+              agents: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """
+        ``columns`` of the ``raw`` or ``1s`` series within [t_start, t_end) seconds
+        and, given a lap range, within the steps any selected car spent on laps
+        [lap_start, lap_end]. Each column is (rows, agents); ``time`` is (rows,).
+        """
+        if resolution == "lap":
+            return self.laps(episode, columns, lap_start, lap_end, agents)
+        columns = list(columns or self.columns(episode, resolution))
+        agents = slice(None) if agents is None else np.asarray(agents, dtype=np.int64)
+        time = self._column(episode, resolution, "time")
+        start = 0 if t_start is None else int(np.searchsorted(time, t_start, side="left"))
+        end = len(time) if t_end is None else int(np.searchsorted(time, t_end, side="left"))
+        if lap_start is not None or lap_end is not None:
+            laps = self._column(episode, "lap", "start_time")
+            lap_slice = slice(lap_start, None if lap_end is None else lap_end + 1)
+            starts = np.asarray(laps[lap_slice][:, agents])
+            ends = np.asarray(self._column(episode, "lap", "end_time")[lap_slice][:, agents])
+            if np.isnan(starts).all():
+                start = end = 0
+            else:
+                start = max(start, int(np.searchsorted(time, np.nanmin(starts), side="left")))
+                end = min(end, int(np.searchsorted(time, np.nanmax(ends), side="left")))
+        end = max(start, end)
+        result = {"time": np.asarray(time[start:end])}
+        for name in columns:
+            result[name] = np.asarray(self._column(episode, resolution, name)[start:end][:, agents])
+        return result
+
+    def laps(self, episode: int, columns: Optional[Sequence[str]] = None, lap_start: Optional[int] = None,
+             lap_end: Optional[int] = None, agents: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """Per-lap rollup ``columns`` for laps [lap_start, lap_end], each (laps, agents)."""
+        columns = list(columns or LAP_COLUMNS)
+        agents = slice(None) if agents is None else np.asarray(agents, dtype=np.int64)
+        lap_slice = slice(lap_start, None if lap_end is None else lap_end + 1)
+        n_laps = self.meta(episode)["n_laps"]
+        result = {"lap": np.arange(n_laps)[lap_slice]}
+        for name in columns:
+            result[name] = np.asarray(self._column(episode, "lap", name)[lap_slice][:, agents])
+        return result
+
+    @staticmethod
+    def to_json(result: Dict[str, np.ndarray]) -> Dict[str, List[Any]]:
+        return {name: _json_column(values) for name, values in result.items()}
+
+
+class TelemetryHistorySink:
+    """
+    Telemetry publisher consumer that buffers each episode's records and writes
+    the episode to a ``TelemetryHistoryStore`` once its last step has arrived
+    (when records of the next episode show up, or on ``close``).
+    """
+
+    def __init__(self, store: TelemetryHistoryStore, source: Optional[Dict[str, Any]] = None):
+        self.store = store
+        self.source = source or {}
+        self._episode: Optional[int] = None
+        self._chunks: List[np.ndarray] = []
+
+    def _flush(self):
+        if self._chunks:
+            self.store.write_episode(np.concatenate(self._chunks), dict(self.source, run_episode=self._episode))
+        self._chunks = []
+
+    def __call__(self, records: np.ndarray):
+        boundaries = np.flatnonzero(np.diff(records["episode"].astype(np.int64))) + 1
+        for chunk in np.split(records, boundaries):
+            episode = int(chunk["episode"][0])
+            if episode != self._episode:
+                self._flush()
+                self._episode = episode
+            self._chunks.append(chunk)
+
+    def close(self):
+        self._flush()
@@ -0,0 +1,234 @@
+import json
+import threading
+import time
+import urllib.request
+from typing import Callable, List, Sequence
+
+import gymnasium as gym
+import numpy as np
+
+from agent_pool import AGENT_STATE_DTYPE, read_car_state
+
+# One packed per-agent, per-step record (50 bytes)
+TELEMETRY_RECORD_DTYPE = np.dtype([
+    ("episode", "<u4"),
+    ("step", "<u4"),
+    ("agent", "<u2"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("angle", "<f4"),
+    ("vx", "<f4"),
+    ("vy", "<f4"),
+    ("steering", "<f4"),
+    ("throttle", "<f4"),
+    ("brake", "<f4"),
+    ("reward", "<f4"),
+    ("progress", "<f4"),      # fraction of the lap's road tiles visited
+])
+
+TelemetryConsumer = Callable[[np.ndarray], None]
+
+
+def action_controls(actions, continuous: bool) -> np.ndarray:
+    """(n_agents, 3) steering/throttle/brake of CarRacing actions, discrete ones mapped as CarRacing applies them."""
+    if continuous:
+        return np.asarray(actions, dtype=np.float32).reshape(-1, 3)
+    actions = np.asarray(actions).reshape(-1)
+    return np.stack([
+        0.6 * (actions == 1) - 0.6 * (actions == 2),
+        0.2 * (actions == 3),
+        0.8 * (actions == 4),
+    ], axis=1).astype(np.float32)
+
+
+class TelemetryPublisher:
+    """
+    Hands per-step telemetry records from the simulation to consumers off the hot path.
+
+    Records go into a preallocated ring of ``capacity`` TELEMETRY_RECORD_DTYPE
+    slots with one writer (the simulation) and one reader (the drain thread). The
+    writer only copies the batch in and advances ``head``; the reader copies out up
+    to ``head`` and advances ``tail``, so neither takes a lock. When the ring has
+    no room for a batch, ``publish`` drops it and adds it to ``dropped`` instead of
+    waiting. Every ``drain_interval`` seconds the drain thread passes the pending
+    records, as one array, to each consumer (any callable; ``close`` is called on
+    consumers that have it). Consumer errors are counted, not raised.
+    """
+
+    def __init__(self, consumers: Sequence[TelemetryConsumer] = (), capacity: int = 65536,
+                 drain_interval: float = 0.05):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.consumers: List[TelemetryConsumer] = list(consumers)
+        self.capacity = capacity
+        self.drain_interval = drain_interval
+        self.records = np.zeros(capacity, dtype=TELEMETRY_RECORD_DTYPE)
+        self.head = 0  # records ever published; written by the simulation only
+        self.tail = 0  # records ever drained; written by the drain thread only
+        self.dropped = 0
+        self.consumer_errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self._thread.start()
+
+    def publish(self, records: np.ndarray) -> bool:
+        """Queue a batch of records; returns False (and counts them) if it was dropped."""
+        n = len(records)
+        start = self.head
+        if n > self.capacity - (start - self.tail):
+            self.dropped += n
+            return False
+        offset = start % self.capacity
+        head = min(n, self.capacity - offset)
+        self.records[offset:offset + head] = records[:head]
+        self.records[:n - head] = records[head:]
+        self.head = start + n  # publish only after the copy
+        return True
+
+    @property
+    def pending(self) -> int:
+        return self.head - self.tail
+
+    def drain(self) -> int:
+        """Deliver everything published so far to the consumers; returns the number of records."""
+        start, end = self.tail, self.head
+        n = end - start
+        if n == 0:
+            return 0
+        offset = start % self.capacity
+        indices = (offset + np.arange(n)) % self.capacity
+        batch = self.records[indices]
+        self.tail = end  # the slots may be reused from here on
+        for consumer in self.consumers:
+            try:
+                consumer(batch)
+            except Exception:
+                self.consumer_errors += 1
+        return n
+
+    def _drain_loop(self):
+        while not self._stop.wait(self.drain_interval):
+            self.drain()
+
+    def close(self):
+        """Stop the drain thread, deliver what is left and close the consumers."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.drain()
+        for consumer in self.consumers:
+            close = getattr(consumer, "close", None)
+            if close is not None:
+                close()
+
+
+class TelemetryWrapper(gym.Wrapper):
+    """
+    Publishes one TELEMETRY_RECORD_DTYPE record per car after every step of a
+    ``MultiAgentCarRacingEnv`` or ``CarRacingWrapper``: episode, step, agent id,
+    pose, velocity, the applied steering/throttle/brake, reward and lap progress.
+
+    Records are filled into a preallocated array and handed to ``publisher``, so a
+    step costs a few array writes and a copy however slow the consumers are.
+    """
+
+    def __init__(self, env: gym.Env, publisher: TelemetryPublisher):
+        super().__init__(env)
+        self.publisher = publisher
+        self.multi_agent = hasattr(env.unwrapped, "agent_states")
+        n_agents = env.unwrapped.n_agents if self.multi_agent else 1
+        self._states = np.zeros(n_agents, dtype=AGENT_STATE_DTYPE)
+        self._records = np.zeros(n_agents, dtype=TELEMETRY_RECORD_DTYPE)
+        self._records["agent"] = np.arange(n_agents)
+        self.episode = -1
+        self.steps = 0
+
+    def reset(self, **kwargs):
+        self.episode += 1
+        self.steps = 0
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        car_racing = self.env.unwrapped
+        if self.multi_agent:
+            states = car_racing.agent_states
+        else:
+            read_car_state(car_racing.env, self._states[0])
+            states = self._states
+        records = self._records
+        records["episode"] = self.episode
+        records["step"] = self.steps
+        records["x"], records["y"] = states["position"][:, 0], states["position"][:, 1]
+        records["vx"], records["vy"] = states["velocity"][:, 0], states["velocity"][:, 1]
+        records["angle"] = states["angle"]
+        controls = action_controls(action, car_racing.continuous)
+        records["steering"], records["throttle"], records["brake"] = controls[:, 0], controls[:, 1], controls[:, 2]
+        records["reward"] = reward
+        records["progress"] = states["progress"]
+        self.publisher.publish(records)
+        self.steps += 1
+        return obs, reward, terminated, truncated, info
+
+
+class TelemetryFileSink:
+    """Consumer appending raw records to a binary file; read it back with ``read_telemetry_file``."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "ab")
+
+    def __call__(self, records: np.ndarray):
+        records.tofile(self.file)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_telemetry_file(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=TELEMETRY_RECORD_DTYPE)
+
+
+class TensorBoardSink:
+    """Consumer logging each agent's mean speed and reward per drained batch under ``telemetry/``."""
+
+    def __init__(self, log_dir: str):
+        from torch.utils.tensorboard import SummaryWriter
+
+        self.writer = SummaryWriter(log_dir)
+        self.global_step = 0
+
+    def __call__(self, records: np.ndarray):
+        self.global_step += len(records)
+        speed = np.hypot(records["vx"], records["vy"])
+        for agent in np.unique(records["agent"]):
+            mask = records["agent"] == agent
+            self.writer.add_scalar(f"telemetry/agent_{agent}/speed", float(speed[mask].mean()), self.global_step)
+            self.writer.add_scalar(f"telemetry/agent_{agent}/reward", float(records["reward"][mask].sum()),
+                                   self.global_step)
+            self.writer.add_scalar(f"telemetry/agent_{agent}/progress", float(records["progress"][mask][-1]),
+                                   self.global_step)
+
+    def close(self):
+        self.writer.close()
+
+
+class DashboardSink:
+    """Consumer posting records to a running dashboard's ``POST /telemetry`` endpoint."""
+
+    def __init__(self, url: str = "http://127.0.0.1:5000/telemetry", timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, records: np.ndarray):
+        now = time.time()
+        frames = [{
+            "episode": int(r["episode"]), "step": int(r["step"]), "car": int(r["agent"]), "time": now,
+            "x": float(r["x"]), "y": float(r["y"]), "angle": float(r["angle"]),
+            "speed": float(np.hypot(r["vx"], r["vy"])), "steering": float(r["steering"]),
+            "throttle": float(r["throttle"]), "brake": float(r["brake"]), "progress": float(r["progress"]),
+        } for r in records]
+        request = urllib.request.Request(self.url, data=json.dumps(frames).encode(),
+                                         headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(request, timeout=self.timeout).close()
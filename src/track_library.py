@@ -0,0 +1,194 @@
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from gymnasium.envs.box2d.car_racing import TRACK_WIDTH
+
+
+class Straight:
+    """Straight segment of ``length`` world units."""
+
+    def __init__(self, length: float):
+        self.length = float(length)
+
+    def arcs(self) -> List[Tuple[float, float]]:
+        return [(self.length, 0.0)]
+
+    def key(self) -> tuple:
+        return ("straight", self.length)
+
+
+class Arc:
+    """Circular arc of ``radius`` turning by ``angle`` degrees (positive = left, negative = right)."""
+
+    def __init__(self, radius: float, angle: float):
+        self.radius = float(radius)
+        self.angle = float(angle)
+
+    def arcs(self) -> List[Tuple[float, float]]:
+        sign = 1.0 if self.angle >= 0 else -1.0
+        return [(self.radius * math.radians(abs(self.angle)), sign / self.radius)]
+
+    def key(self) -> tuple:
+        return ("arc", self.radius, self.angle)
+
+
+class Chicane:
+    """
+    Double S-bend that swerves out and back: four arcs of ``radius`` turning by
+    +angle, -angle, -angle, +angle degrees (negative ``angle`` mirrors it). The
+    sideways displacements cancel, so the track leaves on the line and heading it
+    entered with, ``4 * radius * sin(angle)`` further along.
+    """
+
+    def __init__(self, radius: float, angle: float):
+        self.radius = float(radius)
+        self.angle = float(angle)
+
+    def arcs(self) -> List[Tuple[float, float]]:
+        turns = [self.angle, -self.angle, -self.angle, self.angle]
+        return [arc for turn in turns for arc in Arc(self.radius, turn).arcs()]
+
+    def key(self) -> tuple:
+        return ("chicane", self.radius, self.angle)
+
+
+Segment = Union[Straight, Arc, Chicane]
+
+
+def oval(straight_length: float = 300, turn_radius: float = 100) -> List[Segment]:
+    """The CircularCarRacing oval: up the front straight, two right-hand hairpins."""
+    return [Straight(straight_length), Arc(turn_radius, -180),
+            Straight(straight_length), Arc(turn_radius, -180)]
+
+
+TRACK_LIBRARY: Dict[str, List[Segment]] = {
+    "oval": oval(),
+    "chicane_oval": [
+        Straight(120), Chicane(60, 30), Straight(120), Arc(100, -180),
+        Straight(360), Arc(100, -180),
+    ],
+    "stadium": [
+        Straight(200), Arc(60, -90), Straight(100), Arc(60, -90),
+        Straight(200), Arc(60, -90), Straight(100), Arc(60, -90),
+    ],
+    "kidney": [
+        Straight(150), Arc(80, -120), Arc(120, 60), Arc(80, -120),
+        Straight(150), Arc(180, -180),
+    ],
+}
+
+
+class TrackLayout:
+    """
+    Centerline sampled from a list of segments, with an arc-length index.
+
+    Points are spaced ``tile_spacing`` apart along the curve; point ``i`` sits at arc
+    length ``s[i]`` and tile ``i`` spans [s[i], s[i + 1]). ``heading`` is measured
+    from the +x axis and ``curvature`` is signed (positive = turning left), exact
+    for each segment. Arc-length lookups are O(log n) binary searches and
+    nearest-point lookups go through a uniform grid over the centerline.
+    """
+
+    def __init__(
+        self,
+        segments: Sequence[Segment],
+        tile_spacing: float = 7.5,
+        start: Tuple[float, float] = (0.0, 0.0),
+        start_heading: float = math.pi / 2,
+        closure_tolerance: Optional[float] = None
+    ):
+        lengths, curvatures = [], []
+        for segment in segments:
+            for length, curvature in segment.arcs():
+                n = max(1, int(round(length / tile_spacing)))
+                lengths.append(np.full(n, length / n))
+                curvatures.append(np.full(n, curvature))
+        ds = np.concatenate(lengths)
+        kappa = np.concatenate(curvatures)
+
+        # Integrate heading exactly over every constant-curvature step
+        heading_out = start_heading + np.cumsum(kappa * ds)
+        heading_in = heading_out - kappa * ds
+        straight = np.abs(kappa) < 1e-12
+        safe_kappa = np.where(straight, 1.0, kappa)
+        dx = np.where(straight, ds * np.cos(heading_in),
+                      (np.sin(heading_out) - np.sin(heading_in)) / safe_kappa)
+        dy = np.where(straight, ds * np.sin(heading_in),
+                      (np.cos(heading_in) - np.cos(heading_out)) / safe_kappa)
+        steps = np.column_stack([dx, dy])
+
+        end = np.asarray(start) + steps.sum(axis=0)
+        gap = float(np.linalg.norm(end - np.asarray(start)))
+        tolerance = tile_spacing if closure_tolerance is None else closure_tolerance
+        if gap > tolerance:
+            raise ValueError(f"Track segments do not form a closed loop (end is {gap:.2f} units from start)")
+
+        # Point i is the start of step i; the last step closes back onto point 0
+        self.points = np.asarray(start) + np.vstack([np.zeros((1, 2)), np.cumsum(steps, axis=0)[:-1]])
+        self.heading = heading_in
+        self.curvature = kappa
+        self.s = np.concatenate([[0.0], np.cumsum(ds)[:-1]])
+        self.total_length = float(ds.sum())
+        self.tile_spacing = tile_spacing
+        self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build_grid(self):
+        """Bucket centerline points into cells of about a track width for nearest lookups."""
+        self.cell_size = max(self.tile_spacing, TRACK_WIDTH) * 2
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        self._grid: Dict[Tuple[int, int], np.ndarray] = {}
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        sorted_cells = cells[order]
+        boundaries = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0), axis=1)) + 1
+        for group in np.split(order, boundaries):
+            self._grid[tuple(cells[group[0]])] = group
+
+    def index_at(self, s: Union[float, np.ndarray]) -> Union[int, np.ndarray]:
+        """Tile index containing arc length ``s`` (wrapped around the loop), O(log n)."""
+        return np.searchsorted(self.s, np.mod(s, self.total_length), side="right") - 1
+
+    def curvature_at(self, s: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Signed curvature of the centerline at arc length ``s``."""
+        return self.curvature[self.index_at(s)]
+
+    def nearest_index(self, point: Sequence[float]) -> int:
+        """Index of the centerline point closest to ``point``."""
+        point = np.asarray(point, dtype=np.float64)
+        cx, cy = np.floor(point / self.cell_size).astype(np.int64)
+        # Widen the ring of cells until no unvisited cell can hold a closer point
+        for ring in range(1, 4):
+            candidates = [self._grid[(cx + dx, cy + dy)]
+                          for dx in range(-ring, ring + 1) for dy in range(-ring, ring + 1)
+                          if (cx + dx, cy + dy) in self._grid]
+            if candidates:
+                candidates = np.concatenate(candidates)
+                dist = np.sum((self.points[candidates] - point) ** 2, axis=1)
+                best = np.argmin(dist)
+                if dist[best] <= (ring * self.cell_size) ** 2:
+                    return int(candidates[best])
+        # Far from the track: fall back to a full scan
+        return int(np.argmin(np.sum((self.points - point) ** 2, axis=1)))
+
+    def progress(self, point: Sequence[float]) -> float:
+        """Fraction of the lap covered at the centerline point nearest ``point``."""
+        return float(self.s[self.nearest_index(point)] / self.total_length)
+
+    def distance_from_center(self, point: Sequence[float]) -> float:
+        """Distance from ``point`` to the nearest centerline point."""
+        return float(np.linalg.norm(self.points[self.nearest_index(point)] - np.asarray(point)))
+
+    def is_off_track(self, point: Sequence[float]) -> bool:
+        return self.distance_from_center(point) > TRACK_WIDTH
+
+    def border_mask(self, min_curvature: float = 1 / 200) -> np.ndarray:
+        """Points on corners tight enough to get kerbs: |curvature| >= ``min_curvature``."""
+        return np.abs(self.curvature) >= min_curvature
+
+
+def spec_key(segments: Sequence[Segment]) -> tuple:
+    """Hashable key of a track spec, for caching built layouts."""
+    return tuple(segment.key() for segment in segments)
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+from gymnasium.envs.box2d.car_racing import GRASS_DIM, PLAYFIELD, STATE_H, STATE_W, WINDOW_H, WINDOW_W
+from typing import List, Sequence, Tuple
+
+# Sub-pixel precision used for cv2 polygon filling
+_SHIFT = 4
+_SHIFT_SCALE = 1 << _SHIFT
+
+
+class TrackRasterRenderer:
+    """
+    Cached-raster renderer for egocentric CarRacing state frames.
+
+    The static scene (playfield, grass and ``road_poly``) is rasterized once per
+    track into a top-down image at ``resolution`` pixels per world unit. Every car's
+    96x96 view is then one ``cv2.warpAffine`` crop/rotate/scale of that raster with
+    the same camera transform the pygame renderer uses, followed by the car sprites
+    and the indicator bar drawn straight at state resolution. Tiles recoloured by
+    contacts are repainted into the raster incrementally.
+    """
+
+    def __init__(self, env, resolution: float = 2.0):
+        self.env = env
+        self.resolution = resolution
+        self.origin = np.array([-PLAYFIELD, -PLAYFIELD])
+        size = int(np.ceil(2 * PLAYFIELD * resolution))
+        self.raster = np.zeros((size, size, 3), dtype=np.uint8)
+
+    def _to_raster(self, poly) -> np.ndarray:
+        points = (np.asarray(poly, dtype=np.float64) - self.origin) * self.resolution
+        return np.round(points * _SHIFT_SCALE).astype(np.int32)
+
+    def _fill(self, poly, color):
+        cv2.fillPoly(self.raster, [self._to_raster(poly)], [int(c) for c in color],
+                     lineType=cv2.LINE_AA, shift=_SHIFT)
+
+    def build(self):
+        """Rasterize the static scene of the current track (call after every reset)."""
+        env = self.env
+        self.raster[:] = [int(c) for c in env.bg_color]
+        for x in range(-20, 20, 2):
+            for y in range(-20, 20, 2):
+                self._fill([
+                    (GRASS_DIM * x + GRASS_DIM, GRASS_DIM * y + 0),
+                    (GRASS_DIM * x + 0, GRASS_DIM * y + 0),
+                    (GRASS_DIM * x + 0, GRASS_DIM * y + GRASS_DIM),
+                    (GRASS_DIM * x + GRASS_DIM, GRASS_DIM * y + GRASS_DIM),
+                ], env.grass_color)
+        for poly, color in env.road_poly:
+            self._fill(poly, color)
+
+    def repaint_tiles(self, tiles):
+        """Redraw road tiles whose colour changed since the raster was built."""
+        for tile in tiles:
+            self._fill(tile.fixtures[0].shape.vertices, tile.color)
+
+    @staticmethod
+    def view_transform(position: Tuple[float, float], angle: float, zoom: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Affine (A, b) mapping world coordinates to state-frame pixels for a camera
+        following a car, matching CarRacing._render followed by the flip and the
+        rescale to STATE_W x STATE_H.
+        """
+        c, s = np.cos(-angle), np.sin(-angle)
+        sx, sy = STATE_W / WINDOW_W, STATE_H / WINDOW_H
+        A = np.array([
+            [sx * zoom * c, -sx * zoom * s],
+            [-sy * zoom * s, -sy * zoom * c],
+        ])
+        b = np.array([sx * WINDOW_W / 2, sy * (WINDOW_H - WINDOW_H / 4)]) - A @ np.asarray(position)
+        return A, b
+
+    def _car_polygons(self, cars) -> List[Tuple[np.ndarray, Tuple[int, int, int]]]:
+        """World-space polygons and colours of every car body, computed once per step."""
+        polygons = []
+        for car in cars:
+            for obj in car.drawlist:
+                color = tuple(int(c * 255) for c in obj.color)
+                for f in obj.fixtures:
+                    trans = f.body.transform
+                    polygons.append((np.array([tuple(trans * v) for v in f.shape.vertices]), color))
+        return polygons
+
+    def _draw_indicators(self, frame: np.ndarray, car, reward: float):
+        """Speed, ABS, steering and gyro bars plus the score, scaled to state resolution."""
+        W, H = WINDOW_W, WINDOW_H
+        sx, sy = STATE_W / W, STATE_H / H
+        s, h = W / 40.0, H / 40.0
+
+        def rect(x0, y0, x1, y1, color):
+            pts = np.array([(x0, y0), (x1, y0), (x1, y1), (x0, y1)]) * (sx, sy)
+            cv2.fillPoly(frame, [np.round(pts * _SHIFT_SCALE).astype(np.int32)], color, shift=_SHIFT)
+
+        def vertical_ind(place, val, color):
+            if abs(val) > 1e-4:
+                rect(place * s, H - (h + h * val), (place + 1) * s, H - h, color)
+
+        def horiz_ind(place, val, color):
+            if abs(val) > 1e-4:
+                rect(place * s, H - 4 * h, (place + val) * s, H - 2 * h, color)
+
+        rect(0, H - 5 * h, W, H, (0, 0, 0))
+        true_speed = np.hypot(car.hull.linearVelocity[0], car.hull.linearVelocity[1])
+        vertical_ind(5, 0.02 * true_speed, (255, 255, 255))
+        # ABS sensors
+        vertical_ind(7, 0.01 * car.wheels[0].omega, (0, 0, 255))
+        vertical_ind(8, 0.01 * car.wheels[1].omega, (0, 0, 255))
+        vertical_ind(9, 0.01 * car.wheels[2].omega, (51, 0, 255))
+        vertical_ind(10, 0.01 * car.wheels[3].omega, (51, 0, 255))
+        horiz_ind(20, -10.0 * car.wheels[0].joint.angle, (0, 255, 0))
+        horiz_ind(30, -0.8 * car.hull.angularVelocity, (255, 0, 0))
+
+        cv2.putText(frame, f"{reward:04.0f}", (0, STATE_H - 2), cv2.FONT_HERSHEY_PLAIN,
+                    0.4, (255, 255, 255), 1, cv2.LINE_AA)
+
+    def render_views(self, cars: Sequence, rewards: Sequence[float], zoom: float, out: np.ndarray):
+        """Render every car's egocentric (STATE_H, STATE_W, 3) view into ``out``."""
+        polygons = self._car_polygons(cars)
+        to_raster = np.diag([1.0 / self.resolution] * 2)
+        for k, car in enumerate(cars):
+            A, b = self.view_transform(tuple(car.hull.position), car.hull.angle, zoom)
+            # Compose raster pixel -> world -> state pixel into a single warp
+            M = np.hstack([A @ to_raster, (A @ self.origin + b)[:, None]])
+            cv2.warpAffine(self.raster, M, (STATE_W, STATE_H), dst=out[k],
+                           flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+            for poly, color in polygons:
+                pts = poly @ A.T + b
+                cv2.fillPoly(out[k], [np.round(pts * _SHIFT_SCALE).astype(np.int32)], color,
+                             lineType=cv2.LINE_AA, shift=_SHIFT)
+            self._draw_indicators(out[k], car, rewards[k])
+        return out
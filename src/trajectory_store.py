@@ -0,0 +1,148 @@
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# column name -> (per-record shape, dtype)
+ColumnSpec = Dict[str, Tuple[Tuple[int, ...], np.dtype]]
+
+
+class TrajectoryStore:
+    """
+    Append-only table of fixed-shape columns kept on disk in memory-mapped segments.
+
+    Every column is split into ``.npy`` files of ``segment_size`` records opened with
+    ``np.load(mmap_mode=...)``, so appending and random reads touch only the pages
+    they need and a store can be far larger than RAM. ``meta.json`` records the
+    column layout and the number of committed records; it is rewritten atomically
+    by ``flush``, so re-opening the directory after a restart or crash re-attaches
+    to everything flushed before it.
+    """
+
+    def __init__(self, path: str, columns: Optional[ColumnSpec] = None, segment_size: int = 10000,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self.columns = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in meta["columns"].items()}
+            self.segment_size = meta["segment_size"]
+            self.size = meta["size"]
+            if columns is not None and self._normalize(columns) != self.columns:
+                raise ValueError(f"Store at {path} has columns {self.columns}, expected {self._normalize(columns)}")
+        else:
+            if columns is None or read_only:
+                raise FileNotFoundError(f"No trajectory store at {path}")
+            os.makedirs(path, exist_ok=True)
+            self.columns = self._normalize(columns)
+            self.segment_size = segment_size
+            self.size = 0
+            self.flush()
+        self._segments: List[Dict[str, np.ndarray]] = []
+
+    @staticmethod
+    def _normalize(columns: ColumnSpec) -> Dict[str, Tuple[Tuple[int, ...], np.dtype]]:
+        return {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in columns.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _segment_file(self, k: int, name: str) -> str:
+        return os.path.join(self.path, f"{name}_{k:05d}.npy")
+
+    def _segment(self, k: int) -> Dict[str, np.ndarray]:
+        """Memory-mapped arrays of segment ``k``, created on first write (never by a read-only store)."""
+        while len(self._segments) <= k:
+            i = len(self._segments)
+            arrays = {}
+            for name, (shape, dtype) in self.columns.items():
+                filename = self._segment_file(i, name)
+                if os.path.exists(filename):
+                    arrays[name] = np.load(filename, mmap_mode="r" if self.read_only else "r+")
+                elif self.read_only:
+                    raise FileNotFoundError(f"Missing segment file {filename}")
+                else:
+                    arrays[name] = np.lib.format.open_memmap(
+                        filename, mode="w+", dtype=dtype, shape=(self.segment_size,) + shape
+                    )
+            self._segments.append(arrays)
+        return self._segments[k]
+
+    def append(self, **values: np.ndarray) -> int:
+        """Append a batch of records (leading dimension n) to every column; returns the first index."""
+        if self.read_only:
+            raise ValueError(f"Trajectory store at {self.path} is read-only")
+        if set(values) != set(self.columns):
+            raise ValueError(f"Expected columns {sorted(self.columns)}, got {sorted(values)}")
+        values = {name: np.asarray(value) for name, value in values.items()}
+        n = len(next(iter(values.values())))
+        start = self.size
+        written = 0
+        while written < n:
+            k, offset = divmod(start + written, self.segment_size)
+            count = min(n - written, self.segment_size - offset)
+            segment = self._segment(k)
+            for name, value in values.items():
+                segment[name][offset:offset + count] = value[written:written + count]
+            written += count
+        self.size += n
+        return start
+
+    def write(self, name: str, index: int, value: np.ndarray):
+        """Overwrite column ``name`` of the already appended record ``index``."""
+        if self.read_only:
+            raise ValueError(f"Trajectory store at {self.path} is read-only")
+        if not 0 <= index < self.size:
+            raise IndexError(f"Record {index} out of range for a store of {self.size} records")
+        k, offset = divmod(index, self.segment_size)
+        self._segment(k)[name][offset] = value
+
+    def gather(self, name: str, indices: Sequence[int]) -> np.ndarray:
+        """Records of column ``name`` at ``indices``, read segment by segment."""
+        indices = np.asarray(indices, dtype=np.int64)
+        shape, dtype = self.columns[name]
+        out = np.empty((len(indices),) + shape, dtype=dtype)
+        segments, offsets = np.divmod(indices, self.segment_size)
+        for k in np.unique(segments):
+            mask = segments == k
+            out[mask] = self._segment(int(k))[name][offsets[mask]]
+        return out
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> Dict[str, np.ndarray]:
+        """Uniformly sampled records of every column."""
+        rng = rng or np.random.default_rng()
+        indices = rng.integers(0, self.size, size=batch_size)
+        return {name: self.gather(name, indices) for name in self.columns}
+
+    def truncate(self, size: int):
+        """Drop every record from ``size`` on and commit; later appends overwrite them."""
+        if self.read_only:
+            raise ValueError(f"Trajectory store at {self.path} is read-only")
+        if not 0 <= size <= self.size:
+            raise ValueError(f"Cannot truncate a store of {self.size} records to {size}")
+        self.size = size
+        self.flush()
+
+    def flush(self):
+        """Write mapped pages to disk and commit the current size to ``meta.json``."""
+        if self.read_only:
+            return
+        for segment in getattr(self, "_segments", []):
+            for array in segment.values():
+                array.flush()
+        meta = {
+            "columns": {name: [list(shape), dtype.str] for name, (shape, dtype) in self.columns.items()},
+            "segment_size": self.segment_size,
+            "size": self.size,
+        }
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def close(self):
+        self.flush()
+        self._segments = []
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from dataset_recorder import OfflineDataset, RecordingWrapper  # noqa: E402
+from trajectory_store import TrajectoryStore  # noqa: E402
+
+
+class CountingEnv(gym.Env):
+    """Observation is the step count; episodes never end on their own."""
+
+    observation_space = spaces.Box(0, 255, (2,), np.uint8)
+    action_space = spaces.Discrete(2)
+
+    def reset(self, seed=None, options=None):
+        self.t = 0
+        return np.full(2, self.t, dtype=np.uint8), {}
+
+    def step(self, action):
+        self.t += 1
+        return np.full(2, self.t, dtype=np.uint8), 0.0, False, False, {}
+
+
+def record_without_close(path, n_steps):
+    env = RecordingWrapper(CountingEnv(), path)
+    env.reset()
+    for _ in range(n_steps):
+        env.step(0)
+    # Stop the writer as a crash would, without ending the episode
+    env.writer.put(None)
+    env.writer.join()
+
+
+def test_unclosed_recording_leaves_out_last_row(tmp_path):
+    path = str(tmp_path / "dataset")
+    record_without_close(path, 4)  # the fourth row is never handed to the writer
+
+    dataset = OfflineDataset(path)
+    assert len(dataset) == 2
+    assert dataset.get(np.arange(2))["next_observations"][:, 0].tolist() == [1, 2]
+    with pytest.raises(IndexError):
+        dataset.get([2])
+
+    # Resuming the recording drops the row whose next observation was lost
+    env = RecordingWrapper(CountingEnv(), path)
+    env.close()
+    resumed = OfflineDataset(path)
+    assert len(resumed) == 2
+    assert resumed.get(np.arange(2))["next_observations"][:, 0].tolist() == [1, 2]
+
+
+def test_read_only_store_does_not_create_segments(tmp_path):
+    path = str(tmp_path / "store")
+    TrajectoryStore(path, {"x": ((), np.int64)}, segment_size=4)
+    reader = TrajectoryStore(path, read_only=True)
+    with pytest.raises(FileNotFoundError):
+        reader.gather("x", [0])
+    assert os.listdir(path) == ["meta.json"]
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+from gymnasium import spaces
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from replay_buffers import FrameStackReplayBuffer, MemmapReplayBuffer  # noqa: E402
+
+N_STACK = 4
+OBS_SPACE = spaces.Box(0, 255, (N_STACK, 2, 2), np.uint8)
+ACTION_SPACE = spaces.Discrete(3)
+
+
+def frame_obs(value):
+    return np.full((1,) + OBS_SPACE.shape, value, dtype=np.uint8)
+
+
+def add(buffer, obs, next_obs, done=False):
+    buffer.add(obs, next_obs, np.array([0]), np.array([1.0]), np.array([done]), [{}])
+
+
+def next_values(buffer, rows):
+    samples = buffer._get_samples(np.asarray(rows))
+    return samples.next_observations.cpu().numpy()[:, -1, 0, 0].tolist()
+
+
+def test_memmap_resume_keeps_next_obs_of_last_transition(tmp_path):
+    path = str(tmp_path / "replay")
+    buffer = MemmapReplayBuffer(100, OBS_SPACE, ACTION_SPACE, device="cpu", path=path)
+    add(buffer, frame_obs(1), frame_obs(2))
+    add(buffer, frame_obs(2), frame_obs(3))
+    buffer.flush()
+
+    resumed = MemmapReplayBuffer(100, OBS_SPACE, ACTION_SPACE, device="cpu", path=path)
+    add(resumed, frame_obs(100), frame_obs(101))
+    add(resumed, frame_obs(101), frame_obs(102))
+    assert next_values(resumed, [0, 1, 2]) == [2, 3, 101]
+
+
+def test_memmap_reset_without_done_keeps_next_obs(tmp_path):
+    buffer = MemmapReplayBuffer(100, OBS_SPACE, ACTION_SPACE, device="cpu", path=str(tmp_path / "replay"))
+    add(buffer, frame_obs(1), frame_obs(2))
+    add(buffer, frame_obs(50), frame_obs(51))  # env reset without a done, e.g. a second learn()
+    add(buffer, frame_obs(51), frame_obs(52))
+    assert next_values(buffer, [0, 1]) == [2, 51]
+
+
+def stacked(frames):
+    """VecFrameStack-style observation of the given frame values, zero-padded at the front."""
+    values = [0] * (N_STACK - len(frames)) + list(frames)[-N_STACK:]
+    return np.array(values, dtype=np.uint8).reshape(1, N_STACK, 1, 1).repeat(2, axis=2).repeat(2, axis=3)
+
+
+def test_frame_stack_reset_without_done_starts_new_episode():
+    buffer = FrameStackReplayBuffer(100, OBS_SPACE, ACTION_SPACE, device="cpu", n_stack=N_STACK)
+    add(buffer, stacked([1]), stacked([1, 2]))
+    add(buffer, stacked([1, 2]), stacked([1, 2, 3]))
+    # Reset without a done: the new episode must not see frames 1-3
+    add(buffer, stacked([7]), stacked([7, 8]))
+    add(buffer, stacked([7, 8]), stacked([7, 8, 9]))
+
+    samples = buffer._get_samples(np.array([1, 2]))
+    obs = samples.observations.cpu().numpy()[:, :, 0, 0]
+    next_obs = samples.next_observations.cpu().numpy()[:, :, 0, 0]
+    assert next_obs[0].tolist() == [0, 1, 2, 3]
+    assert obs[1].tolist() == [0, 0, 0, 7]
+    assert next_obs[1].tolist() == [0, 0, 7, 8]